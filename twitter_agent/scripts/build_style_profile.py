@@ -0,0 +1,47 @@
+import argparse
+import time
+
+from twitter_agent.src import style_profile
+
+def print_profile(profile, openers=10):
+    print(f"Style profile of {profile.tweet_count} tweets")
+    for kind in style_profile.KINDS:
+        stats = profile.stats.get(kind)
+        if stats is None:
+            print(f"\n{kind}: no tweets")
+            continue
+        print(f"\n{kind}: {stats['count']} tweets")
+        for name, mean, std in zip(style_profile.FEATURES, stats['mean'], stats['std']):
+            print(f"  {name:<17} mean {mean:8.3f}  std {std:8.3f}")
+        if kind == style_profile.REPLY:
+            top = list(stats['openers'].items())[:openers]
+            print("  openers: " + ', '.join(f"{word or '(none)'} {count / stats['count'] * 100:.1f}%" for word, count in top))
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the style profile of our tweet history (incrementally) and score texts against it.")
+    parser.add_argument('--full', action='store_true', help='Rebuild from scratch instead of reading only what was appended')
+    parser.add_argument('--score', type=str, help='Score a text against the profile')
+    parser.add_argument('--kind', type=str, default='reply', choices=('reply', 'topic', 'topic_long'), help='Kind of text for --score')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    profile = style_profile.build_profile(full=args.full)
+    print(f"Profile up to date in {time.perf_counter() - start:.2f}s -> {style_profile.PROFILE_PATH}")
+    if not profile.tweet_count:
+        print("No tweets in the corpus; run scripts/fetch_all_my_tweets.py first.")
+        return
+
+    if args.score:
+        start = time.perf_counter()
+        distance = profile.distance(args.score, args.kind)
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        if distance is None:
+            print(f"No {args.kind} tweets in the corpus to compare with.")
+            return
+        percentile = profile.percentile(args.score, args.kind)
+        print(f"Distance {distance:.3f}: further from the profile than {percentile * 100:.0f}% of our tweets [{elapsed_us:.0f} us]")
+        return
+    print_profile(profile)
+
+if __name__ == "__main__":
+    main()
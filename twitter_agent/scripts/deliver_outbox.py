@@ -0,0 +1,51 @@
+import argparse
+import time
+
+from twitter_agent.src import outbox
+
+def print_status(box):
+    box.refresh()
+    counts = {}
+    for entry in box.values():
+        counts[entry['status']] = counts.get(entry['status'], 0) + 1
+    summary = ', '.join(f"{status} {count}" for status, count in sorted(counts.items())) or 'empty'
+    print(f"Outbox: {summary}")
+    for entry in sorted(box.undelivered(), key=lambda e: e['created_at']):
+        target = f"reply to {entry['reply_to_id']}" if entry['reply_to_id'] else 'tweet'
+        error = f" - last error: {entry['error']}" if entry.get('error') else ''
+        print(f"  [{entry['id']}] {target}, {entry['attempts']} attempts{error}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Deliver posts waiting in the outbox and show what is still queued.")
+    parser.add_argument('--watch', action='store_true', help='Keep running and deliver new entries as they are queued')
+    parser.add_argument('--timeout', type=float, default=60, help='Seconds to wait for due entries before exiting (ignored with --watch)')
+    parser.add_argument('--status', action='store_true', help='Only show the outbox status, do not deliver anything')
+    parser.add_argument('--retry-failed', action='store_true', help='Re-queue entries that failed permanently before delivering')
+    args = parser.parse_args()
+
+    box = outbox.get_outbox()
+    if args.status:
+        print_status(box)
+        return
+
+    if args.retry_failed:
+        for entry in box.values():
+            if entry['status'] == outbox.FAILED:
+                # attempts > 0 makes the worker check whether it went out before re-sending
+                box.patch(entry['id'], status=outbox.QUEUED, attempts=1, next_attempt_at=0)
+
+    if args.watch:
+        worker = outbox.start_worker()
+        print("Delivering outbox entries as they are queued. Press Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(60)
+                worker.notify()
+        except KeyboardInterrupt:
+            worker.stop()
+    else:
+        outbox.drain(timeout=args.timeout)
+    print_status(box)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import argparse
+import math
+
+from twitter_agent.src import analytics
+
+def format_rate(rate):
+    return 'n/a' if rate is None or math.isnan(rate) else f"{rate * 100:.2f}%"
+
+def main():
+    parser = argparse.ArgumentParser(description="Engagement analytics over your tweet history, with posting-window recommendations.")
+    parser.add_argument('--full', action='store_true', help='Rebuild the metrics cache from scratch instead of updating it incrementally')
+    parser.add_argument('--top', type=int, default=5, help='Number of posting windows to recommend')
+    parser.add_argument('--conversations', type=int, default=5, help='Number of top conversations to show')
+    args = parser.parse_args()
+
+    stats = analytics.engagement_report(full=args.full, top_n=args.top)
+    print(f"{stats['tweet_count']} tweets | overall engagement rate {format_rate(stats['overall_rate'])}")
+
+    print("\nBy tweet type:")
+    for label, rate, count in zip(stats['type']['labels'], stats['type']['rate'], stats['type']['tweets']):
+        print(f"  {label:<10} {format_rate(rate):>8}  ({count} tweets)")
+
+    print("\nBy length (characters):")
+    for label, rate, count in zip(stats['length']['labels'], stats['length']['rate'], stats['length']['tweets']):
+        print(f"  {label:<10} {format_rate(rate):>8}  ({count} tweets)")
+
+    conv = stats['conversation']
+    order = conv['engagement'].argsort()[::-1][:args.conversations]
+    print("\nMost engaged conversations:")
+    for i in order:
+        print(f"  {conv['id'][i]}  engagements {int(conv['engagement'][i])}, rate {format_rate(conv['rate'][i])} ({conv['tweets'][i]} tweets)")
+
+    print("\nRecommended posting windows (UTC):")
+    for w in stats['windows']:
+        print(f"  {w['weekday']} {w['hour']:02d}:00  rate {format_rate(w['rate'])} ({w['tweets']} tweets)")
+    next_time = analytics.next_posting_time(stats['windows'])
+    if next_time:
+        print(f"\nNext recommended posting time: {next_time.isoformat()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import argparse
+
+from twitter_agent.src.finetune_export import FinetuneExporter, EXPORT_DIR
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the tweet history and reply attempts as chat-format fine-tuning JSONL.")
+    parser.add_argument('--out-dir', type=str, default=EXPORT_DIR, help='Directory for shards and export state')
+    parser.add_argument('--eval-percent', type=int, default=5, help='Percent of examples assigned to the eval split')
+    parser.add_argument('--shard-mb', type=float, default=50, help='Maximum shard size in megabytes')
+    parser.add_argument('--max-distance', type=int, default=3, help='SimHash bit distance at or below which examples count as near-duplicates')
+    parser.add_argument('--no-hydrate', action='store_true', help='Do not call the API for parent tweets; replies whose parent is not in the local tweet cache are skipped for good')
+    parser.add_argument('--full', action='store_true', help='Ignore the saved state and re-export everything from scratch')
+    args = parser.parse_args()
+
+    exporter = FinetuneExporter(
+        out_dir=args.out_dir,
+        eval_percent=args.eval_percent,
+        shard_bytes=int(args.shard_mb * 1024 * 1024),
+        hydrate=not args.no_hydrate,
+        max_distance=args.max_distance,
+        full=args.full,
+    )
+    try:
+        result = exporter.run()
+    except Exception as e:
+        print(f"Export failed, state not saved (the next run retries): {e}")
+        return
+    written = result['written']
+    print(f"Exported {written['train']} train, {written['eval']} eval and {written['preference']} preference examples.")
+    print(f"Skipped: {result['skipped']['duplicate']} near-duplicates, {result['skipped']['no_parent']} replies without a parent tweet, {result['skipped']['empty']} link-only tweets.")
+    for path in result['files']:
+        print(f"  {path}")
+
+if __name__ == "__main__":
+    main()
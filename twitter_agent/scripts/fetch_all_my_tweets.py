@@ -9,8 +9,7 @@ from dotenv import load_dotenv
 def fetch_all_my_tweets_jsonl(max_per_page=100, sleep_time=1, one_page_only=False):
     from twitter_agent.src import twitter_client
     print("Fetching all tweets from your timeline (including retweets and replies)...")
-    client = twitter_client.get_twitter_client()
-    user = client.get_me(user_fields=["public_metrics"])
+    user = twitter_client.call_api('get_me', user_fields=["public_metrics"])
     if not user.data:
         print("Could not determine authenticated user.")
         return
@@ -28,7 +27,8 @@ def fetch_all_my_tweets_jsonl(max_per_page=100, sleep_time=1, one_page_only=Fals
     while True:
         try:
             print(f"Requesting page with next_token: {next_token}")
-            tweets = client.get_users_tweets(
+            tweets = twitter_client.call_api(
+                'get_users_tweets',
                 id=user_id,
                 max_results=max_per_page,
                 pagination_token=next_token,
@@ -84,6 +84,42 @@ def fetch_all_my_tweets_jsonl(max_per_page=100, sleep_time=1, one_page_only=Fals
     print(f"\nDone! Saved {total} tweets to {out_path}")
     return out_path
 
+def fetch_all_my_tweets_backfill(shards=8, concurrency=4, max_per_page=100, since=None, until=None, restart=False):
+    """
+    Download the full history as concurrent start_time/end_time windows (see src/backfill.py).
+    An interrupted backfill is resumed from its saved per-shard cursors unless `restart` is set.
+    """
+    from datetime import timedelta, timezone
+    from twitter_agent.src import backfill, twitter_client
+    job = None if restart else backfill.Backfill.resume()
+    if job:
+        print(f"Resuming unfinished backfill into {job.out_path}")
+    else:
+        user = twitter_client.call_api('get_me', user_fields=['created_at', 'public_metrics'])
+        if not user.data:
+            print("Could not determine authenticated user.")
+            return
+        metrics = getattr(user.data, 'public_metrics', None)
+        if metrics:
+            print(f"Total tweet count (including retweets and replies): {metrics.get('tweet_count', 'N/A')}")
+        start = backfill.parse_date(since) if since else user.data.created_at
+        # end_time must be at least 10 seconds before the request
+        end = backfill.parse_date(until) if until else datetime.now(timezone.utc) - timedelta(seconds=30)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        out_path = f"data/tweets/{user.data.username}_backfill_{timestamp}.jsonl"
+        job = backfill.Backfill.create(user.data.id, out_path, start, end, shards=shards)
+        print(f"Backfilling {start:%Y-%m-%d} to {end:%Y-%m-%d} in {shards} windows, {concurrency} at a time...")
+    result = job.run(concurrency=concurrency, page_size=max_per_page)
+    print("\nShard summary:")
+    for shard in result['shards']:
+        rate = shard['fetched'] / shard['seconds'] if shard['seconds'] else 0.0
+        status = 'done' if shard['done'] else f"incomplete ({shard['error']})"
+        print(f"  {shard['start'][:10]}..{shard['end'][:10]}  {shard['fetched']:>6} tweets  {shard['pages']:>4} pages  "
+              f"{shard['seconds']:>7.1f}s  {rate:>6.1f} tweets/s  {status}")
+    overall = result['written'] / result['seconds'] if result['seconds'] else 0.0
+    print(f"\nDone! Saved {result['written']} new tweets to {job.out_path} in {result['seconds']:.1f}s ({overall:.1f} tweets/s)")
+    return job.out_path
+
 def fetch_all_my_tweets_v1(max_per_page=200):
     import tweepy
     from twitter_agent.src import config as local_config
@@ -209,8 +245,23 @@ if __name__ == "__main__":
     parser.add_argument('--one-page-only', action='store_true', help='Only fetch one page for pagination testing')
     parser.add_argument('--use-v1', action='store_true', help='Use Twitter API v1.1 (user_timeline) for up to 3200 tweets')
     parser.add_argument('--use-requests', action='store_true', help='Use direct requests to /2/users/:id/tweets endpoint')
+    parser.add_argument('--backfill', action='store_true', help='Fetch the history as concurrent time windows (resumable)')
+    parser.add_argument('--shards', type=int, default=8, help='Number of time windows for --backfill')
+    parser.add_argument('--concurrency', type=int, default=4, help='Windows fetched at once for --backfill')
+    parser.add_argument('--since', type=str, help='Oldest date for --backfill, YYYY-MM-DD (default: account creation)')
+    parser.add_argument('--until', type=str, help='Newest date for --backfill, YYYY-MM-DD (default: now)')
+    parser.add_argument('--restart', action='store_true', help='Start a new --backfill instead of resuming an unfinished one')
     args = parser.parse_args()
-    if args.use_requests:
+    if args.backfill:
+        fetch_all_my_tweets_backfill(
+            shards=args.shards,
+            concurrency=args.concurrency,
+            max_per_page=args.max_per_page,
+            since=args.since,
+            until=args.until,
+            restart=args.restart,
+        )
+    elif args.use_requests:
         fetch_all_my_tweets_requests(max_per_page=args.max_per_page)
     elif args.use_v1:
         fetch_all_my_tweets_v1(max_per_page=args.max_per_page)
@@ -0,0 +1,286 @@
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from twitter_agent.src import ai_client, authors, relevance, stories, style_profile, text_rules, timeline_feed, token_budget
+from twitter_agent.src.drafts import DraftQueue, PENDING, REJECTED, SUPERSEDED
+from twitter_agent.scripts import reply_to_tweet
+
+def tweet_summary(tweet):
+    """
+    Keep the fields of a timeline/search tweet dict that the reviewer needs.
+    """
+    keys = ('id', 'text', 'author_id', 'author_username', 'author_name', 'created_at', 'engagement', 'type',
+            'quoted_text', 'story_size', 'story_ids', 'affinity')
+    summary = {k: tweet[k] for k in keys if k in tweet}
+    summary['id'] = str(summary.get('id', ''))
+    return summary
+
+def review_fields(text, kind):
+    """
+    What the reviewer should know about a generated text: its style percentile against
+    the tweet history (see style_profile.py) and any formatting rules it still breaks
+    after enforcement (see text_rules.py).
+    """
+    fields = {}
+    profile = style_profile.get_profile()
+    percentile = profile.percentile(text, kind) if profile is not None else None
+    if percentile is not None:
+        fields['style'] = round(percentile, 2)
+    broken = text_rules.violations(text, kind)
+    if broken:
+        fields['rule_violations'] = broken
+    return fields
+
+def _generate_reply(tweet, feedback=None):
+    return reply_to_tweet.generate_ai_reply(tweet['text'], feedback, verbose=False)
+
+def draft_replies(tweets, draft_queue, workers=4):
+    """
+    Generate reply drafts for tweets that don't have one yet. When a relevance
+    filter has been trained (scripts/train_relevance.py), tweets it scores below
+    its threshold are recorded as prefiltered instead of being sent to the model.
+
+    Args:
+        tweets (list): Tweet dicts with at least 'id' and 'text'
+        draft_queue (DraftQueue): Where drafts are written
+        workers (int): Model calls in flight at once
+
+    Returns:
+        int: Number of pending drafts added
+    """
+    skip = draft_queue.drafted_tweet_ids()
+    relevance_filter = relevance.get_filter()
+    todo = []
+    for tweet in tweets:
+        ids = {str(tweet['id'])}
+        ids.update(tweet.get('story_ids') or ())
+        if not skip.isdisjoint(ids):
+            continue
+        skip.update(ids)
+        if relevance_filter is not None:
+            score = relevance_filter.score(tweet['text'])
+            if score < relevance_filter.threshold:
+                # Screened out locally: remember it so it isn't scored again, without a model call.
+                draft_queue.add('reply', '', tweet=tweet_summary(tweet), status=REJECTED,
+                                prefiltered=True, relevance=round(score, 4))
+                continue
+        todo.append(tweet)
+    added = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for tweet, reply in zip(todo, executor.map(_generate_reply, todo)):
+            if reply is None:
+                # Model unreachable: record nothing so a later run retries this tweet.
+                continue
+            if reply:
+                draft_queue.add('reply', reply, tweet=tweet_summary(tweet), **review_fields(reply, 'reply'))
+                added += 1
+            else:
+                # Remember that the model declined so the tweet isn't drafted again.
+                draft_queue.add('reply', '', tweet=tweet_summary(tweet), status=REJECTED, declined=True)
+    return added
+
+def draft_topic_tweets(topics, draft_queue, count=1, long=False, workers=4):
+    """
+    Generate `count` standalone tweet drafts for each topic.
+
+    Returns:
+        int: Number of pending drafts added
+    """
+    jobs = [topic for topic in topics for _ in range(count)]
+    added = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = executor.map(lambda t: ai_client.generate_topic_tweet(t, long=long), jobs)
+        for topic, text in zip(jobs, results):
+            if text:
+                draft_queue.add('topic', text, topic=topic, long=long,
+                                **review_fields(text, 'topic_long' if long else 'topic'))
+                added += 1
+    return added
+
+def budget_limited(count, label):
+    """
+    Scale a batch to the model budget (see token_budget.TokenGovernor.scale), saying so when it shrinks.
+    """
+    governor = token_budget.get_governor()
+    scaled = governor.scale(count)
+    if scaled < count:
+        print(f"[BUDGET] Model budget at {governor.level()} level: drafting {scaled} of {count} {label}.")
+    return scaled
+
+def regenerate_draft(draft_queue, draft, feedback=None):
+    """
+    Replace a draft with a freshly generated one, optionally guided by feedback.
+
+    Returns:
+        dict: The new draft, or None if the model produced nothing
+    """
+    try:
+        if draft['kind'] == 'reply':
+            text = _generate_reply(draft['tweet'], feedback)
+            fields = {'tweet': draft['tweet']}
+        else:
+            text = ai_client.generate_topic_tweet(draft['topic'], long=draft.get('long', False), feedback=feedback)
+            fields = {'topic': draft['topic'], 'long': draft.get('long', False)}
+    except Exception:
+        draft_queue.update(draft['id'], status=PENDING, regenerate_failed=True)
+        raise
+    if not text:
+        # Put the old draft back in front of the reviewer rather than losing it.
+        draft_queue.update(draft['id'], status=PENDING, regenerate_failed=True)
+        return None
+    kind = 'reply' if draft['kind'] == 'reply' else ('topic_long' if draft.get('long') else 'topic')
+    fields.update(review_fields(text, kind))
+    draft_queue.update(draft['id'], status=SUPERSEDED)
+    return draft_queue.add(draft['kind'], text, feedback=feedback, parent_id=draft['id'], **fields)
+
+class DraftProducer(threading.Thread):
+    """
+    Background producer that keeps the draft queue topped up while the user reviews.
+
+    Regeneration requests from the reviewer are served first. When the number of
+    pending drafts drops below `low_water`, the producer polls the home timeline
+    change feed and drafts replies for the most engaged tweets among those inserted
+    or updated since the last refill (plus any configured topics).
+    """
+
+    def __init__(self, draft_queue, refill=True, batch_size=20, low_water=5, topics=None,
+                 long=False, workers=4, refill_interval=60):
+        super().__init__(daemon=True)
+        self.draft_queue = draft_queue
+        self.refill = refill
+        self.batch_size = batch_size
+        self.low_water = low_water
+        self.topics = topics or []
+        self.long = long
+        self.workers = workers
+        self.refill_interval = refill_interval
+        self.requests = queue.Queue()
+        self._stopping = threading.Event()
+        self._last_refill = 0
+        self._candidates = {}
+        self._candidates_lock = threading.Lock()
+        if refill and batch_size:
+            self.feed = timeline_feed.get_timeline_feed()
+            # Tweets already in the persisted window are candidates once; after that only changes are
+            for tweet in self.feed.top(timeline_feed.MAX_WINDOW_TWEETS):
+                self._candidates[tweet['id']] = tweet
+            self.feed.subscribe(self._on_timeline_change)
+
+    def _on_timeline_change(self, event, tweet):
+        with self._candidates_lock:
+            self._candidates[tweet['id']] = tweet
+
+    def request_regeneration(self, draft, feedback=None):
+        self.requests.put((draft, feedback))
+
+    def stop(self):
+        """
+        Stop the producer and put regenerations it hasn't started back to pending.
+        """
+        self._stopping.set()
+        while True:
+            try:
+                draft, _ = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            self.draft_queue.update(draft['id'], status=PENDING)
+            self.requests.task_done()
+
+    def has_work(self):
+        """
+        True while drafts may still arrive: regenerations outstanding or refilling enabled.
+        """
+        return self.refill or self.requests.unfinished_tasks > 0
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                draft, feedback = self.requests.get(timeout=1)
+            except queue.Empty:
+                draft = None
+            try:
+                if draft is not None:
+                    regenerate_draft(self.draft_queue, draft, feedback)
+                elif self._should_refill():
+                    self._refill()
+            except Exception as e:
+                print(f"\n[WARNING] Draft producer error: {e}")
+            finally:
+                if draft is not None:
+                    self.requests.task_done()
+
+    def _should_refill(self):
+        if not self.refill:
+            return False
+        if self.draft_queue.pending_count() >= self.low_water:
+            return False
+        return time.time() - self._last_refill >= self.refill_interval
+
+    def _refill(self):
+        self._last_refill = time.time()
+        # Near the budget limit, draft fewer replies and no topic tweets
+        batch_size = budget_limited(self.batch_size, 'timeline replies')
+        if batch_size:
+            self.feed.poll()
+            drafted = self.draft_queue.drafted_tweet_ids()
+            # Cluster the whole window so a new retweet of an already drafted story stays collapsed
+            window = authors.rank_candidates(stories.cluster_stories(self.feed.top(timeline_feed.MAX_WINDOW_TWEETS)))
+            with self._candidates_lock:
+                changed = set(self._candidates)
+                fresh = [
+                    story for story in window
+                    if changed.intersection(story['story_ids']) and drafted.isdisjoint(story['story_ids'])
+                ]
+                batch = fresh[:batch_size]
+                taken = {i for story in batch for i in story['story_ids']}
+                self._candidates = {
+                    i: t for i, t in self._candidates.items()
+                    if i in self.feed and i not in taken and i not in drafted
+                }
+            draft_replies(batch, self.draft_queue, workers=self.workers)
+        if self.topics and token_budget.get_governor().level() == token_budget.OK:
+            draft_topic_tweets(self.topics, self.draft_queue, long=self.long, workers=self.workers)
+
+def load_tweets_file(path):
+    tweets = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                tweets.append(json.loads(line))
+    return tweets
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate reply and topic tweet drafts into the review queue.")
+    parser.add_argument('--timeline', type=int, default=0, help='Draft replies for the top N tweets of your home timeline')
+    parser.add_argument('--from-file', type=str, help='Draft replies for tweets in a JSONL file (e.g. output of ingest_search)')
+    parser.add_argument('--topic', action='append', default=[], help='Topic to draft a standalone tweet about (repeatable)')
+    parser.add_argument('--count', type=int, default=1, help='Drafts per topic')
+    parser.add_argument('--long', action='store_true', help='Draft long topic tweets (up to 4000 characters)')
+    parser.add_argument('--workers', type=int, default=4, help='Model calls in flight at once')
+    args = parser.parse_args()
+
+    draft_queue = DraftQueue()
+    added = 0
+    timeline_count = budget_limited(args.timeline, 'timeline replies')
+    if timeline_count:
+        print(f"Drafting replies for the top {timeline_count} timeline tweets...")
+        added += draft_replies(reply_to_tweet.fetch_home_timeline(timeline_count), draft_queue, workers=args.workers)
+    if args.from_file:
+        tweets = load_tweets_file(args.from_file)
+        tweets = tweets[:budget_limited(len(tweets), 'replies from file')]
+        print(f"Drafting replies for {len(tweets)} tweets in {args.from_file}...")
+        added += draft_replies(tweets, draft_queue, workers=args.workers)
+    if args.topic and token_budget.get_governor().level() != token_budget.OK:
+        print(f"[BUDGET] Model budget at {token_budget.get_governor().level()} level: skipping topic tweets.")
+    elif args.topic:
+        print(f"Drafting {args.count} tweet(s) for each of {len(args.topic)} topic(s)...")
+        added += draft_topic_tweets(args.topic, draft_queue, count=args.count, long=args.long, workers=args.workers)
+    print(f"Added {added} drafts. {draft_queue.pending_count()} pending in {draft_queue.path}.")
+
+if __name__ == "__main__":
+    main()
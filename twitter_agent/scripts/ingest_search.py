@@ -0,0 +1,38 @@
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+from twitter_agent.src import ingest
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one search ingestion cycle across topics, watched accounts and keywords.")
+    parser.add_argument('--query', action='append', help='Search query to run (repeatable; default: topics, watched accounts and keywords from config)')
+    parser.add_argument('--max-pages', type=int, help='Pages to fetch per query (default: SEARCH_MAX_PAGES)')
+    parser.add_argument('--page-size', type=int, default=100, help='Results per page (10-100)')
+    parser.add_argument('--concurrency', type=int, help='Queries in flight at once (default: SEARCH_CONCURRENCY)')
+    parser.add_argument('--full', action='store_true', help='Ignore saved since_id cursors and do not update them')
+    parser.add_argument('--out', type=str, help='Output JSONL path (default: data/search/search_<timestamp>.jsonl)')
+    args = parser.parse_args()
+
+    queries = args.query or ingest.build_queries()
+    out_path = args.out or f"data/search/search_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    print(f"Running {len(queries)} queries...")
+    start = time.time()
+    total = 0
+    with open(out_path, 'w') as f:
+        for tweet in ingest.ingest_searches(
+            queries=queries,
+            max_pages=args.max_pages,
+            page_size=args.page_size,
+            concurrency=args.concurrency,
+            incremental=not args.full,
+        ):
+            f.write(json.dumps(tweet) + "\n")
+            total += 1
+    print(f"Saved {total} unique tweets to {out_path} in {time.time() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
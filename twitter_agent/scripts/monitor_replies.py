@@ -0,0 +1,51 @@
+import argparse
+import time
+
+from twitter_agent.src import reply_monitor
+
+def print_status(monitor, limit):
+    posts = sorted(reply_monitor.tracked_posts(monitor.log_path).values(), key=lambda p: p['posted_at'], reverse=True)
+    active = [p for p in posts if not p['done']]
+    print(f"Tracking {len(active)} of {len(posts)} posted replies.")
+    for post in posts[:limit]:
+        posted = time.strftime('%Y-%m-%d %H:%M', time.gmtime(post['posted_at'])) if post['posted_at'] else 'unknown'
+        due = reply_monitor.next_check_at(post)
+        state = 'done' if due is None else f"next check {time.strftime('%Y-%m-%d %H:%M', time.gmtime(due))}"
+        print(f"  {post['tweet_id']} posted {posted} | {post['checks']} checks, {len(post['response_ids'])} responses, "
+              f"engagement {reply_monitor.engagement(post['metrics'])} | {state}")
+
+def run(monitor):
+    result = monitor.run_once()
+    if not result['checked']:
+        return
+    new = sum(record['new_responses'] for record in result['checked'])
+    print(f"Checked {len(result['checked'])} replies with {result['lookups']} lookups and "
+          f"{result['searches']} searches: {new} new responses.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Check posted replies for responses and engagement on a decaying schedule.")
+    parser.add_argument('--watch', action='store_true', help='Keep running and check replies as they come due')
+    parser.add_argument('--status', action='store_true', help='Only show what is being tracked, do not call the API')
+    parser.add_argument('--limit', type=int, default=20, help='Replies to list with --status')
+    args = parser.parse_args()
+
+    monitor = reply_monitor.ReplyMonitor()
+    if args.status:
+        print_status(monitor, args.limit)
+        return
+
+    run(monitor)
+    if args.watch:
+        print("Checking replies as they come due. Press Ctrl+C to stop.")
+        try:
+            while True:
+                next_due = monitor.next_due_at()
+                # New replies may be posted meanwhile, so look again at least once a minute
+                time.sleep(max(1, min(60, (next_due or float('inf')) - time.time())))
+                run(monitor)
+        except KeyboardInterrupt:
+            pass
+    print_status(monitor, args.limit)
+
+if __name__ == "__main__":
+    main()
@@ -3,96 +3,82 @@ import sys
 import argparse
 from dotenv import load_dotenv
 import json
-from datetime import datetime
 import difflib
 from twitter_agent.src.personality import get_tweet_guidance
 
 # Robust import handling for both direct and module execution
 try:
-    from twitter_agent.src import twitter_client, ai_client
+    from twitter_agent.src import twitter_client, ai_client, attempt_log, authors, outbox, stories, text_rules, timeline_feed
 except ImportError:
     # Fallback for direct script execution
     sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
     import twitter_client
     import ai_client
+    import attempt_log
+    import authors
+    import outbox
+    import stories
+    import text_rules
+    import timeline_feed
 
 # Load environment variables
 load_dotenv(os.path.join(os.path.dirname(__file__), '../config/.env'))
 
 def fetch_home_timeline(n=10):
-    client = twitter_client.get_twitter_client()
-    timeline = client.get_home_timeline(
-        max_results=n * 2,  # Fetch more to allow for filtering
-        tweet_fields=['created_at', 'public_metrics', 'conversation_id', 'author_id', 'referenced_tweets'],
-        expansions=['author_id', 'referenced_tweets.id'],
-        user_fields=['username', 'name']
-    )
-    tweets = []
-    users = {}
-    referenced_tweets = {}
-    # Build user lookup
-    if hasattr(timeline, 'includes') and 'users' in timeline.includes:
-        for user in timeline.includes['users']:
-            users[user.id] = {
-                'username': user.username,
-                'name': user.name
-            }
-    # Build referenced tweet lookup (for retweets/quotes)
-    if hasattr(timeline, 'includes') and 'tweets' in timeline.includes:
-        for ref_tweet in timeline.includes['tweets']:
-            referenced_tweets[ref_tweet.id] = ref_tweet.text
-    for tweet in timeline.data:
-        # Detect tweet type
-        tweet_type = 'original'
-        full_text = tweet.text
-        quoted_text = None
-        if hasattr(tweet, 'referenced_tweets') and tweet.referenced_tweets:
-            for ref in tweet.referenced_tweets:
-                if ref.type == 'retweeted':
-                    tweet_type = 'retweet'
-                    if ref.id in referenced_tweets:
-                        full_text = referenced_tweets[ref.id]
-                elif ref.type == 'quoted':
-                    tweet_type = 'quote'
-                    quoted_text = referenced_tweets.get(ref.id)
-                elif ref.type == 'replied_to':
-                    tweet_type = 'reply'
-        author_info = users.get(tweet.author_id, {})
-        metrics = tweet.public_metrics if hasattr(tweet, 'public_metrics') else {}
-        engagement = (
-            metrics.get('like_count', 0) +
-            metrics.get('reply_count', 0) +
-            metrics.get('retweet_count', 0) +
-            metrics.get('quote_count', 0)
-        )
-        tweet_dict = {
-            'id': tweet.id,
-            'text': full_text,
-            'author_username': author_info.get('username', 'unknown'),
-            'author_name': author_info.get('name', 'unknown'),
-            'created_at': str(tweet.created_at),
-            'engagement': engagement,
-            'metrics': metrics,
-            'type': tweet_type
-        }
-        if quoted_text:
-            tweet_dict['quoted_text'] = quoted_text
-        tweets.append(tweet_dict)
-    # Sort by engagement, descending
-    tweets = sorted(tweets, key=lambda t: t['engagement'], reverse=True)
-    # Only return top n
-    return tweets[:n]
+    """
+    Return the n best stories in the home timeline window: retweets, quotes and
+    near-identical posts about the same thing are collapsed into one tweet
+    (see src/stories.py), then ranked by engagement and how much we engage with
+    each author (see src/authors.py). Only tweets newer than the last poll are
+    downloaded (see src/timeline_feed.py).
+    """
+    feed = timeline_feed.get_timeline_feed()
+    feed.poll()
+    return authors.rank_candidates(stories.cluster_stories(feed.top(timeline_feed.MAX_WINDOW_TWEETS)))[:n]
 
-def post_reply(reply_text, tweet_id):
+# Outbox IDs of replies queued during this run, reported on exit
+_queued_this_run = []
+
+def post_reply(reply_text, tweet_id, context=None):
+    """
+    Queue a reply in the outbox. It is on disk when this returns and is delivered
+    by the background worker, which records the real tweet ID in the attempt log.
+
+    Returns:
+        dict: The outbox entry
+    """
     disclaimer = "\n\n(This reply was AI generated based on my personality.)"
     reply_text = reply_text.strip() + disclaimer
-    try:
-        resp = twitter_client.post_tweet(reply_text, reply_to_id=tweet_id)
-        new_tweet_id = resp.data['id'] if hasattr(resp, 'data') and 'id' in resp.data else None
-        return new_tweet_id
-    except Exception as e:
-        print(f"Error posting reply: {e}")
-        return None
+    return outbox.enqueue(reply_text, reply_to_id=tweet_id, kind='reply', context=context)
+
+def queue_reply(tweet_text, tweet_id, ai_reply, feedback, final_reply, author_id=None):
+    """
+    Queue an approved reply for delivery and log the approval, linked to the outbox entry.
+    The author ID, when known, feeds per-author reply affinity (src/authors.py).
+    """
+    context = {'original_tweet': tweet_text, 'final_reply': final_reply, 'author_id': author_id}
+    entry = post_reply(final_reply, tweet_id, context=context)
+    log_attempt(tweet_text, ai_reply, feedback, final_reply, 'accepted', outbox_id=entry['id'],
+                in_reply_to_id=str(tweet_id), author_id=author_id)
+    print(f"Reply queued for delivery (outbox id {entry['id']}).")
+    _queued_this_run.append(entry['id'])
+    return entry
+
+def deliver_queued_posts(timeout=30):
+    """
+    Give the outbox worker a little time to deliver before the script exits, and report
+    on the replies queued in this run. Anything left is delivered on the next run.
+    """
+    remaining = outbox.drain(timeout)
+    for entry_id in _queued_this_run:
+        entry = outbox.get_outbox().get(entry_id)
+        if entry['status'] == outbox.DELIVERED:
+            print(f"Reply posted: https://twitter.com/{get_my_username()}/status/{entry['tweet_id']}")
+        elif entry['status'] == outbox.FAILED:
+            print(f"Reply could not be posted: {entry['error']}")
+    if remaining:
+        print(f"{remaining} post(s) still queued in {outbox.OUTBOX_PATH}; they will be delivered on the next run "
+              "or by `python3 -m twitter_agent.scripts.deliver_outbox`.")
 
 def load_tweet_examples(tweet_file='data/tweets/kjameslubin_all_tweets_20250415_003953.jsonl', n=3):
     examples = []
@@ -134,38 +120,41 @@ def build_system_prompt(tweet_examples, reply_examples):
             prompt += f"- {r}\n"
     return prompt
 
-def generate_ai_reply(tweet_text, feedback=None):
-    print("\nGenerating AI reply...")
+def generate_ai_reply(tweet_text, feedback=None, verbose=True):
+    if verbose:
+        print("\nGenerating AI reply...")
     try:
         tweet_examples = load_tweet_examples()
         reply_examples = load_accepted_replies()
         system_prompt = build_system_prompt(tweet_examples, reply_examples)
         prompt = system_prompt + "\n\n" + tweet_text
-        if feedback:
-            prompt += f"\n\nFeedback: {feedback}"
-        response = ai_client.generate_tweet_reply(prompt)
-        if response and response.get('respond', False):
-            return response.get('reply', '').strip()
+
+        def ask(rule_feedback=None):
+            notes = [note for note in (feedback, rule_feedback) if note]
+            response = ai_client.generate_tweet_reply(
+                prompt + (f"\n\nFeedback: {' '.join(notes)}" if notes else ''), verbose=verbose)
+            if response and response.get('error'):
+                # The model was unreachable, which is not the same as declining to reply
+                return None
+            if response and response.get('respond', False):
+                return response.get('reply', '').strip()
+            return ''
+
+        reply = ask()
+        if not reply:
+            return reply
+        # Fix formatting rule violations locally; only ask the model again if that isn't possible
+        result = text_rules.enforce(reply, 'reply', regenerate=ask, verbose=verbose)
+        if result.unrepaired and verbose:
+            print(f"[WARNING] This reply still breaks the formatting rules ({', '.join(result.unrepaired)}); "
+                  "edit it or ask for a new one before posting.")
+        return result.text
     except Exception as e:
         print(f"AI error: {e}")
     return ''
 
-def log_attempt(original_tweet, ai_reply, user_feedback, final_reply, status=None):
-    os.makedirs('data', exist_ok=True)
-    log_path = 'data/attempted_replies.jsonl'
-    # If no status is provided, set to 'rejected' if final_reply is empty, else 'accepted'
-    if status is None:
-        status = 'accepted' if final_reply else 'rejected'
-    record = {
-        'timestamp': datetime.utcnow().isoformat() + 'Z',
-        'original_tweet': original_tweet,
-        'ai_reply': ai_reply,
-        'user_feedback': user_feedback,
-        'final_reply': final_reply,
-        'status': status
-    }
-    with open(log_path, 'a') as f:
-        f.write(json.dumps(record) + '\n')
+def log_attempt(original_tweet, ai_reply, user_feedback, final_reply, status=None, **extra):
+    return attempt_log.log_attempt(original_tweet, ai_reply, user_feedback, final_reply, status, **extra)
 
 def is_near_duplicate(reply, past_tweets, threshold=0.7):
     for past in past_tweets:
@@ -180,17 +169,12 @@ def handle_manual_reply(tweet, ai_reply, feedback):
         final_reply = manual_reply  # Do NOT append disclaimer here
         confirm = input(f"\nPost this manual reply? (y/n): {final_reply}\n").strip().lower()
         if confirm == 'y':
-            new_tweet_id = post_reply(final_reply, tweet['id'])
-            if new_tweet_id:
-                print(f"Reply posted: https://twitter.com/{get_my_username()}/status/{new_tweet_id}")
-                log_attempt(tweet['text'], ai_reply, feedback, final_reply, 'accepted')
-            else:
-                print("Reply posted, but could not retrieve tweet ID.")
-                log_attempt(tweet['text'], ai_reply, feedback, final_reply, 'accepted')
+            queue_reply(tweet['text'], tweet['id'], ai_reply, feedback, final_reply, tweet.get('author_id'))
             return True
         else:
             print("Aborted by user.")
-            log_attempt(tweet['text'], ai_reply, feedback, final_reply, 'rejected')
+            log_attempt(tweet['text'], ai_reply, feedback, final_reply, 'rejected',
+                        in_reply_to_id=str(tweet['id']), author_id=tweet.get('author_id'))
             return True
     else:
         print("No manual reply provided. Returning to feedback loop.")
@@ -210,17 +194,18 @@ def main():
         if args.tweet_id:
             # Direct mode: reply to a specific tweet by ID
             tweet_id = args.tweet_id
+            author_id = None
             if args.tweet_text:
                 tweet_text = args.tweet_text
             else:
                 # Fetch tweet text using Twitter API
-                client = twitter_client.get_twitter_client()
-                tweet_obj = client.get_tweet(tweet_id, tweet_fields=["text", "author_id", "created_at"])
+                tweet_obj = twitter_client.call_api('get_tweet', tweet_id, tweet_fields=["text", "author_id", "created_at"])
                 tweet_data = tweet_obj.data
                 tweet_text = tweet_data.text if hasattr(tweet_data, 'text') else ''
-                author_id = tweet_data.author_id if hasattr(tweet_data, 'author_id') else 'unknown'
+                author_id = str(tweet_data.author_id) if getattr(tweet_data, 'author_id', None) else None
                 created_at = str(tweet_data.created_at) if hasattr(tweet_data, 'created_at') else ''
-                print(f"\nSelected tweet (ID: {tweet_id}):\n{tweet_text}\nAuthor ID: {author_id} | Created at: {created_at}")
+                author = authors.get_author_cache().username(author_id) if author_id else None
+                print(f"\nSelected tweet (ID: {tweet_id}):\n{tweet_text}\nAuthor: @{author or 'unknown'} ({author_id or 'unknown'}) | Created at: {created_at}")
             # Interactive feedback loop (same as timeline)
             feedback = None
             radical_attempts = 0
@@ -234,7 +219,7 @@ def main():
                     ai_reply = ''
                 user_feedback = input("Feedback for the AI (or press Enter to accept and post this reply, or type 'new' for a radically different attempt, or 'manual' to write your own reply): ").strip().lower()
                 if user_feedback in ['manual', 'm']:
-                    if handle_manual_reply(tweet_text, ai_reply, feedback):
+                    if handle_manual_reply({'id': tweet_id, 'text': tweet_text, 'author_id': author_id}, ai_reply, feedback):
                         return
                     else:
                         continue
@@ -245,7 +230,7 @@ def main():
                         print("Tried 3 radically different replies. Please provide feedback or enter your own reply.")
                         user_feedback = input("Feedback for the AI (or press Enter to accept and post this reply, or 'manual' to write your own reply): ").strip().lower()
                         if user_feedback in ['manual', 'm']:
-                            if handle_manual_reply(tweet_text, ai_reply, feedback):
+                            if handle_manual_reply({'id': tweet_id, 'text': tweet_text, 'author_id': author_id}, ai_reply, feedback):
                                 return
                             else:
                                 continue
@@ -253,24 +238,21 @@ def main():
                             final_reply = ai_reply
                             if not final_reply:
                                 print("No reply provided. Exiting.")
-                                log_attempt(tweet_text, ai_reply, feedback, '', 'rejected')
+                                log_attempt(tweet_text, ai_reply, feedback, '', 'rejected',
+                                            in_reply_to_id=str(tweet_id), author_id=author_id)
                                 return
                             confirm = input(f"\nPost this reply? (y/n): {final_reply}\n").strip().lower()
                             if confirm == 'y':
-                                new_tweet_id = post_reply(final_reply, tweet_id)
-                                if new_tweet_id:
-                                    print(f"Reply posted: https://twitter.com/{get_my_username()}/status/{new_tweet_id}")
-                                    log_attempt(tweet_text, ai_reply, feedback, final_reply, 'accepted')
-                                else:
-                                    print("Reply posted, but could not retrieve tweet ID.")
-                                    log_attempt(tweet_text, ai_reply, feedback, final_reply, 'accepted')
+                                queue_reply(tweet_text, tweet_id, ai_reply, feedback, final_reply, author_id)
                                 return
                             else:
                                 print("Aborted by user.")
-                                log_attempt(tweet_text, ai_reply, feedback, final_reply, 'rejected')
+                                log_attempt(tweet_text, ai_reply, feedback, final_reply, 'rejected',
+                                            in_reply_to_id=str(tweet_id), author_id=author_id)
                                 return
                         else:
-                            log_attempt(tweet_text, ai_reply, feedback, '', 'rejected')
+                            log_attempt(tweet_text, ai_reply, feedback, '', 'rejected',
+                                        in_reply_to_id=str(tweet_id), author_id=author_id)
                             feedback = user_feedback
                             continue
                     continue
@@ -278,24 +260,21 @@ def main():
                     final_reply = ai_reply
                     if not final_reply:
                         print("No reply provided. Exiting.")
-                        log_attempt(tweet_text, ai_reply, feedback, '', 'rejected')
+                        log_attempt(tweet_text, ai_reply, feedback, '', 'rejected',
+                                    in_reply_to_id=str(tweet_id), author_id=author_id)
                         return
                     confirm = input(f"\nPost this reply? (y/n): {final_reply}\n").strip().lower()
                     if confirm == 'y':
-                        new_tweet_id = post_reply(final_reply, tweet_id)
-                        if new_tweet_id:
-                            print(f"Reply posted: https://twitter.com/{get_my_username()}/status/{new_tweet_id}")
-                            log_attempt(tweet_text, ai_reply, feedback, final_reply, 'accepted')
-                        else:
-                            print("Reply posted, but could not retrieve tweet ID.")
-                            log_attempt(tweet_text, ai_reply, feedback, final_reply, 'accepted')
+                        queue_reply(tweet_text, tweet_id, ai_reply, feedback, final_reply, author_id)
                         return
                     else:
                         print("Aborted by user.")
-                        log_attempt(tweet_text, ai_reply, feedback, final_reply, 'rejected')
+                        log_attempt(tweet_text, ai_reply, feedback, final_reply, 'rejected',
+                                    in_reply_to_id=str(tweet_id), author_id=author_id)
                         return
                 else:
-                    log_attempt(tweet_text, ai_reply, feedback, '', 'rejected')
+                    log_attempt(tweet_text, ai_reply, feedback, '', 'rejected',
+                                in_reply_to_id=str(tweet_id), author_id=author_id)
                     feedback = user_feedback
             return
 
@@ -310,7 +289,7 @@ def main():
         total = len(all_tweets)
         while shown < total:
             page = all_tweets[shown:shown+page_size]
-            print(f"\nTweets {shown+1}-{min(shown+page_size, total)} of {total} (sorted by engagement):")
+            print(f"\nTweets {shown+1}-{min(shown+page_size, total)} of {total} (sorted by engagement, similar tweets grouped into stories):")
             for i, t in enumerate(page):
                 idx = shown + i
                 tweet_type = t.get('type', '')
@@ -321,6 +300,8 @@ def main():
                     prefix = '[QT] '
                 elif tweet_type == 'reply':
                     prefix = '[RE] '
+                if t.get('story_size', 1) > 1:
+                    prefix = f"[story: {t['story_size']} tweets] " + prefix
                 tweet_link = f"https://twitter.com/{t['author_username']}/status/{t['id']}" if t.get('author_username') and t.get('id') else ''
                 print(f"[{idx}] @{t['author_username']} ({t['author_name']}) at {t['created_at']} | Engagement: {t['engagement']} (Likes: {t['metrics'].get('like_count', 0)}, Replies: {t['metrics'].get('reply_count', 0)}, RTs: {t['metrics'].get('retweet_count', 0)}, Quotes: {t['metrics'].get('quote_count', 0)})\n{prefix}{t['text']}")
                 if t.get('quoted_text'):
@@ -380,24 +361,21 @@ def main():
                         final_reply = reply_text
                         if not final_reply:
                             print("No reply provided. Exiting.")
-                            log_attempt(tweet['text'], ai_reply, feedback, '', 'rejected')
+                            log_attempt(tweet['text'], ai_reply, feedback, '', 'rejected',
+                                        in_reply_to_id=str(tweet['id']), author_id=tweet.get('author_id'))
                             return
                         confirm = input(f"\nPost this reply? (y/n): {final_reply}\n").strip().lower()
                         if confirm == 'y':
-                            new_tweet_id = post_reply(final_reply, tweet['id'])
-                            if new_tweet_id:
-                                print(f"Reply posted: https://twitter.com/{get_my_username()}/status/{new_tweet_id}")
-                                log_attempt(tweet['text'], ai_reply, feedback, final_reply, 'accepted')
-                            else:
-                                print("Reply posted, but could not retrieve tweet ID.")
-                                log_attempt(tweet['text'], ai_reply, feedback, final_reply, 'accepted')
+                            queue_reply(tweet['text'], tweet['id'], ai_reply, feedback, final_reply, tweet.get('author_id'))
                             return
                         else:
                             print("Aborted by user.")
-                            log_attempt(tweet['text'], ai_reply, feedback, final_reply, 'rejected')
+                            log_attempt(tweet['text'], ai_reply, feedback, final_reply, 'rejected',
+                                        in_reply_to_id=str(tweet['id']), author_id=tweet.get('author_id'))
                             return
                     else:
-                        log_attempt(tweet['text'], ai_reply, feedback, '', 'rejected')
+                        log_attempt(tweet['text'], ai_reply, feedback, '', 'rejected',
+                                    in_reply_to_id=str(tweet['id']), author_id=tweet.get('author_id'))
                         feedback = user_feedback
                         continue
                 continue
@@ -405,33 +383,31 @@ def main():
                 final_reply = reply_text
                 if not final_reply:
                     print("No reply provided. Exiting.")
-                    log_attempt(tweet['text'], ai_reply, feedback, '', 'rejected')
+                    log_attempt(tweet['text'], ai_reply, feedback, '', 'rejected',
+                                in_reply_to_id=str(tweet['id']), author_id=tweet.get('author_id'))
                     return
                 confirm = input(f"\nPost this reply? (y/n): {final_reply}\n").strip().lower()
                 if confirm == 'y':
-                    new_tweet_id = post_reply(final_reply, tweet['id'])
-                    if new_tweet_id:
-                        print(f"Reply posted: https://twitter.com/{get_my_username()}/status/{new_tweet_id}")
-                        log_attempt(tweet['text'], ai_reply, feedback, final_reply, 'accepted')
-                    else:
-                        print("Reply posted, but could not retrieve tweet ID.")
-                        log_attempt(tweet['text'], ai_reply, feedback, final_reply, 'accepted')
+                    queue_reply(tweet['text'], tweet['id'], ai_reply, feedback, final_reply, tweet.get('author_id'))
                     return
                 else:
                     print("Aborted by user.")
-                    log_attempt(tweet['text'], ai_reply, feedback, final_reply, 'rejected')
+                    log_attempt(tweet['text'], ai_reply, feedback, final_reply, 'rejected',
+                                in_reply_to_id=str(tweet['id']), author_id=tweet.get('author_id'))
                     return
             else:
-                log_attempt(tweet['text'], ai_reply, feedback, '', 'rejected')
+                log_attempt(tweet['text'], ai_reply, feedback, '', 'rejected',
+                            in_reply_to_id=str(tweet['id']), author_id=tweet.get('author_id'))
                 feedback = user_feedback
     except KeyboardInterrupt:
         print("\nInterrupted by user.")
     except Exception as e:
         print(f"Unexpected error: {e}")
+    finally:
+        deliver_queued_posts()
 
 def get_my_username():
-    client = twitter_client.get_twitter_client()
-    user = client.get_me().data
+    user = twitter_client.call_api('get_me').data
     return user.username if hasattr(user, 'username') else 'me'
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+import argparse
+import time
+
+from twitter_agent.src import outbox
+from twitter_agent.src.drafts import DraftQueue, APPROVED, REJECTED, REGENERATING
+from twitter_agent.scripts import reply_to_tweet
+from twitter_agent.scripts.generate_drafts import DraftProducer, regenerate_draft
+
+TOPIC_DISCLAIMER = "\n\n(This tweet was AI generated based on my personality.)"
+PROMPT = "[Enter/a] approve  [e] edit  [r] reject  [g] regenerate  [s] skip  [q] quit  (or type feedback to regenerate): "
+
+def show_draft(draft, position, total):
+    print("\n" + "=" * 60)
+    if draft['kind'] == 'reply':
+        tweet = draft['tweet']
+        story = f" | Story: {tweet['story_size']} tweets" if tweet.get('story_size', 1) > 1 else ''
+        print(f"[{position}/{total}] Reply to @{tweet.get('author_username', 'unknown')} | Engagement: {tweet.get('engagement', 'n/a')}{story}")
+        print(tweet.get('text', ''))
+        if tweet.get('quoted_text'):
+            print(f"  [Quoted] {tweet['quoted_text']}")
+        if tweet.get('author_username'):
+            print(f"https://twitter.com/{tweet['author_username']}/status/{tweet['id']}")
+    else:
+        label = 'Long tweet' if draft.get('long') else 'Tweet'
+        print(f"[{position}/{total}] {label} about: {draft['topic']}")
+    if draft.get('feedback'):
+        print(f"(Regenerated with feedback: {draft['feedback']})")
+    print("-" * 60)
+    print(draft['text'])
+    print("-" * 60)
+    if draft.get('rule_violations'):
+        print(f"[WARNING] Breaks the formatting rules: {', '.join(draft['rule_violations'])}. Edit or regenerate it.")
+    if draft.get('style') is not None:
+        print(f"Style: further from your usual tweets than {draft['style'] * 100:.0f}% of them")
+
+def publish(draft, text):
+    """
+    Queue an approved draft in the outbox (the background worker delivers it) and log reply attempts.
+
+    Returns:
+        dict: The outbox entry
+    """
+    if draft['kind'] == 'reply':
+        tweet = draft['tweet']
+        entry = reply_to_tweet.queue_reply(tweet['text'], tweet['id'], draft['text'], draft.get('feedback'), text,
+                                          tweet.get('author_id'))
+    else:
+        entry = outbox.enqueue(text.strip() + TOPIC_DISCLAIMER, kind='tweet')
+        print(f"Tweet queued for delivery (outbox id {entry['id']}).")
+    return entry
+
+def review(draft_queue, producer=None):
+    skipped = set()
+    reviewed = 0
+    while True:
+        draft_queue.refresh()
+        drafts = [d for d in draft_queue.pending() if d['id'] not in skipped]
+        if not drafts:
+            waiting = producer is not None and producer.has_work()
+            if not waiting:
+                break
+            print("\rWaiting for more drafts... (Ctrl+C to stop)", end='', flush=True)
+            time.sleep(1)
+            continue
+        draft = drafts[0]
+        show_draft(draft, 1, len(drafts))
+        action = input(PROMPT).strip()
+        if action.lower() == 'q':
+            break
+        if action.lower() == 's':
+            skipped.add(draft['id'])
+            continue
+        if action.lower() == 'r':
+            draft_queue.update(draft['id'], status=REJECTED)
+            if draft['kind'] == 'reply':
+                reply_to_tweet.log_attempt(draft['tweet']['text'], draft['text'], draft.get('feedback'), '', 'rejected',
+                                           in_reply_to_id=str(draft['tweet']['id']),
+                                           author_id=draft['tweet'].get('author_id'))
+            reviewed += 1
+            continue
+        if action.lower() == 'g' or (action and action.lower() not in ('e', 'a')):
+            feedback = None if action.lower() == 'g' else action
+            if draft['kind'] == 'reply' and feedback:
+                reply_to_tweet.log_attempt(draft['tweet']['text'], draft['text'], feedback, '', 'rejected',
+                                           in_reply_to_id=str(draft['tweet']['id']),
+                                           author_id=draft['tweet'].get('author_id'))
+            draft_queue.update(draft['id'], status=REGENERATING)
+            if producer is not None:
+                producer.request_regeneration(draft, feedback)
+            else:
+                regenerate_draft(draft_queue, draft, feedback)
+            reviewed += 1
+            continue
+        text = draft['text']
+        if action.lower() == 'e':
+            edited = input("Edited text (Enter to keep): ").strip()
+            text = edited or text
+        entry = publish(draft, text)
+        draft_queue.update(draft['id'], status=APPROVED, final_text=text, outbox_id=entry['id'])
+        reviewed += 1
+    print(f"\nReviewed {reviewed} drafts. {draft_queue.pending_count()} still pending.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Review queued drafts: approve, edit, reject or regenerate them one after another.")
+    parser.add_argument('--refill', action='store_true', help='Keep drafting replies from the home timeline in the background while you review')
+    parser.add_argument('--topic', action='append', default=[], help='Also keep topic tweet drafts coming in the background (repeatable)')
+    parser.add_argument('--long', action='store_true', help='Background topic drafts are long tweets')
+    parser.add_argument('--batch-size', type=int, default=20, help='Timeline tweets fetched per background refill')
+    parser.add_argument('--low-water', type=int, default=5, help='Refill when fewer than this many drafts are pending')
+    parser.add_argument('--workers', type=int, default=4, help='Model calls in flight at once in the background')
+    parser.add_argument('--compact', action='store_true', help='Compact the queue file before reviewing (only when no producer is running)')
+    args = parser.parse_args()
+
+    draft_queue = DraftQueue()
+    # Regenerations are only run by a reviewer, so any left over are from one that quit
+    draft_queue.recover_regenerating(max_age=0)
+    if args.compact:
+        draft_queue.compact()
+    producer = DraftProducer(
+        draft_queue,
+        refill=args.refill or bool(args.topic),
+        batch_size=args.batch_size if args.refill else 0,
+        low_water=args.low_water,
+        topics=args.topic,
+        long=args.long,
+        workers=args.workers,
+    )
+    producer.start()
+    try:
+        review(draft_queue, producer)
+    except KeyboardInterrupt:
+        print("\nInterrupted by user.")
+    finally:
+        producer.stop()
+        reply_to_tweet.deliver_queued_posts()
+
+if __name__ == "__main__":
+    main()
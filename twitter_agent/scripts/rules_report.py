@@ -0,0 +1,54 @@
+import argparse
+import time
+
+from twitter_agent.src import attempt_log, text_rules
+
+def print_rates(title, checks, stats):
+    print(f"{title}: {checks} texts checked")
+    for name in text_rules.RULES:
+        rule = stats[name]
+        print(f"  {name:<17} {rule['violated']:>5} violations ({rule['rate'] * 100:5.1f}%)  "
+              f"{rule['repaired']:>5} repaired locally  {rule.get('regenerated', 0):>5} regenerated  "
+              f"{rule['unrepaired']:>5} unrepaired")
+
+def history_rates():
+    """
+    Re-check every model reply in the attempt log, to see how often the rules were broken before enforcement.
+    """
+    texts = {record['ai_reply'] for record in attempt_log.iter_records() if record.get('ai_reply')}
+    stats = {name: {'violated': 0, 'repaired': 0, 'unrepaired': 0} for name in text_rules.RULES}
+    for text in texts:
+        result = text_rules.repair(text, 'reply')
+        for name in result.violations:
+            stats[name]['violated'] += 1
+            stats[name]['repaired' if name in result.repaired else 'unrepaired'] += 1
+    for rule in stats.values():
+        rule['rate'] = rule['violated'] / len(texts) if texts else 0.0
+    return len(texts), stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Violation rates of the formatting rules for generated text, per rule.")
+    parser.add_argument('--days', type=float, default=7, help='Period of enforced checks to report on')
+    parser.add_argument('--history', action='store_true', help='Also re-check the model replies in the attempt log')
+    parser.add_argument('--check', type=str, help='Check and repair one text')
+    parser.add_argument('--kind', type=str, default='reply', choices=sorted(text_rules.LIMITS), help='Kind of text for --check')
+    args = parser.parse_args()
+
+    if args.check:
+        start = time.perf_counter()
+        result = text_rules.repair(args.check, args.kind)
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        print(f"Violations: {', '.join(result.violations) or 'none'} [{elapsed_us:.0f} us]")
+        if result.violations:
+            print(f"Repaired: {', '.join(result.repaired) or 'none'}; still broken: {', '.join(result.unrepaired) or 'none'}")
+            print(f"\n{result.text}")
+        return
+
+    checks, stats = text_rules.violation_rates(since=time.time() - args.days * 86400)
+    print_rates(f"Enforced checks over the last {args.days:g} day(s)", checks, stats)
+    if args.history:
+        print()
+        print_rates("Model replies in the attempt log", *history_rates())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import time
+
+from twitter_agent.src import corpus, relevance
+from twitter_agent.src.hydration import TweetCache
+
+def format_rate(value):
+    return 'n/a' if value is None else f"{value * 100:.1f}%"
+
+def print_report(report):
+    print(f"Trained {report['trained_at']} | train {report['train']['examples']} examples "
+          f"({report['train']['positives']} positive), eval {report['eval']['examples']} "
+          f"({report['eval']['positives']} positive)")
+    train_auc = report['train_auc']
+    eval_auc = report['eval_auc']
+    print(f"AUC: train {train_auc:.3f}" if train_auc is not None else "AUC: train n/a", end='')
+    print(f", eval {eval_auc:.3f}" if eval_auc is not None else ", eval n/a")
+    point = report['operating_point']
+    print(f"\nThreshold {point['threshold']:.4f} (target recall {format_rate(report['target_recall'])}, "
+          f"calibrated on {report['threshold_calibrated_on']}):")
+    print(f"  eval recall {format_rate(point['recall'])}, precision {format_rate(point['precision'])}, "
+          f"forwarded to the model {format_rate(point['forwarded'])}")
+    if report['curve']:
+        print("\nRecall / forwarded trade-off on eval:")
+        for row in report['curve']:
+            print(f"  threshold {row['threshold']:.4f}: recall {format_rate(row['recall'])}, "
+                  f"precision {format_rate(row['precision'])}, forwarded {format_rate(row['forwarded'])}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local relevance pre-filter on our own reply history and report how it does.")
+    parser.add_argument('--target-recall', type=float, help='Share of would-reply tweets the filter must keep (default: RELEVANCE_TARGET_RECALL)')
+    parser.add_argument('--eval-percent', type=int, default=20, help='Share of examples held out for evaluation')
+    parser.add_argument('--hydrate', action='store_true', help='Fetch the text of replied-to tweets missing from the tweet cache first (uses the API)')
+    parser.add_argument('--report', action='store_true', help='Only print the evaluation report of the saved model')
+    parser.add_argument('--score', type=str, help='Score a tweet text with the saved model')
+    args = parser.parse_args()
+
+    if args.report or args.score:
+        model = relevance.RelevanceFilter.load()
+        if model is None:
+            print("No relevance model trained yet.")
+            return
+        if args.report:
+            print_report(model.report)
+        if args.score:
+            start = time.perf_counter()
+            score = model.score(args.score)
+            elapsed_us = (time.perf_counter() - start) * 1e6
+            verdict = 'forward to model' if score >= model.threshold else 'skip'
+            print(f"Score {score:.4f} (threshold {model.threshold:.4f}): {verdict} [{elapsed_us:.0f} us]")
+        return
+
+    tweet_cache = TweetCache()
+    if args.hydrate:
+        parents = [
+            ref['id'] for record in corpus.iter_corpus() if record['type'] == 'reply'
+            for ref in record['referenced_tweets'] if ref.get('type') == 'replied_to'
+        ]
+        print(f"Fetched {tweet_cache.hydrate(parents)} replied-to tweets into the cache.")
+    examples = relevance.load_examples(tweet_cache=tweet_cache)
+    positives = sum(label for _, label, _ in examples)
+    print(f"Loaded {len(examples)} examples ({positives} positive).")
+    try:
+        model = relevance.train(examples, target_recall=args.target_recall, eval_percent=args.eval_percent)
+    except ValueError as e:
+        print(f"Cannot train: {e}")
+        return
+    model.save()
+    print_report(model.report)
+    print(f"\nSaved to {relevance.MODEL_PATH}. Drafting now skips tweets scoring below the threshold (RELEVANCE_FILTER=false to disable).")
+
+if __name__ == "__main__":
+    main()
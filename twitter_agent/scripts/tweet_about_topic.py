@@ -2,7 +2,7 @@ import argparse
 import sys
 import os
 
-from twitter_agent.src import twitter_client, ai_client
+from twitter_agent.src import twitter_client, ai_client, outbox
 
 def main():
     parser = argparse.ArgumentParser(description="Generate and post a tweet about a given topic using the fine-tuned model.")
@@ -40,19 +40,22 @@ def main():
             # Accept and post
             disclaimer = "\n\n(This tweet was AI generated based on my personality.)"
             tweet_text += disclaimer
-            try:
-                response = twitter_client.post_tweet(tweet_text)
-                tweet_id = response.data['id'] if hasattr(response, 'data') and 'id' in response.data else None
-                print(f"Successfully posted tweet! Tweet ID: {tweet_id}")
-                print(f"Link: https://twitter.com/{get_my_username()}/status/{tweet_id}")
-            except Exception as e:
-                print(f"Error posting tweet: {e}")
+            entry = outbox.enqueue(tweet_text, kind='tweet')
+            print(f"Tweet queued for delivery (outbox id {entry['id']}).")
+            entry = outbox.wait_for(entry['id'], timeout=30)
+            if entry['status'] == outbox.DELIVERED:
+                print(f"Successfully posted tweet! Tweet ID: {entry['tweet_id']}")
+                print(f"Link: https://twitter.com/{get_my_username()}/status/{entry['tweet_id']}")
+            elif entry['status'] == outbox.FAILED:
+                print(f"Error posting tweet: {entry['error']}")
                 sys.exit(1)
+            else:
+                print(f"Tweet is still queued ({entry.get('error') or 'waiting for delivery'}); it will be delivered on the next run "
+                      "or by `python3 -m twitter_agent.scripts.deliver_outbox`.")
             break
 
 def get_my_username():
-    client = twitter_client.get_twitter_client()
-    user = client.get_me().data
+    user = twitter_client.call_api('get_me').data
     return user.username if hasattr(user, 'username') else 'me'
 
 if __name__ == "__main__":
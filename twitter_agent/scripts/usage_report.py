@@ -0,0 +1,51 @@
+import argparse
+import time
+
+from twitter_agent.src import ai_client, token_budget
+
+def format_budget(spent, budget):
+    return f"${spent:.4f}" + (f" of ${budget:.2f} ({spent / budget * 100:.0f}%)" if budget > 0 else " (no limit)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Model token usage, budget status and cost per posted reply.")
+    parser.add_argument('--days', type=float, default=1, help='Period to break usage down over')
+    parser.add_argument('--by', type=str, default='account,script,request_type',
+                        help='Comma-separated grouping: any of account, script, request_type, model')
+    parser.add_argument('--trend', type=int, default=7, help='Show cost per posted reply for each of the last N days')
+    args = parser.parse_args()
+
+    governor = token_budget.get_governor()
+    print(f"Budget for {governor.account}: level {governor.level().upper()}")
+    print(f"  Last hour: {format_budget(governor.spent(token_budget.HOUR), governor.hourly_budget)}")
+    print(f"  Last day:  {format_budget(governor.spent(token_budget.DAY), governor.daily_budget)}")
+
+    print("\nmax_tokens by request type (observed / configured cap):")
+    for request_type, cap in ai_client.MAX_TOKENS.items():
+        print(f"  {request_type:<12} {governor.max_tokens_for(request_type, cap):>5} / {cap}")
+
+    since = time.time() - args.days * token_budget.DAY
+    group_by = tuple(field.strip() for field in args.by.split(',') if field.strip())
+    summary = token_budget.usage_summary(since=since, group_by=group_by)
+    print(f"\nUsage over the last {args.days:g} day(s) by {', '.join(group_by)}:")
+    for key, group in sorted(summary.items(), key=lambda item: item[1]['cost'], reverse=True):
+        print(f"  {' / '.join(str(k) for k in key):<50} {group['calls']:>5} calls  "
+              f"{group['prompt_tokens']:>8} in  {group['completion_tokens']:>7} out  ${group['cost']:.4f}")
+    if not summary:
+        print("  (no model calls recorded)")
+
+    cost, posted, per_reply = token_budget.cost_per_posted_reply(since=since)
+    per_reply_text = f"${per_reply:.4f}" if per_reply is not None else 'n/a'
+    print(f"\nReply generation cost ${cost:.4f} for {posted} posted replies: {per_reply_text} per posted reply")
+
+    if args.trend:
+        print("\nCost per posted reply by day:")
+        now = time.time()
+        for days_ago in range(args.trend - 1, -1, -1):
+            start = now - (days_ago + 1) * token_budget.DAY
+            end = now - days_ago * token_budget.DAY
+            day_cost, day_posted, _ = token_budget.cost_per_posted_reply(since=start, until=end)
+            value = f"${day_cost / day_posted:.4f}" if day_posted else 'n/a'
+            print(f"  {time.strftime('%Y-%m-%d', time.gmtime(end))}  {day_posted:>4} posted  ${day_cost:.4f}  {value}")
+
+if __name__ == "__main__":
+    main()
@@ -5,22 +5,129 @@ import os
 from twitter_agent.src.personality import get_tweet_guidance
 try:
     from . import config
+    from . import resilience
+    from . import style_profile
+    from . import text_rules
+    from . import token_budget
+    from . import transport
 except ImportError:
     import config
+    import resilience
+    import style_profile
+    import text_rules
+    import token_budget
+    import transport
 
 # Set OpenAI API key
 openai.api_key = config.OPENAI_API_KEY
+# Retries are handled by create_chat_completion, not the SDK
+openai.max_retries = 0
+# API_TRANSPORT=record/replay routes calls through a cassette
+transport.install_openai(openai)
 
-def generate_tweet_reply(tweet_text, feedback=None):
+MODEL = "ft:gpt-4.1-mini-2025-04-14:blockapps::BN4Ftmd0"
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+# Upper bounds on completion length; the token governor lowers them from observed lengths
+MAX_TOKENS = {'reply': 150, 'topic': 100, 'topic_long': 2000}
+_breaker = resilience.CircuitBreaker(config.OPENAI_BREAKER_FAILURES, config.OPENAI_BREAKER_RESET_SECONDS)
+_latency = resilience.LatencyTracker()
+
+def create_chat_completion(request_type='other', **kwargs):
+    """
+    Call the chat completions API with a deadline, jittered retries, optional hedging
+    and a circuit breaker shared by every call in this process.
+
+    The token governor refuses the call once a hard budget limit is reached, sizes
+    `max_tokens` for the request type from observed completion lengths, and records
+    the token usage of every request that completes, hedges included.
+
+    Args:
+        request_type (str): What is being generated ('reply', 'topic', 'topic_long', ...)
+        **kwargs: Passed through to openai.chat.completions.create
+
+    Returns:
+        The OpenAI chat completion response
+
+    Raises:
+        token_budget.BudgetExceeded, resilience.DeadlineExceeded, resilience.CircuitOpenError,
+        or the last OpenAI error
+    """
+    governor = token_budget.get_governor()
+    governor.check(request_type)
+    if 'max_tokens' in kwargs:
+        kwargs['max_tokens'] = governor.max_tokens_for(request_type, kwargs['max_tokens'])
+
+    def record_usage(response):
+        # Every completed request is billed, including a hedge that lost the race
+        if getattr(response, 'usage', None) is not None:
+            finish_reason = response.choices[0].finish_reason if response.choices else None
+            governor.record(request_type, kwargs.get('model'), response.usage, finish_reason, choices=kwargs.get('n', 1))
+
+    return resilience.call_with_resilience(
+        lambda timeout: openai.chat.completions.create(timeout=timeout, **kwargs),
+        deadline=config.OPENAI_DEADLINE_SECONDS,
+        attempt_timeout=config.OPENAI_TIMEOUT_SECONDS,
+        max_retries=config.OPENAI_MAX_RETRIES,
+        retryable=RETRYABLE_ERRORS,
+        breaker=_breaker,
+        tracker=_latency,
+        hedge=config.OPENAI_HEDGE,
+        on_result=record_usage,
+    )
+
+def candidate_kwargs():
+    """
+    Extra create_chat_completion arguments to get STYLE_CANDIDATES completions from one call.
+    Near the budget limit (governor SOFT or HARD) only one completion is asked for, since
+    every extra candidate is billed.
+    """
+    if config.STYLE_CANDIDATES <= 1 or token_budget.get_governor().level() != token_budget.OK:
+        return {}
+    return {'n': config.STYLE_CANDIDATES}
+
+def pick_by_style(texts, kind):
+    """
+    The candidate closest to the style profile of the tweet history (see style_profile.py).
+    Without candidates to choose from or a corpus to compare with, the first one.
+    """
+    texts = [t for t in texts if t]
+    if len(texts) < 2:
+        return texts[0] if texts else None
+    profile = style_profile.get_profile()
+    if profile is None:
+        return texts[0]
+    return profile.rank(texts, kind)[0][0]
+
+def _parse_reply(content, verbose):
+    # Try to parse JSON response
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        # If not valid JSON, but non-empty, treat as reply
+        if content:
+            if verbose:
+                print("[WARNING] AI reply not in expected JSON format. Showing raw reply for approval.")
+            return {"respond": True, "reply": content}
+        else:
+            return {"respond": False}
+
+def generate_tweet_reply(tweet_text, feedback=None, verbose=True):
     """
     Generate a reply to a tweet using the fine-tuned GPT-4 model.
     
     Args:
         tweet_text (str): The text of the tweet to respond to
         feedback (str): Optional user feedback for improvement
+        verbose (bool): Print the raw model response (turn off for background generation)
         
     Returns:
-        dict: JSON response with 'respond' and possibly 'reply' fields
+        dict: JSON response with 'respond' and possibly 'reply' fields.
+            If the model could not be reached, 'respond' is False and 'error' says why.
     """
     try:
         guidance = get_tweet_guidance()
@@ -30,43 +137,51 @@ def generate_tweet_reply(tweet_text, feedback=None):
         )
         if feedback:
             prompt += f"\n\nUser feedback for improvement: {feedback}"
-        response = openai.chat.completions.create(
-            model="ft:gpt-4.1-mini-2025-04-14:blockapps::BN4Ftmd0",
+        response = create_chat_completion(
+            request_type='reply',
+            model=MODEL,
             messages=[
                 {"role": "system", "content": prompt}
             ],
             temperature=0.7,
-            max_tokens=150
+            max_tokens=MAX_TOKENS['reply'],
+            **candidate_kwargs()
         )
         
-        content = response.choices[0].message.content.strip()
-        print("[DEBUG] Raw OpenAI response:", response)
-        print("[DEBUG] Parsed content:", content)
+        contents = [choice.message.content.strip() for choice in response.choices]
+        if verbose:
+            print("[DEBUG] Raw OpenAI response:", response)
+            print("[DEBUG] Parsed content:", contents[0] if len(contents) == 1 else contents)
         
-        # Try to parse JSON response
-        try:
-            return json.loads(content)
-        except json.JSONDecodeError:
-            # If not valid JSON, but non-empty, treat as reply
-            if content:
-                print("[WARNING] AI reply not in expected JSON format. Showing raw reply for approval.")
-                return {"respond": True, "reply": content}
-            else:
-                return {"respond": False}
+        parsed = [_parse_reply(content, verbose) for content in contents]
+        replies = [p for p in parsed if isinstance(p, dict) and p.get('respond') and p.get('reply')]
+        # Whether to respond is the candidates' majority vote (a tie goes the way of the first),
+        # so sampling more candidates doesn't make declining rarer
+        declines = [p for p in parsed if p not in replies]
+        if len(declines) > len(replies) or (len(declines) == len(replies) and parsed[0] in declines):
+            return declines[0]
+        if len(replies) > 1:
+            # Several candidates: keep the one that reads most like the tweet history
+            best = pick_by_style([p['reply'] for p in replies], 'reply')
+            return next(p for p in replies if p['reply'] == best)
+        return replies[0]
                 
     except Exception as e:
-        print(f"Error generating reply: {e}")
-        return {"respond": False}
+        print(f"Error generating reply: {type(e).__name__}: {e}")
+        return {"respond": False, "error": str(e) or type(e).__name__}
 
 def generate_topic_tweet(topic, long=False, feedback=None):
     """
     Generate an original tweet about a given topic, with no user mentions or reply formatting.
+    The formatting rules are enforced with text_rules: violations are repaired locally
+    (an overlong tweet is trimmed at a sentence boundary) and the model is only asked
+    again for ones that can't be.
     Args:
         topic (str): The topic to tweet about
         long (bool): If True, generate a longer, more detailed tweet (up to 4000 characters)
         feedback (str): Optional user feedback to guide the tweet
     Returns:
-        str: The generated tweet text
+        str: The generated tweet text, or None if the model could not be reached
     """
     try:
         guidance = get_tweet_guidance()
@@ -77,33 +192,42 @@ def generate_topic_tweet(topic, long=False, feedback=None):
                 "Do not mention or tag any users. Do not use @ or reply formatting. "
                 "Make it a standalone statement. Match my style."
             )
-            max_tokens = 2000
-            char_limit = 4000
+            max_tokens = MAX_TOKENS['topic_long']
+            kind = 'topic_long'
         else:
             prompt = (
                 f"Write an original tweet about {topic}. "
                 "Do not mention or tag any users. Do not use @ or reply formatting. "
                 "Make it a standalone statement. Match my style."
             )
-            max_tokens = 100
-            char_limit = 280
-        if feedback:
-            prompt += f"\n\nFeedback for improvement: {feedback}"
-        response = openai.chat.completions.create(
-            model="ft:gpt-4.1-mini-2025-04-14:blockapps::BN4Ftmd0",
-            messages=[
-                {"role": "system", "content": guidance},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.8,
-            max_tokens=max_tokens
-        )
-        tweet_text = response.choices[0].message.content.strip()
+            max_tokens = MAX_TOKENS['topic']
+            kind = 'topic'
+
+        def ask(rule_feedback=None):
+            notes = [note for note in (feedback, rule_feedback) if note]
+            content = prompt + (f"\n\nFeedback for improvement: {' '.join(notes)}" if notes else '')
+            response = create_chat_completion(
+                request_type=kind,
+                model=MODEL,
+                messages=[
+                    {"role": "system", "content": guidance},
+                    {"role": "user", "content": content}
+                ],
+                temperature=0.8,
+                max_tokens=max_tokens,
+                **candidate_kwargs()
+            )
+            return pick_by_style([choice.message.content.strip() for choice in response.choices], kind)
+
+        result = text_rules.enforce(ask(), kind, regenerate=ask)
+        tweet_text = result.text
+        char_limit = text_rules.LIMITS[kind]
         if len(tweet_text) > char_limit:
-            tweet_text = tweet_text[:char_limit-3] + "..."
+            # No sentence fits even after asking again: cut at a word, never mid-word
+            tweet_text = text_rules.trim_at_word(tweet_text, char_limit)
         return tweet_text
     except Exception as e:
-        print(f"Error generating topic tweet: {e}")
+        print(f"Error generating topic tweet: {type(e).__name__}: {e}")
         return None
 
 def generate_original_tweet():
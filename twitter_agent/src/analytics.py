@@ -0,0 +1,253 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from . import corpus
+
+CACHE_PATH = 'data/analytics_cache.npz'
+TYPES = ('original', 'reply', 'quote', 'retweet')
+LENGTH_EDGES = (0, 50, 100, 140, 200, 281)
+LENGTH_LABELS = ('0-49', '50-99', '100-139', '140-199', '200-280', '281+')
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+COLUMNS = ('id', 'ts', 'type', 'length', 'conversation_id',
+           'impressions', 'likes', 'replies', 'retweets', 'quotes', 'bookmarks')
+
+def _empty_columns():
+    return {
+        'id': np.zeros(0, dtype=np.int64),
+        'ts': np.zeros(0, dtype=np.float64),
+        'type': np.zeros(0, dtype=np.int8),
+        'length': np.zeros(0, dtype=np.int32),
+        'conversation_id': np.zeros(0, dtype=np.int64),
+        'impressions': np.zeros(0, dtype=np.int64),
+        'likes': np.zeros(0, dtype=np.int64),
+        'replies': np.zeros(0, dtype=np.int64),
+        'retweets': np.zeros(0, dtype=np.int64),
+        'quotes': np.zeros(0, dtype=np.int64),
+        'bookmarks': np.zeros(0, dtype=np.int64),
+    }
+
+def records_to_columns(records):
+    """
+    Turn normalized corpus records into NumPy columns, one row per tweet.
+    """
+    rows = []
+    for r in records:
+        created = corpus.parse_created_at(r['created_at'])
+        m = r['metrics']
+        rows.append((
+            int(r['id']),
+            created.timestamp() if created else np.nan,
+            TYPES.index(r['type']) if r['type'] in TYPES else 0,
+            len(r['text']),
+            int(r['conversation_id']) if r['conversation_id'] else int(r['id']),
+            m.get('impression_count', 0),
+            m.get('like_count', 0),
+            m.get('reply_count', 0),
+            m.get('retweet_count', 0),
+            m.get('quote_count', 0),
+            m.get('bookmark_count', 0),
+        ))
+    columns = _empty_columns()
+    if not rows:
+        return columns
+    for name, values in zip(COLUMNS, zip(*rows)):
+        columns[name] = np.asarray(values, dtype=columns[name].dtype)
+    return columns
+
+def merge_columns(old, new):
+    """
+    Append new rows to old ones; when a tweet ID appears in both, the new row wins.
+    """
+    merged = {name: np.concatenate([old[name], new[name]]) for name in COLUMNS}
+    # np.unique returns the first occurrence, so look at the rows in reverse to keep the newest
+    _, first_in_reversed = np.unique(merged['id'][::-1], return_index=True)
+    keep = np.sort(len(merged['id']) - 1 - first_in_reversed)
+    return {name: values[keep] for name, values in merged.items()}
+
+def engagement(columns):
+    return (columns['likes'] + columns['replies'] + columns['retweets']
+            + columns['quotes'] + columns['bookmarks'])
+
+def hour_of_week(columns):
+    """
+    Hour of the week in UTC, 0 = Monday 00:00, for every row (-1 when the timestamp is missing).
+    """
+    ts = columns['ts']
+    valid = ~np.isnan(ts)
+    hours = np.full(ts.shape, -1, dtype=np.int64)
+    epoch_hours = np.floor(ts[valid] / 3600).astype(np.int64)
+    # 1970-01-01 was a Thursday, i.e. hour 72 of its week
+    hours[valid] = (epoch_hours + 72) % 168
+    return hours
+
+def _grouped_rates(groups, n_groups, eng, impressions):
+    eng_sum = np.bincount(groups, weights=eng, minlength=n_groups)
+    imp_sum = np.bincount(groups, weights=impressions, minlength=n_groups)
+    counts = np.bincount(groups, minlength=n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = np.where(imp_sum > 0, eng_sum / imp_sum, np.nan)
+    return rates, eng_sum, imp_sum, counts
+
+def compute_stats(columns):
+    """
+    Compute engagement rate (engagements / impressions) by hour of week, tweet type,
+    length bucket and conversation. Tweets without impressions (e.g. retweets, whose
+    metrics belong to the original) count towards 'tweets' but not towards the rates.
+
+    Returns:
+        dict: NumPy arrays keyed by grouping, plus the overall rate
+    """
+    impressions = columns['impressions'].astype(np.float64)
+    has_impressions = impressions > 0
+    eng = np.where(has_impressions, engagement(columns), 0).astype(np.float64)
+
+    # Posting windows are about our own posts, so retweets are left out
+    how = hour_of_week(columns)
+    valid_how = (how >= 0) & (columns['type'] != TYPES.index('retweet'))
+    how_rates, how_eng, how_imp, how_counts = _grouped_rates(
+        how[valid_how], 168, eng[valid_how], impressions[valid_how])
+
+    type_rates, _, _, type_counts = _grouped_rates(
+        columns['type'].astype(np.int64), len(TYPES), eng, impressions)
+
+    buckets = np.digitize(columns['length'], LENGTH_EDGES[1:])
+    length_rates, _, _, length_counts = _grouped_rates(
+        buckets, len(LENGTH_LABELS), eng, impressions)
+
+    conv_ids, conv_index = np.unique(columns['conversation_id'], return_inverse=True)
+    conv_rates, conv_eng, conv_imp, conv_counts = _grouped_rates(
+        conv_index, len(conv_ids), eng, impressions)
+
+    total_imp = impressions.sum()
+    return {
+        'overall_rate': float(eng.sum() / total_imp) if total_imp else float('nan'),
+        'hour_of_week': {'rate': how_rates, 'engagement': how_eng, 'impressions': how_imp, 'tweets': how_counts},
+        'type': {'labels': TYPES, 'rate': type_rates, 'tweets': type_counts},
+        'length': {'labels': LENGTH_LABELS, 'rate': length_rates, 'tweets': length_counts},
+        'conversation': {'id': conv_ids, 'rate': conv_rates, 'engagement': conv_eng,
+                         'impressions': conv_imp, 'tweets': conv_counts},
+    }
+
+def recommend_posting_windows(stats, top_n=5, prior_weight=None):
+    """
+    Rank hours of the week by engagement rate, shrunk towards the overall rate so a
+    single lucky tweet doesn't make an hour look great.
+
+    Args:
+        stats (dict): Output of compute_stats
+        top_n (int): How many windows to return
+        prior_weight (float): Impressions' worth of weight given to the overall rate
+            (default: the median impressions of an hour slot that has any)
+
+    Returns:
+        list: Dicts with 'weekday', 'hour' (UTC), 'hour_of_week', 'rate', 'raw_rate' and 'tweets', best first
+    """
+    how = stats['hour_of_week']
+    overall = stats['overall_rate']
+    if np.isnan(overall):
+        return []
+    if prior_weight is None:
+        nonzero = how['impressions'][how['impressions'] > 0]
+        prior_weight = float(np.median(nonzero)) if nonzero.size else 1.0
+    shrunk = (how['engagement'] + overall * prior_weight) / (how['impressions'] + prior_weight)
+    order = np.argsort(-shrunk)[:top_n]
+    return [
+        {
+            'weekday': WEEKDAYS[i // 24],
+            'hour': int(i % 24),
+            'hour_of_week': int(i),
+            'rate': float(shrunk[i]),
+            'raw_rate': float(how['rate'][i]) if not np.isnan(how['rate'][i]) else None,
+            'tweets': int(how['tweets'][i]),
+        }
+        for i in order
+    ]
+
+def next_posting_time(windows, after=None):
+    """
+    Return the start of the next recommended posting window after a given time.
+
+    Args:
+        windows (list): Output of recommend_posting_windows
+        after (datetime): Aware datetime to search from (default: now, UTC)
+
+    Returns:
+        datetime: Start of the next window in UTC, or None if there are no windows
+    """
+    if not windows:
+        return None
+    after = (after or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    monday = (after - timedelta(days=after.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    current = int((after - monday) // timedelta(hours=1))
+    slots = {w['hour_of_week'] for w in windows}
+    if current in slots:
+        return after
+    wait = min((slot - current) % 168 for slot in slots)
+    return monday + timedelta(hours=current + wait)
+
+def load_cache(path=CACHE_PATH):
+    """
+    Load cached columns and the per-file read state.
+
+    Returns:
+        tuple: (columns dict, offsets dict of path -> [size, bytes read, fingerprint])
+    """
+    if not os.path.exists(path):
+        return _empty_columns(), {}
+    with np.load(path, allow_pickle=False) as data:
+        columns = {name: data[name] for name in COLUMNS}
+        offsets = corpus.unpack_offsets(data)
+    return columns, offsets
+
+def save_cache(columns, offsets, path=CACHE_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, **corpus.pack_offsets(offsets), **columns)
+    os.replace(tmp_path, path)
+
+def update_columns(paths=None, cache_path=CACHE_PATH, full=False):
+    """
+    Bring the cached metric columns up to date with the corpus files.
+
+    Only bytes appended since the last run are parsed. A file that shrank or was
+    rewritten is re-read from the start (see corpus.read_appended); re-synced
+    tweets replace their old rows, so updated metrics are picked up.
+
+    Args:
+        paths (list): Corpus files (default: corpus.corpus_paths())
+        cache_path (str): Where the columns are cached
+        full (bool): Ignore the cache and rebuild from scratch
+
+    Returns:
+        dict: Up-to-date NumPy columns
+    """
+    if paths is None:
+        paths = corpus.corpus_paths()
+    columns, offsets = (_empty_columns(), {}) if full else load_cache(cache_path)
+    changed = False
+    # Oldest files first so that rows from newer files win in merge_columns
+    for path in reversed(paths):
+        records, offsets[path] = corpus.read_appended(path, offsets.get(path))
+        if records is None:
+            continue
+        if records:
+            columns = merge_columns(columns, records_to_columns(records))
+        changed = True
+    if changed:
+        save_cache(columns, offsets, cache_path)
+    return columns
+
+def engagement_report(paths=None, cache_path=CACHE_PATH, full=False, top_n=5):
+    """
+    Update the cache and compute all engagement stats plus posting-window recommendations.
+
+    Returns:
+        dict: compute_stats output with 'windows' (recommend_posting_windows) and 'tweet_count'
+    """
+    columns = update_columns(paths, cache_path, full)
+    stats = compute_stats(columns)
+    stats['windows'] = recommend_posting_windows(stats, top_n=top_n)
+    stats['tweet_count'] = int(columns['id'].size)
+    return stats
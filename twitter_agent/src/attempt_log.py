@@ -0,0 +1,59 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+ATTEMPT_LOG_PATH = 'data/attempted_replies.jsonl'
+
+_lock = threading.Lock()
+
+def append(record, log_path=ATTEMPT_LOG_PATH):
+    """
+    Append one record to the attempt log, stamping it with the current UTC time.
+    """
+    stamped = {'timestamp': datetime.utcnow().isoformat() + 'Z'}
+    stamped.update(record)
+    record = stamped
+    with _lock:
+        os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+        with open(log_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+    return record
+
+def log_attempt(original_tweet, ai_reply, user_feedback, final_reply, status=None, **extra):
+    """
+    Log one reply attempt.
+
+    Args:
+        original_tweet (str): Text of the tweet being replied to
+        ai_reply (str): What the model generated
+        user_feedback (str): Feedback given for this attempt, if any
+        final_reply (str): The reply the user approved ('' if none)
+        status (str): 'accepted', 'rejected', 'no_ai_reply', ... (default: from final_reply)
+        **extra: Additional fields, e.g. outbox_id, in_reply_to_id
+    """
+    # If no status is provided, set to 'rejected' if final_reply is empty, else 'accepted'
+    if status is None:
+        status = 'accepted' if final_reply else 'rejected'
+    record = {
+        'original_tweet': original_tweet,
+        'ai_reply': ai_reply,
+        'user_feedback': user_feedback,
+        'final_reply': final_reply,
+        'status': status,
+    }
+    record.update(extra)
+    return append(record)
+
+def iter_records(log_path=ATTEMPT_LOG_PATH):
+    """
+    Yield every record in the attempt log, skipping unreadable lines.
+    """
+    if not os.path.exists(log_path):
+        return
+    with open(log_path, 'r') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
@@ -0,0 +1,216 @@
+import math
+import os
+import threading
+import time
+
+from . import attempt_log
+from . import config
+from . import corpus
+from . import twitter_client
+from .drafts import DRAFT_QUEUE_PATH, DraftQueue, APPROVED, REJECTED
+from .hydration import TWEET_CACHE_PATH, TweetCache
+from .jsonl_store import SnapshotLog
+
+AUTHOR_CACHE_PATH = 'data/authors.jsonl'
+USER_FIELDS = ['username', 'name']
+BATCH_SIZE = 100
+STATS_REFRESH_SECONDS = 60
+
+def _engagement(metrics):
+    return sum(metrics.get(k, 0) for k in ('like_count', 'reply_count', 'retweet_count', 'quote_count'))
+
+def compute_author_stats(tweet_cache=None, draft_queue=None):
+    """
+    Per-author reply statistics from the corpus, the attempt log and the draft queue.
+
+    - replies: how often we replied to the author (corpus replies whose parent is in the
+      tweet cache, plus posted replies the corpus doesn't have yet)
+    - reply_engagement: total engagement our replies to them received (corpus metrics,
+      or the latest response-monitor check for replies not in the corpus yet)
+    - approved / rejected: their tweets whose reply we approved, and ones we only ever
+      rejected (a tweet counts once, however many drafts or feedback rounds it took)
+
+    Returns:
+        dict: author_id -> stats dict
+    """
+    tweet_cache = tweet_cache or TweetCache()
+    draft_queue = draft_queue or DraftQueue(recover=False)
+    stats = {}
+
+    def bucket(author_id):
+        return stats.setdefault(str(author_id), {'replies': 0, 'reply_engagement': 0, 'approved': 0, 'rejected': 0})
+
+    replied = set()
+    approved = set()
+    rejected = {}
+
+    def approve(author_id, tweet_id):
+        # A draft approved in review is also logged as an accepted attempt; count it once
+        if tweet_id not in approved:
+            approved.add(tweet_id)
+            bucket(author_id)['approved'] += 1
+
+    for record in corpus.iter_corpus():
+        if record['type'] != 'reply':
+            continue
+        parent_id = next((r['id'] for r in record['referenced_tweets'] if r.get('type') == 'replied_to'), None)
+        parent = tweet_cache.get(parent_id) if parent_id else None
+        if parent and parent.get('author_id'):
+            author = bucket(parent['author_id'])
+            author['replies'] += 1
+            author['reply_engagement'] += _engagement(record['metrics'])
+            replied.add(record['id'])
+
+    posted = {}
+    monitored = {}
+    for record in attempt_log.iter_records():
+        if not record.get('author_id'):
+            continue
+        if record.get('status') == 'posted':
+            posted[str(record.get('tweet_id'))] = record['author_id']
+        elif record.get('status') == 'monitored':
+            monitored[str(record.get('tweet_id'))] = record.get('engagement', 0)
+        elif record.get('status') == 'accepted':
+            approve(record['author_id'], str(record.get('in_reply_to_id')))
+        elif record.get('status') == 'rejected' and record.get('in_reply_to_id'):
+            rejected[str(record['in_reply_to_id'])] = record['author_id']
+    for tweet_id, author_id in posted.items():
+        if tweet_id not in replied:
+            author = bucket(author_id)
+            author['replies'] += 1
+            author['reply_engagement'] += monitored.get(tweet_id, 0)
+
+    for draft in draft_queue.values():
+        tweet = draft.get('tweet') or {}
+        if draft['kind'] != 'reply' or not tweet.get('author_id'):
+            continue
+        if draft['status'] == APPROVED:
+            approve(tweet['author_id'], str(tweet['id']))
+        elif draft['status'] == REJECTED and not draft.get('prefiltered') and not draft.get('declined'):
+            rejected[str(tweet['id'])] = tweet['author_id']
+    for tweet_id, author_id in rejected.items():
+        if tweet_id not in approved:
+            bucket(author_id)['rejected'] += 1
+    return stats
+
+def affinity(stats):
+    """
+    How much we like replying to an author: the (log) number of interactions, signed
+    and weighted by how far the smoothed share of approved drafts is from even, plus
+    the (log) engagement our replies to them got. An unknown author scores 0; one
+    whose drafts we keep rejecting scores below 0.
+    """
+    if not stats:
+        return 0.0
+    acceptance = (stats['approved'] + 1) / (stats['approved'] + stats['rejected'] + 2)
+    interactions = stats['replies'] + stats['approved'] + stats['rejected']
+    mean_engagement = stats['reply_engagement'] / stats['replies'] if stats['replies'] else 0
+    return (2 * acceptance - 1) * math.log1p(interactions) + math.log1p(mean_engagement)
+
+class AuthorCache(SnapshotLog):
+    """
+    Persistent cache of author profiles with a TTL, plus per-author reply affinity.
+
+    Profiles ({'id', 'username', 'name', 'fetched_at', 'missing'}) live in
+    data/authors.jsonl. `resolve()` is the one lookup path: known, fresh authors come
+    from disk, the rest are fetched with get_users in batches of 100, so timeline
+    fetches don't need the author_id expansion. Stats are recomputed from the local
+    history files when they change.
+    """
+
+    def __init__(self, path=AUTHOR_CACHE_PATH, ttl_hours=None):
+        super().__init__(path)
+        self.ttl_seconds = (config.AUTHOR_CACHE_TTL_HOURS if ttl_hours is None else ttl_hours) * 3600
+        self._stats = {}
+        self._stats_key = None
+        self._stats_checked_at = 0
+        self._stats_lock = threading.Lock()
+
+    def _fresh(self, profile):
+        return profile is not None and time.time() - profile.get('fetched_at', 0) < self.ttl_seconds
+
+    def add(self, user_id, username, name):
+        """
+        Store a profile that arrived some other way (e.g. in a response's includes).
+        """
+        return self.put({'id': str(user_id), 'username': username, 'name': name, 'fetched_at': time.time()})
+
+    def resolve(self, user_ids):
+        """
+        Return profiles for these user IDs, fetching unknown or expired ones.
+        If the lookup fails, stale profiles are returned rather than none.
+
+        Returns:
+            dict: user_id -> profile, for every ID that could be resolved
+        """
+        user_ids = [str(i) for i in dict.fromkeys(user_ids) if i]
+        profiles = {i: self.get(i) for i in user_ids}
+        stale = [i for i in user_ids if not self._fresh(profiles[i])]
+        try:
+            for start in range(0, len(stale), BATCH_SIZE):
+                batch = stale[start:start + BATCH_SIZE]
+                response = twitter_client.call_api('get_users', ids=batch, user_fields=USER_FIELDS)
+                found = {str(user.id): user for user in response.data or []}
+                for user_id in batch:
+                    user = found.get(user_id)
+                    if user is not None:
+                        profiles[user_id] = self.add(user_id, user.username, user.name)
+                    else:
+                        profiles[user_id] = self.put({'id': user_id, 'username': None, 'name': None,
+                                                      'fetched_at': time.time(), 'missing': True})
+        except Exception as e:
+            print(f"[WARNING] Could not look up {len(stale)} authors, using cached profiles: {e}")
+        return {i: p for i, p in profiles.items() if p and not p.get('missing')}
+
+    def username(self, user_id):
+        profile = self.resolve([user_id]).get(str(user_id))
+        return profile['username'] if profile else None
+
+    def _sources_key(self):
+        paths = corpus.corpus_paths() + [attempt_log.ATTEMPT_LOG_PATH, DRAFT_QUEUE_PATH, TWEET_CACHE_PATH]
+        return tuple((p, os.path.getmtime(p)) for p in paths if os.path.exists(p))
+
+    def stats(self):
+        """
+        Per-author reply stats (see compute_author_stats), recomputed when the history changes.
+        """
+        with self._stats_lock:
+            now = time.time()
+            if now - self._stats_checked_at >= STATS_REFRESH_SECONDS:
+                self._stats_checked_at = now
+                key = self._sources_key()
+                if key != self._stats_key:
+                    self._stats = compute_author_stats()
+                    self._stats_key = key
+            return self._stats
+
+    def affinity(self, user_id):
+        return affinity(self.stats().get(str(user_id)))
+
+def rank_candidates(tweets, author_cache=None):
+    """
+    Order candidates by log engagement plus AUTHOR_AFFINITY_WEIGHT times the author's
+    affinity, so authors we reply to (and get engagement from) rise. Adds 'affinity'
+    to each tweet.
+
+    Returns:
+        list: The tweets, best first
+    """
+    author_cache = author_cache or get_author_cache()
+    for tweet in tweets:
+        tweet['affinity'] = round(author_cache.affinity(tweet.get('author_id')), 3) if tweet.get('author_id') else 0.0
+    return sorted(
+        tweets,
+        key=lambda t: math.log1p(t.get('engagement', 0)) + config.AUTHOR_AFFINITY_WEIGHT * t['affinity'],
+        reverse=True,
+    )
+
+_author_cache = None
+_author_cache_lock = threading.Lock()
+
+def get_author_cache():
+    global _author_cache
+    with _author_cache_lock:
+        if _author_cache is None:
+            _author_cache = AuthorCache()
+        return _author_cache
@@ -0,0 +1,223 @@
+import json
+import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from . import corpus
+from . import twitter_client
+
+BACKFILL_STATE_PATH = 'data/backfill_state.json'
+TWEET_FIELDS = ['created_at', 'public_metrics', 'referenced_tweets', 'conversation_id']
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+# get_users_tweets only reaches a user's newest 3200 tweets, whatever the time window
+REACHABLE_TWEETS = 3200
+
+def format_time(dt):
+    return dt.astimezone(timezone.utc).strftime(TIME_FORMAT)
+
+def parse_date(value):
+    """
+    Parse 'YYYY-MM-DD' (or a full ISO timestamp) as a UTC datetime.
+    """
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def reachable_since(user_id, start, end):
+    """
+    Estimate when the oldest tweet the API still serves was posted, from the density of
+    the newest page: the API stops at REACHABLE_TWEETS, so windows older than that come
+    back empty. Returns `start` when the whole range is reachable.
+    """
+    response = twitter_client.call_api('get_users_tweets', id=user_id, end_time=format_time(end),
+                                       max_results=100, tweet_fields=['created_at'])
+    tweets = [tweet.data for tweet in response.data or []]
+    if not tweets or not (response.meta or {}).get('next_token'):
+        return start
+    oldest = min(parse_date(tweet['created_at']) for tweet in tweets)
+    reach = end - (end - oldest) * (REACHABLE_TWEETS / len(tweets))
+    return max(start, reach)
+
+def split_windows(start, end, shards, reach=None):
+    """
+    Split [reach, end) into `shards` equal time windows, newest first. The oldest
+    window reaches back to `start`, so a low estimate of `reach` loses nothing.
+
+    Args:
+        start (datetime): Oldest time to fetch (aware)
+        end (datetime): Newest time to fetch (aware)
+        shards (int): Number of windows
+        reach (datetime): Oldest time tweets are expected at (default: start)
+
+    Returns:
+        list: (start_time, end_time) string pairs in the API's format
+    """
+    shards = max(1, shards)
+    reach = max(start, reach or start)
+    step = (end - reach) / shards
+    bounds = [start] + [reach + step * i for i in range(1, shards)] + [end]
+    windows = [(format_time(bounds[i]), format_time(bounds[i + 1])) for i in range(shards)]
+    return windows[::-1]
+
+def load_state(path=BACKFILL_STATE_PATH):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def save_state(state, path=BACKFILL_STATE_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+def _fetch_shard(user_id, shard, page_size, out):
+    started = time.time()
+    next_token = shard['next_token']
+    try:
+        while True:
+            kwargs = {
+                'id': user_id,
+                'start_time': shard['start'],
+                'end_time': shard['end'],
+                'max_results': page_size,
+                'tweet_fields': TWEET_FIELDS,
+            }
+            if next_token:
+                kwargs['pagination_token'] = next_token
+            response = twitter_client.call_api('get_users_tweets', **kwargs)
+            next_token = (response.meta or {}).get('next_token')
+            tweets = [tweet.data for tweet in response.data or []]
+            out.put(('page', shard['index'], tweets, next_token, time.time() - started))
+            if not next_token:
+                break
+        out.put(('done', shard['index'], None, time.time() - started))
+    except Exception as e:
+        out.put(('done', shard['index'], e, time.time() - started))
+
+class Backfill:
+    """
+    Full-history download of our own tweets, split into time windows fetched concurrently.
+
+    Windows are sized from the density of the newest tweets, over the span that the
+    API's 3200-tweet reach covers, so every shard has tweets to fetch. Each window
+    ("shard") paginates get_users_tweets with its own start_time/end_time and
+    next_token. All shards draw from the shared per-endpoint rate budget, so
+    `concurrency` only keeps the budget busy; it never exceeds it. Pages are streamed
+    into one corpus file as they arrive, deduplicated by ID (a tweet on a window
+    boundary can come back from both neighbours). The per-shard cursors are saved after
+    every page, so an interrupted backfill resumes where each shard left off.
+
+    State (data/backfill_state.json):
+        {'user_id', 'out_path', 'shards': [{'index', 'start', 'end', 'next_token',
+         'done', 'fetched', 'pages', 'seconds', 'error'}]}
+    """
+
+    def __init__(self, state, state_path=BACKFILL_STATE_PATH):
+        self.state = state
+        self.state_path = state_path
+
+    @classmethod
+    def create(cls, user_id, out_path, start, end, shards=8, state_path=BACKFILL_STATE_PATH):
+        """
+        Plan a new backfill of [start, end) split into `shards` windows over the part
+        of the range the API can still serve (see reachable_since).
+        """
+        reach = reachable_since(user_id, start, end)
+        state = {
+            'user_id': str(user_id),
+            'out_path': out_path,
+            'shards': [
+                {'index': i, 'start': s, 'end': e, 'next_token': None, 'done': False,
+                 'fetched': 0, 'pages': 0, 'seconds': 0.0, 'error': None}
+                for i, (s, e) in enumerate(split_windows(start, end, shards, reach))
+            ],
+        }
+        return cls(state, state_path)
+
+    @classmethod
+    def resume(cls, state_path=BACKFILL_STATE_PATH):
+        """
+        Return the unfinished backfill saved at `state_path`, or None.
+        """
+        state = load_state(state_path)
+        if not state or all(s['done'] for s in state['shards']):
+            return None
+        return cls(state, state_path)
+
+    @property
+    def out_path(self):
+        return self.state['out_path']
+
+    def _label(self, shard):
+        return f"shard {shard['index'] + 1}/{len(self.state['shards'])} {shard['start'][:10]}..{shard['end'][:10]}"
+
+    def run(self, concurrency=4, page_size=100):
+        """
+        Fetch every unfinished shard and append new tweets to the corpus file.
+
+        Returns:
+            dict: 'written' (new tweets), 'seconds', and the per-shard state
+        """
+        shards = {s['index']: s for s in self.state['shards']}
+        todo = [s for s in self.state['shards'] if not s['done']]
+        seen = set()
+        if os.path.exists(self.out_path):
+            seen.update(record['id'] for record, _ in corpus.iter_file(self.out_path))
+        os.makedirs(os.path.dirname(self.out_path) or '.', exist_ok=True)
+        page_size = max(5, min(page_size, 100))
+        out = queue.Queue()
+        seconds_before = {s['index']: s['seconds'] for s in todo}
+        pending = len(todo)
+        written = 0
+        started = time.time()
+        executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+        try:
+            with open(self.out_path, 'a') as f:
+                for shard in todo:
+                    shard['error'] = None
+                    executor.submit(_fetch_shard, self.state['user_id'], dict(shard), page_size, out)
+                while pending:
+                    item = out.get()
+                    shard = shards[item[1]]
+                    if item[0] == 'page':
+                        _, _, tweets, next_token, elapsed = item
+                        new = 0
+                        for tweet in tweets:
+                            if str(tweet['id']) in seen:
+                                continue
+                            seen.add(str(tweet['id']))
+                            f.write(json.dumps(tweet) + "\n")
+                            new += 1
+                        f.flush()
+                        written += new
+                        shard['fetched'] += new
+                        shard['pages'] += 1
+                        shard['next_token'] = next_token
+                        shard['seconds'] = seconds_before[shard['index']] + elapsed
+                        rate = shard['fetched'] / shard['seconds'] if shard['seconds'] else 0.0
+                        print(f"[{self._label(shard)}] page {shard['pages']}: +{new} "
+                              f"({shard['fetched']} total, {rate:.1f} tweets/s)")
+                    else:
+                        _, _, error, elapsed = item
+                        pending -= 1
+                        shard['seconds'] = seconds_before[shard['index']] + elapsed
+                        if error is None:
+                            shard['done'] = True
+                            print(f"[{self._label(shard)}] done: {shard['fetched']} tweets in {shard['pages']} pages")
+                        else:
+                            shard['error'] = str(error)
+                            print(f"[WARNING] [{self._label(shard)}] stopped: {error} (re-run to resume)")
+                    save_state(self.state, self.state_path)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return {
+            'written': written,
+            'seconds': time.time() - started,
+            'shards': [dict(s) for s in self.state['shards']],
+        }
@@ -12,6 +12,7 @@ TWITTER_API_SECRET = os.getenv("TWITTER_API_SECRET")
 TWITTER_ACCESS_TOKEN = os.getenv("TWITTER_ACCESS_TOKEN")
 TWITTER_ACCESS_SECRET = os.getenv("TWITTER_ACCESS_SECRET")
 TWITTER_BEARER_TOKEN = os.getenv("TWITTER_BEARER_TOKEN")
+TWITTER_USERNAME = os.getenv("TWITTER_USERNAME")
 
 # OpenAI API credentials
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -23,6 +24,60 @@ REPLY_PROBABILITY = float(os.getenv("REPLY_PROBABILITY", 0.8))
 POST_ORIGINAL_PROBABILITY = float(os.getenv("POST_ORIGINAL_PROBABILITY", 0.2))
 SCHEDULE_INTERVAL_MINUTES = int(os.getenv("SCHEDULE_INTERVAL_MINUTES", 60))
 
+# OpenAI call resilience
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", 20))
+OPENAI_DEADLINE_SECONDS = float(os.getenv("OPENAI_DEADLINE_SECONDS", 60))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", 3))
+OPENAI_HEDGE = os.getenv("OPENAI_HEDGE", "false").lower() in ("1", "true", "yes")
+OPENAI_BREAKER_FAILURES = int(os.getenv("OPENAI_BREAKER_FAILURES", 5))
+OPENAI_BREAKER_RESET_SECONDS = float(os.getenv("OPENAI_BREAKER_RESET_SECONDS", 60))
+
+# Model token budget (USD; 0 = unlimited). Prices are per million tokens.
+OPENAI_PROMPT_PRICE_PER_1M = float(os.getenv("OPENAI_PROMPT_PRICE_PER_1M", 0.80))
+OPENAI_COMPLETION_PRICE_PER_1M = float(os.getenv("OPENAI_COMPLETION_PRICE_PER_1M", 3.20))
+OPENAI_BUDGET_HOURLY_USD = float(os.getenv("OPENAI_BUDGET_HOURLY_USD", 0))
+OPENAI_BUDGET_DAILY_USD = float(os.getenv("OPENAI_BUDGET_DAILY_USD", 0))
+OPENAI_BUDGET_SOFT_FRACTION = float(os.getenv("OPENAI_BUDGET_SOFT_FRACTION", 0.8))
+
+# Search ingestion
+SEARCH_MAX_PAGES = int(os.getenv("SEARCH_MAX_PAGES", 3))
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", 4))
+WATCHED_ACCOUNTS = [a.strip().lstrip("@") for a in os.getenv("WATCHED_ACCOUNTS", "").split(",") if a.strip()]
+SEARCH_KEYWORDS = [k.strip() for k in os.getenv("SEARCH_KEYWORDS", "").split(",") if k.strip()]
+
+# Local relevance pre-filter (scripts/train_relevance.py)
+RELEVANCE_FILTER = os.getenv("RELEVANCE_FILTER", "true").lower() in ("1", "true", "yes")
+RELEVANCE_TARGET_RECALL = float(os.getenv("RELEVANCE_TARGET_RECALL", 0.95))
+
+# Home timeline change feed
+TIMELINE_WINDOW_HOURS = float(os.getenv("TIMELINE_WINDOW_HOURS", 24))
+TIMELINE_METRICS_SECONDS = float(os.getenv("TIMELINE_METRICS_SECONDS", 900))
+TIMELINE_MAX_PAGES = int(os.getenv("TIMELINE_MAX_PAGES", 3))
+
+# Author cache and per-author reply affinity
+AUTHOR_CACHE_TTL_HOURS = float(os.getenv("AUTHOR_CACHE_TTL_HOURS", 168))
+AUTHOR_AFFINITY_WEIGHT = float(os.getenv("AUTHOR_AFFINITY_WEIGHT", 1.0))
+
+# Response monitoring for posted replies
+REPLY_MONITOR_FIRST_CHECK_MINUTES = float(os.getenv("REPLY_MONITOR_FIRST_CHECK_MINUTES", 15))
+REPLY_MONITOR_HORIZON_HOURS = float(os.getenv("REPLY_MONITOR_HORIZON_HOURS", 72))
+REPLY_MONITOR_MAX_PAGES = int(os.getenv("REPLY_MONITOR_MAX_PAGES", 5))
+
+# Formatting rules for generated text (src/text_rules.py): model retries for violations that can't be repaired locally
+TEXT_RULES_MAX_REGENERATIONS = int(os.getenv("TEXT_RULES_MAX_REGENERATIONS", 1))
+
+# Style profile (src/style_profile.py): completions per model call, ranked by closeness to the tweet history,
+# and the distance percentile beyond which candidates are dropped when a closer one exists
+STYLE_CANDIDATES = int(os.getenv("STYLE_CANDIDATES", 1))
+STYLE_MAX_PERCENTILE = float(os.getenv("STYLE_MAX_PERCENTILE", 0.95))
+
+# API transport: live, record (save request/response pairs) or replay (offline, from the cassettes)
+API_TRANSPORT = os.getenv("API_TRANSPORT", "live").lower()
+API_CASSETTE = os.getenv("API_CASSETTE", "data/cassettes/default")
+API_REPLAY_LATENCY = os.getenv("API_REPLAY_LATENCY", "0")
+# Recording extends the cassette unless told to start it over
+API_CASSETTE_FRESH = os.getenv("API_CASSETTE_FRESH", "false").lower() in ("1", "true", "yes")
+
 # System prompts
 RELEVANCE_PROMPT = """
 You are emulating Kieren's tone and style: analytical, concise, insightful, occasionally humorous. Kieren is a free market libertarian, but not explicitly outspoken about it—this perspective informs his analysis and skepticism of government intervention, but he rarely makes it the main point or uses ideological language.
@@ -0,0 +1,162 @@
+import glob
+import json
+import os
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+CORPUS_GLOB = 'data/tweets/*.jsonl'
+
+def corpus_paths(pattern=CORPUS_GLOB):
+    """
+    Return the tweet history files, newest first.
+    """
+    return sorted(glob.glob(pattern), key=os.path.getmtime, reverse=True)
+
+def tweet_type(record):
+    """
+    Work out original/reply/quote/retweet for either corpus format.
+    """
+    if record.get('type'):
+        return record['type']
+    kind = 'original'
+    for ref in record.get('referenced_tweets') or []:
+        if ref.get('type') == 'retweeted':
+            return 'retweet'
+        if ref.get('type') == 'quoted':
+            kind = 'quote'
+        elif ref.get('type') == 'replied_to' and kind == 'original':
+            kind = 'reply'
+    return kind
+
+def parse_created_at(value):
+    """
+    Parse both '2025-04-14 21:13:00+00:00' and '2025-04-16T19:22:35.000Z' into an aware datetime.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def normalize(record):
+    """
+    Normalize one corpus line into a common shape.
+
+    The tweepy export (fetch_all_my_tweets_jsonl) has 'type' and 'metrics'; the
+    raw API export (--use-requests) has 'referenced_tweets' and 'public_metrics'.
+
+    Returns:
+        dict: id, created_at, text, type, metrics, conversation_id, referenced_tweets
+    """
+    conversation_id = record.get('conversation_id')
+    return {
+        'id': str(record['id']),
+        'created_at': record.get('created_at'),
+        'text': record.get('text', ''),
+        'type': tweet_type(record),
+        'metrics': record.get('public_metrics') or record.get('metrics') or {},
+        'conversation_id': str(conversation_id) if conversation_id else None,
+        'referenced_tweets': record.get('referenced_tweets') or [],
+    }
+
+def iter_file(path, offset=0):
+    """
+    Yield (normalized record, end offset) for each complete line of a corpus file,
+    starting at a byte offset.
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                break
+            offset += len(raw)
+            raw = raw.strip()
+            if not raw:
+                continue
+            try:
+                yield normalize(json.loads(raw)), offset
+            except (json.JSONDecodeError, KeyError):
+                continue
+
+def file_fingerprint(path):
+    """
+    Identity of a file's content: its inode and a CRC of its first line. Appending keeps
+    it; rewriting the file (a newest-first refetch, a replace) changes it.
+    """
+    with open(path, 'rb') as f:
+        first_line = f.readline()
+    return zlib.crc32(first_line + str(os.stat(path).st_ino).encode())
+
+def read_appended(path, state=None):
+    """
+    Parse the lines of a corpus file that are new since it was last read, for
+    incremental caches. A file that shrank or was rewritten is re-read from the start.
+
+    Args:
+        path (str): Corpus file
+        state (list): [size, bytes read, fingerprint] from the last read, or None
+
+    Returns:
+        tuple: (list of normalized records, or None if the file is unchanged; new state)
+    """
+    size = os.path.getsize(path)
+    fingerprint = file_fingerprint(path)
+    known_size, read, known_fingerprint = state or [0, 0, None]
+    if size == known_size and read == size and fingerprint == known_fingerprint:
+        return None, state
+    if size < read or fingerprint != known_fingerprint:
+        read = 0
+    records = []
+    for record, end in iter_file(path, read):
+        records.append(record)
+        read = end
+    return records, [size, read, fingerprint]
+
+def pack_offsets(offsets):
+    """
+    Per-file read state (path -> [size, bytes read, fingerprint]) as arrays for an npz cache.
+    """
+    paths = sorted(offsets)
+    return {
+        'file_paths': np.asarray(paths, dtype=str),
+        'file_sizes': np.asarray([offsets[p][0] for p in paths], dtype=np.int64),
+        'file_offsets': np.asarray([offsets[p][1] for p in paths], dtype=np.int64),
+        'file_fingerprints': np.asarray([offsets[p][2] for p in paths], dtype=np.int64),
+    }
+
+def unpack_offsets(data):
+    """
+    Inverse of pack_offsets. Caches written before fingerprints were stored get none,
+    so their files are re-read once.
+    """
+    fingerprints = data['file_fingerprints'] if 'file_fingerprints' in data else [None] * len(data['file_paths'])
+    return {
+        str(p): [int(size), int(read), None if fingerprint is None else int(fingerprint)]
+        for p, size, read, fingerprint in zip(data['file_paths'], data['file_sizes'], data['file_offsets'], fingerprints)
+    }
+
+def iter_corpus(paths=None):
+    """
+    Stream every tweet in the history files once, deduplicated by ID.
+
+    The first copy seen is kept. Files are read newest first by default, so a
+    tweet's most recently synced metrics win.
+
+    Yields:
+        dict: Normalized tweet records (see normalize)
+    """
+    if paths is None:
+        paths = corpus_paths()
+    seen = set()
+    for path in paths:
+        for record, _ in iter_file(path):
+            if record['id'] in seen:
+                continue
+            seen.add(record['id'])
+            yield record
@@ -0,0 +1,137 @@
+import uuid
+from datetime import datetime
+
+from .jsonl_store import SnapshotLog, utc_now
+
+DRAFT_QUEUE_PATH = 'data/draft_queue.jsonl'
+
+PENDING = 'pending'
+APPROVED = 'approved'
+REJECTED = 'rejected'
+REGENERATING = 'regenerating'
+SUPERSEDED = 'superseded'
+FINISHED_STATUSES = (APPROVED, REJECTED, SUPERSEDED)
+# A regeneration not finished after this long was abandoned (reviewer quit, producer died)
+STALE_REGENERATING_SECONDS = 900
+
+class DraftQueue(SnapshotLog):
+    """
+    Persistent queue of generated drafts waiting for human review.
+
+    The file is an append-only JSONL log; every line is a full snapshot of one
+    draft and the latest line for a draft ID wins. Producers and the reviewer can
+    run in different threads or processes: `refresh()` picks up lines appended by
+    someone else since the last read.
+
+    A draft looks like:
+        {'id', 'kind': 'reply' | 'topic', 'status', 'text', 'created_at', 'updated_at',
+         'tweet': {...} for replies, 'topic' and 'long' for topic tweets,
+         'feedback', 'parent_id' when it was regenerated from another draft}
+    """
+
+    def __init__(self, path=DRAFT_QUEUE_PATH, recover=True):
+        super().__init__(path)
+        # Readers that only look at the history (stats, relevance examples) must not write to it
+        if recover:
+            self.recover_regenerating()
+
+    def recover_regenerating(self, max_age=STALE_REGENERATING_SECONDS):
+        """
+        Put drafts left in 'regenerating' for longer than `max_age` seconds back to pending,
+        so a regeneration that never finished doesn't hide the draft (and its tweet) for good.
+
+        Returns:
+            int: Number of drafts put back
+        """
+        now = datetime.utcnow()
+        recovered = 0
+        for draft in self.values():
+            if draft['status'] != REGENERATING:
+                continue
+            updated = datetime.fromisoformat(draft['updated_at'].rstrip('Z'))
+            if (now - updated).total_seconds() >= max_age:
+                self.update(draft['id'], status=PENDING, regenerate_failed=True)
+                recovered += 1
+        return recovered
+
+    def add(self, kind, text, **fields):
+        """
+        Add a new pending draft.
+
+        Args:
+            kind (str): 'reply' or 'topic'
+            text (str): The generated text
+            **fields: Extra draft fields, e.g. tweet=..., topic=..., long=..., feedback=...
+
+        Returns:
+            dict: The stored draft
+        """
+        now = utc_now()
+        draft = {
+            'id': uuid.uuid4().hex[:12],
+            'kind': kind,
+            'status': PENDING,
+            'text': text,
+            'created_at': now,
+            'updated_at': now,
+        }
+        draft.update(fields)
+        return self.put(draft)
+
+    def update(self, draft_id, **fields):
+        """
+        Change fields on a draft (status, text, feedback, ...) and persist the new snapshot.
+
+        Returns:
+            dict: The updated draft
+        """
+        return self.patch(draft_id, **fields)
+
+    def pending(self, kind=None):
+        """
+        Return pending drafts, oldest first.
+        """
+        drafts = [
+            d for d in self.values()
+            if d['status'] == PENDING and (kind is None or d['kind'] == kind)
+        ]
+        return sorted(drafts, key=lambda d: d['created_at'])
+
+    def pending_count(self):
+        return sum(1 for d in self.values() if d['status'] == PENDING)
+
+    def drafted_tweet_ids(self):
+        """
+        Return the IDs of every tweet that already has a reply draft, in any status,
+        including the other tweets of the story it represented.
+        """
+        ids = set()
+        for d in self.values():
+            if d['kind'] == 'reply' and d.get('tweet'):
+                ids.add(str(d['tweet']['id']))
+                ids.update(d['tweet'].get('story_ids') or ())
+        return ids
+
+    def compact(self):
+        """
+        Rewrite the queue file with one line per draft, dropping finished drafts
+        but keeping a tombstone of reply tweet IDs so they aren't drafted again.
+        Only run this when no producer is writing to the queue.
+        """
+        self.refresh()
+        keep = []
+        for draft in self.values():
+            if draft['status'] in FINISHED_STATUSES:
+                if draft['kind'] != 'reply' or not draft.get('tweet'):
+                    continue
+                draft = {
+                    'id': draft['id'],
+                    'kind': draft['kind'],
+                    'status': draft['status'],
+                    'text': '',
+                    'created_at': draft['created_at'],
+                    'updated_at': draft['updated_at'],
+                    'tweet': {'id': draft['tweet']['id'], 'story_ids': draft['tweet'].get('story_ids', [])},
+                }
+            keep.append(draft)
+        self.rewrite(keep)
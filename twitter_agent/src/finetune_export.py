@@ -0,0 +1,312 @@
+import glob
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+
+from . import config
+from . import corpus
+from .attempt_log import ATTEMPT_LOG_PATH
+from .hydration import TweetCache
+from .personality import get_tweet_guidance
+
+EXPORT_DIR = 'data/finetune'
+STATE_FILE = 'export_state.json'
+URL_RE = re.compile(r'https?://\S+')
+MENTION_RE = re.compile(r'^(@\w+\s+)+')
+WORD_RE = re.compile(r'\w+')
+MAX_PENDING_REJECTIONS = 1000
+
+def reply_messages(parent_text, reply_text):
+    """
+    Build a chat example in the same shape ai_client.generate_tweet_reply sends at inference time.
+    """
+    system = config.RELEVANCE_PROMPT.format(tweet_text=parent_text) + "\n\n" + get_tweet_guidance()
+    return [
+        {"role": "system", "content": system},
+        {"role": "assistant", "content": json.dumps({"respond": True, "reply": reply_text})},
+    ]
+
+def original_messages(text):
+    return [
+        {"role": "system", "content": get_tweet_guidance()},
+        {"role": "user", "content": config.ORIGINAL_TWEET_PROMPT.strip()},
+        {"role": "assistant", "content": text},
+    ]
+
+def simhash(text):
+    """
+    64-bit SimHash over word trigrams, ignoring links and leading @mentions.
+    Near-identical texts end up a few bits apart.
+    """
+    text = MENTION_RE.sub('', URL_RE.sub('', text.lower()))
+    words = WORD_RE.findall(text)
+    shingles = [' '.join(words[i:i + 3]) for i in range(max(len(words) - 2, 1))] if words else ['']
+    votes = [0] * 64
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'big')
+        for bit in range(64):
+            votes[bit] += 1 if (h >> bit) & 1 else -1
+    return sum(1 << bit for bit in range(64) if votes[bit] > 0)
+
+class NearDuplicateIndex:
+    """
+    Finds SimHash signatures within `max_distance` bits of one seen before.
+
+    Signatures are split into max_distance + 1 bands; by the pigeonhole principle two
+    signatures that close share at least one band exactly, so only those candidates
+    are compared.
+    """
+
+    def __init__(self, signatures=(), max_distance=3):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = 64 // self.bands
+        self.signatures = []
+        self._buckets = {}
+        for signature in signatures:
+            self._insert(signature)
+
+    def _band_keys(self, signature):
+        mask = (1 << self.band_bits) - 1
+        return [(b, (signature >> (b * self.band_bits)) & mask) for b in range(self.bands)]
+
+    def _insert(self, signature):
+        self.signatures.append(signature)
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(signature)
+
+    def add_if_new(self, signature):
+        """
+        Add a signature unless a near-duplicate is already indexed.
+
+        Returns:
+            bool: True if it was new
+        """
+        for key in self._band_keys(signature):
+            for other in self._buckets.get(key, ()):
+                if bin(signature ^ other).count('1') <= self.max_distance:
+                    return False
+        self._insert(signature)
+        return True
+
+class ShardWriter:
+    """
+    Writes JSONL examples into numbered shards, starting a new file once a shard reaches `shard_bytes`.
+    """
+
+    def __init__(self, out_dir, prefix, next_index, shard_bytes):
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.next_index = next_index
+        self.shard_bytes = shard_bytes
+        self.count = 0
+        self.paths = []
+        self._file = None
+        self._size = 0
+
+    def write(self, example):
+        line = (json.dumps(example, ensure_ascii=False) + '\n').encode('utf-8')
+        if self._file is None or self._size + len(line) > self.shard_bytes:
+            self._open_next()
+        self._file.write(line)
+        self._size += len(line)
+        self.count += 1
+
+    def _open_next(self):
+        self.close()
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, f"{self.prefix}-{self.next_index:05d}.jsonl")
+        self.next_index += 1
+        self.paths.append(path)
+        self._file = open(path, 'wb')
+        self._size = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def split_for(key, eval_percent):
+    """
+    Deterministically assign an example to 'train' or 'eval' from a stable key.
+    """
+    bucket = int.from_bytes(hashlib.sha1(key.encode()).digest()[:4], 'big') % 100
+    return 'eval' if bucket < eval_percent else 'train'
+
+def load_state(out_dir):
+    try:
+        with open(os.path.join(out_dir, STATE_FILE), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_state(out_dir, state):
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, STATE_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+def _iter_new_lines(path, offsets, parse):
+    """
+    Yield parsed records appended to `path` since the offset stored in `offsets`, updating it as we go.
+    """
+    if not os.path.exists(path):
+        return
+    size = os.path.getsize(path)
+    start = offsets.get(path, 0)
+    if start > size:
+        start = 0
+    with open(path, 'rb') as f:
+        f.seek(start)
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                break
+            start += len(raw)
+            offsets[path] = start
+            raw = raw.strip()
+            if not raw:
+                continue
+            try:
+                yield parse(json.loads(raw))
+            except (json.JSONDecodeError, KeyError):
+                continue
+
+class FinetuneExporter:
+    """
+    Streams the tweet corpus and the attempt log into chat-format training JSONL.
+
+    - Our replies are paired with their parent tweet's text, hydrated in batches of
+      100 through the on-disk tweet cache; at most one batch is held in memory.
+    - Accepted attempts become reply examples; an attempt that was rejected and then
+      followed by an accepted reply to the same tweet also becomes a preference pair.
+    - Near-duplicates are dropped with SimHash, and every example is assigned to train
+      or eval from a hash of its source ID, so re-running never moves an example.
+    - Output is sharded by size. Byte offsets per source file, the SimHash signatures
+      and the shard counters are saved, so the next run only exports new records.
+    """
+
+    def __init__(self, out_dir=EXPORT_DIR, eval_percent=5, shard_bytes=50 * 1024 * 1024,
+                 hydrate=True, max_distance=3, full=False, tweet_cache=None):
+        self.out_dir = out_dir
+        self.eval_percent = eval_percent
+        self.hydrate = hydrate
+        self.state = {} if full else load_state(out_dir)
+        self.offsets = self.state.get('offsets', {})
+        self.index = NearDuplicateIndex(self.state.get('signatures', []), max_distance)
+        self.pending_rejections = OrderedDict(self.state.get('pending_rejections', []))
+        self.tweet_cache = tweet_cache or TweetCache()
+        if full:
+            for name in ('train', 'eval', 'preference'):
+                for path in glob.glob(os.path.join(out_dir, f"{name}-*.jsonl")):
+                    os.remove(path)
+        shard_state = self.state.get('next_shard', {})
+        self.writers = {
+            name: ShardWriter(out_dir, name, shard_state.get(name, 0), shard_bytes)
+            for name in ('train', 'eval', 'preference')
+        }
+        self.skipped = {'duplicate': 0, 'no_parent': 0, 'empty': 0}
+        self._reply_batch = []
+
+    def _emit(self, key, messages, dedupe_text):
+        if not self.index.add_if_new(simhash(dedupe_text)):
+            self.skipped['duplicate'] += 1
+            return
+        self.writers[split_for(key, self.eval_percent)].write({"messages": messages})
+
+    def _flush_replies(self):
+        if not self._reply_batch:
+            return
+        if self.hydrate:
+            # Let failures propagate: the run then ends without saving offsets, so these
+            # replies are retried next time instead of being skipped for good.
+            self.tweet_cache.hydrate(parent for _, parent, _ in self._reply_batch)
+        for tweet_id, parent_id, text in self._reply_batch:
+            parent_text = self.tweet_cache.text(parent_id)
+            if not parent_text:
+                self.skipped['no_parent'] += 1
+                continue
+            self._emit(f"tweet:{tweet_id}", reply_messages(parent_text, text), parent_text + ' ' + text)
+        self._reply_batch = []
+
+    def _export_tweet(self, record):
+        # Replies start with the @handles of the thread; the model should not learn to write them.
+        text = MENTION_RE.sub('', record['text'].strip())
+        if len(URL_RE.sub('', text).strip()) < 10:
+            self.skipped['empty'] += 1
+            return
+        if record['type'] == 'retweet':
+            return
+        if record['type'] == 'reply':
+            parent_id = next((r['id'] for r in record['referenced_tweets'] if r.get('type') == 'replied_to'), None)
+            if parent_id is None:
+                self.skipped['no_parent'] += 1
+                return
+            self._reply_batch.append((record['id'], parent_id, text))
+            if len(self._reply_batch) >= 100:
+                self._flush_replies()
+            return
+        self._emit(f"tweet:{record['id']}", original_messages(text), text)
+
+    def _export_attempt(self, attempt):
+        original = (attempt.get('original_tweet') or '').strip()
+        if not original:
+            return
+        final = (attempt.get('final_reply') or '').strip()
+        ai_reply = (attempt.get('ai_reply') or '').strip()
+        if attempt.get('status') == 'accepted' and final:
+            key = f"attempt:{attempt.get('timestamp')}:{original}"
+            self._emit(key, reply_messages(original, final), original + ' ' + final)
+            for rejected in self.pending_rejections.pop(original, []):
+                if rejected == final:
+                    continue
+                prompt = reply_messages(original, final)[:1]
+                self.writers['preference'].write({
+                    "input": {"messages": prompt},
+                    "preferred_output": [{"role": "assistant", "content": json.dumps({"respond": True, "reply": final})}],
+                    "non_preferred_output": [{"role": "assistant", "content": json.dumps({"respond": True, "reply": rejected})}],
+                })
+        elif attempt.get('status') in ('rejected', 'edited') and ai_reply:
+            self.pending_rejections.setdefault(original, []).append(ai_reply)
+            self.pending_rejections.move_to_end(original)
+            while len(self.pending_rejections) > MAX_PENDING_REJECTIONS:
+                self.pending_rejections.popitem(last=False)
+
+    def run(self, corpus_paths=None, attempt_log=ATTEMPT_LOG_PATH):
+        """
+        Export everything new since the last run.
+
+        Returns:
+            dict: Examples written per output, skip counts and the shard files written
+        """
+        if corpus_paths is None:
+            corpus_paths = corpus.corpus_paths()
+        seen_ids = set()
+        try:
+            for path in corpus_paths:
+                for record in _iter_new_lines(path, self.offsets, corpus.normalize):
+                    if record['id'] in seen_ids:
+                        continue
+                    seen_ids.add(record['id'])
+                    self._export_tweet(record)
+            self._flush_replies()
+            for attempt in _iter_new_lines(attempt_log, self.offsets, lambda r: r):
+                self._export_attempt(attempt)
+        finally:
+            for writer in self.writers.values():
+                writer.close()
+        self.state = {
+            'offsets': self.offsets,
+            'signatures': self.index.signatures,
+            'pending_rejections': list(self.pending_rejections.items()),
+            'next_shard': {name: w.next_index for name, w in self.writers.items()},
+        }
+        save_state(self.out_dir, self.state)
+        return {
+            'written': {name: w.count for name, w in self.writers.items()},
+            'skipped': dict(self.skipped),
+            'files': [p for w in self.writers.values() for p in w.paths],
+        }
@@ -0,0 +1,95 @@
+import json
+import os
+import threading
+
+from . import twitter_client
+from .ingest import tweet_to_dict
+
+TWEET_CACHE_PATH = 'data/tweet_cache.jsonl'
+BATCH_SIZE = 100
+HYDRATE_FIELDS = ['author_id', 'created_at', 'public_metrics', 'conversation_id', 'referenced_tweets']
+
+def fetch_tweets(ids, tweet_fields=None):
+    """
+    Look up tweets by ID in batches of up to 100 per request.
+
+    Args:
+        ids (iterable): Tweet IDs
+        tweet_fields (list): Fields to request (default: HYDRATE_FIELDS)
+
+    Returns:
+        tuple: (dict of id -> tweet dict (see ingest.tweet_to_dict), set of IDs that came back missing or deleted)
+    """
+    ids = [str(i) for i in dict.fromkeys(ids)]
+    found = {}
+    missing = set()
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = ids[start:start + BATCH_SIZE]
+        response = twitter_client.call_api(
+            'get_tweets',
+            ids=batch,
+            tweet_fields=tweet_fields or HYDRATE_FIELDS,
+        )
+        for tweet in response.data or []:
+            found[str(tweet.id)] = tweet_to_dict(tweet)
+        missing.update(i for i in batch if i not in found)
+    return found, missing
+
+class TweetCache:
+    """
+    Append-only on-disk cache of other people's tweets, keyed by ID.
+
+    Used for text that doesn't change, such as the parent tweets our replies
+    answered. Tweets that no longer exist are cached as missing so they are
+    only looked up once.
+    """
+
+    def __init__(self, path=TWEET_CACHE_PATH):
+        self.path = path
+        self._tweets = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._tweets[record['id']] = record
+
+    def __contains__(self, tweet_id):
+        return str(tweet_id) in self._tweets
+
+    def get(self, tweet_id):
+        """
+        Return the cached tweet dict, or None if unknown or missing upstream.
+        """
+        record = self._tweets.get(str(tweet_id))
+        if record is None or record.get('missing'):
+            return None
+        return record
+
+    def text(self, tweet_id):
+        record = self.get(tweet_id)
+        return record['text'] if record else None
+
+    def hydrate(self, ids):
+        """
+        Make sure every ID is cached, fetching unknown ones in batches of 100.
+
+        Returns:
+            int: Number of IDs fetched from the API
+        """
+        with self._lock:
+            unknown = [str(i) for i in dict.fromkeys(ids) if str(i) not in self._tweets]
+        if not unknown:
+            return 0
+        found, missing = fetch_tweets(unknown)
+        records = list(found.values()) + [{'id': i, 'missing': True} for i in missing]
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a') as f:
+                for record in records:
+                    f.write(json.dumps(record) + '\n')
+                    self._tweets[record['id']] = record
+        return len(unknown)
@@ -0,0 +1,247 @@
+import json
+import os
+import queue
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from . import config
+from . import twitter_client
+from .personality import get_topics
+
+CURSOR_PATH = 'data/search_cursors.json'
+SEARCH_TWEET_FIELDS = ['author_id', 'created_at', 'public_metrics', 'conversation_id', 'referenced_tweets']
+QUERY_SUFFIX = ' lang:en -is:retweet'
+MAX_QUERY_LENGTH = 512
+
+# Words that describe a topic's tone or framing rather than what tweets about it contain
+NON_SUBJECT_WORDS = {'commentary', 'general', 'dry', 'understated', 'humor', 'skepticism', 'era'}
+STOPWORDS = {'a', 'an', 'the', 'of', 'on', 'about', 'in', 'for', 'to', 'with'}
+CONJUNCTIONS = {'and', 'or'}
+
+def _part_terms(part):
+    words = [w for w in part.split() if w.lower() not in NON_SUBJECT_WORDS | STOPWORDS]
+    pieces = [[]]
+    for word in words:
+        if word.lower() in CONJUNCTIONS:
+            pieces.append([])
+        else:
+            pieces[-1].append(word)
+    pieces = [p for p in pieces if p]
+    if all(len(p) == 1 for p in pieces):
+        # "Music and movies": alternatives
+        return [p[0] for p in pieces]
+    # "blockchain technology": every keyword, in any order (an exact phrase almost never matches)
+    keywords = [w for p in pieces for w in p]
+    return [f"({' '.join(keywords)})"]
+
+def topic_to_query(topic):
+    """
+    Turn a guidance topic line into a recent-search query, or None if nothing in it is searchable.
+
+    "Fitness (especially sprinting and lifting)" becomes '(Fitness) lang:en -is:retweet',
+    "Crypto, DeFi, blockchain technology" becomes
+    '(Crypto OR DeFi OR (blockchain technology)) lang:en -is:retweet', and
+    "Dry or understated humor" (a tone, not a subject) becomes None.
+    """
+    topic = re.sub(r'\(.*?\)', '', topic)
+    terms = []
+    for part in topic.split(','):
+        part = re.sub(r',?\s*especially\b.*$', '', part.strip()).strip()
+        terms += [t for t in _part_terms(part) if t not in terms]
+    if not terms:
+        return None
+    return f"({' OR '.join(terms)}){QUERY_SUFFIX}"
+
+def accounts_to_queries(accounts):
+    """
+    Pack watched accounts into as few 'from:' queries as the query length limit allows.
+    """
+    queries = []
+    clauses = []
+    for account in accounts:
+        clause = f"from:{account}"
+        candidate = f"({' OR '.join(clauses + [clause])}) -is:retweet"
+        if clauses and len(candidate) > MAX_QUERY_LENGTH:
+            queries.append(f"({' OR '.join(clauses)}) -is:retweet")
+            clauses = []
+        clauses.append(clause)
+    if clauses:
+        queries.append(f"({' OR '.join(clauses)}) -is:retweet")
+    return queries
+
+def build_queries(topics=None, accounts=None, keywords=None):
+    """
+    Build the list of search queries for one ingestion cycle.
+
+    Args:
+        topics (list): Topic lines (default: personality.get_topics())
+        accounts (list): Usernames to watch (default: config.WATCHED_ACCOUNTS)
+        keywords (list): Extra keyword queries (default: config.SEARCH_KEYWORDS)
+
+    Returns:
+        list: Unique query strings, in order
+    """
+    if topics is None:
+        topics = get_topics()
+    if accounts is None:
+        accounts = config.WATCHED_ACCOUNTS
+    if keywords is None:
+        keywords = config.SEARCH_KEYWORDS
+    queries = [config.SEARCH_QUERY]
+    queries += [topic_to_query(t) for t in topics]
+    queries += accounts_to_queries(accounts)
+    queries += [f"{k}{QUERY_SUFFIX}" if 'lang:' not in k else k for k in keywords]
+    return list(dict.fromkeys(q for q in queries if q))
+
+def load_cursors(path=CURSOR_PATH):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_cursors(cursors, path=CURSOR_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(cursors, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def tweet_to_dict(tweet):
+    """
+    Convert a tweepy Tweet into the plain dict shape used by the scripts.
+    """
+    tweet_type = 'original'
+    referenced = []
+    for ref in getattr(tweet, 'referenced_tweets', None) or []:
+        referenced.append({'type': ref.type, 'id': str(ref.id)})
+        if ref.type == 'retweeted':
+            tweet_type = 'retweet'
+        elif ref.type == 'quoted':
+            tweet_type = 'quote'
+        elif ref.type == 'replied_to':
+            tweet_type = 'reply'
+    return {
+        'id': str(tweet.id),
+        'text': tweet.text,
+        'author_id': str(tweet.author_id) if getattr(tweet, 'author_id', None) else None,
+        'created_at': str(tweet.created_at) if getattr(tweet, 'created_at', None) else None,
+        'metrics': getattr(tweet, 'public_metrics', None) or {},
+        'conversation_id': str(tweet.conversation_id) if getattr(tweet, 'conversation_id', None) else None,
+        'referenced_tweets': referenced,
+        'type': tweet_type,
+    }
+
+def _cursor_state(cursor):
+    """
+    A query's cursor as a dict. A finished query stores just its since_id; one that hit
+    max_pages with results left also stores the next_token to resume from and the
+    newest_id to move to once the backlog is drained.
+    """
+    if isinstance(cursor, dict):
+        return cursor
+    return {'since_id': cursor} if cursor else {}
+
+def _run_query(query, cursor, max_pages, page_size, out):
+    state = _cursor_state(cursor)
+    since_id = state.get('since_id')
+    next_token = state.get('next_token')
+    # Resuming a backlog: the newest tweet was already seen when it started
+    newest_id = state.get('newest_id') if next_token else None
+    try:
+        for _ in range(max_pages):
+            kwargs = {
+                'query': query,
+                'max_results': page_size,
+                'tweet_fields': SEARCH_TWEET_FIELDS,
+            }
+            if since_id:
+                kwargs['since_id'] = since_id
+            if next_token:
+                kwargs['next_token'] = next_token
+            response = twitter_client.call_api('search_recent_tweets', **kwargs)
+            meta = response.meta or {}
+            if newest_id is None:
+                newest_id = meta.get('newest_id')
+            if response.data:
+                out.put(('tweets', query, [tweet_to_dict(t) for t in response.data]))
+            next_token = meta.get('next_token')
+            if not next_token:
+                break
+    except Exception as e:
+        # Start over from since_id next time: a stale next_token would fail again
+        out.put(('done', query, since_id, e))
+        return
+    if next_token:
+        # Pages left between since_id and here: keep the cursor until they are fetched
+        out.put(('done', query, {'since_id': since_id, 'next_token': next_token, 'newest_id': newest_id}, None))
+    else:
+        out.put(('done', query, newest_id or since_id, None))
+
+def ingest_searches(queries=None, max_pages=None, page_size=100, concurrency=None,
+                    incremental=True, cursor_path=CURSOR_PATH):
+    """
+    Run many search queries concurrently and yield one deduplicated stream of tweets.
+
+    Every query is paginated up to `max_pages` pages. All requests go through the
+    shared rate budget, so raising `concurrency` never exceeds the endpoint limit;
+    it only keeps the budget busy. With `incremental`, each query resumes from the
+    newest tweet ID seen on the previous cycle (`since_id`), and the cursors are
+    saved once the stream has been fully consumed. A query that still had pages
+    left after `max_pages` continues from its next_token on the next cycle before
+    its since_id moves, so no tweets are skipped.
+
+    Args:
+        queries (list): Search queries (default: build_queries())
+        max_pages (int): Pages to fetch per query (default: config.SEARCH_MAX_PAGES)
+        page_size (int): Results per page, 10-100
+        concurrency (int): Queries in flight at once (default: config.SEARCH_CONCURRENCY)
+        incremental (bool): Use and update the per-query since_id cursors
+        cursor_path (str): Where the cursors are stored
+
+    Yields:
+        dict: Tweet dicts (see tweet_to_dict) with a 'queries' list of every query that matched
+    """
+    if queries is None:
+        queries = build_queries()
+    if max_pages is None:
+        max_pages = config.SEARCH_MAX_PAGES
+    if concurrency is None:
+        concurrency = config.SEARCH_CONCURRENCY
+    page_size = max(10, min(page_size, 100))
+    cursors = load_cursors(cursor_path) if incremental else {}
+    out = queue.Queue()
+    seen = {}
+    pending = len(queries)
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    try:
+        for q in queries:
+            executor.submit(_run_query, q, cursors.get(q), max_pages, page_size, out)
+        while pending:
+            item = out.get()
+            if item[0] == 'tweets':
+                _, query, tweets = item
+                for tweet in tweets:
+                    if tweet['id'] in seen:
+                        seen[tweet['id']]['queries'].append(query)
+                        continue
+                    tweet['queries'] = [query]
+                    seen[tweet['id']] = tweet
+                    yield tweet
+            else:
+                _, query, cursor, error = item
+                pending -= 1
+                if error is not None:
+                    print(f"[WARNING] Search failed for {query!r}: {error}")
+                if cursor:
+                    cursors[query] = cursor
+        if incremental:
+            save_cursors(cursors, cursor_path)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def ingest_all(**kwargs):
+    """
+    Run ingest_searches() to completion and return the tweets as a list.
+    """
+    return list(ingest_searches(**kwargs))
@@ -0,0 +1,95 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+def utc_now():
+    return datetime.utcnow().isoformat() + 'Z'
+
+class SnapshotLog:
+    """
+    Append-only JSONL file of record snapshots keyed by 'id'; the latest line for an ID wins.
+
+    Several threads or processes can append to the same file: `refresh()` picks up
+    lines written by someone else since the last read, and every write appends a
+    complete line, so a crash never leaves a half-updated record behind.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._records = {}
+        self._offset = 0
+        self._lock = threading.RLock()
+        self.refresh()
+
+    def refresh(self):
+        """
+        Read any lines appended to the file since the last read.
+        """
+        with self._lock:
+            self._read_new_lines()
+
+    def _read_new_lines(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            f.seek(self._offset)
+            while True:
+                line = f.readline()
+                if not line or not line.endswith('\n'):
+                    break
+                self._offset = f.tell()
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._records[record['id']] = record
+
+    def put(self, record):
+        """
+        Append a full snapshot of a record and return a copy of it.
+        """
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._read_new_lines()
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._read_new_lines()
+            return dict(record)
+
+    def patch(self, record_id, **fields):
+        """
+        Change fields on an existing record, stamp 'updated_at' and persist the new snapshot.
+        """
+        with self._lock:
+            self._read_new_lines()
+            record = dict(self._records[record_id])
+            record.update(fields)
+            record['updated_at'] = utc_now()
+            return self.put(record)
+
+    def get(self, record_id):
+        with self._lock:
+            record = self._records.get(record_id)
+            return dict(record) if record else None
+
+    def values(self):
+        with self._lock:
+            return [dict(r) for r in self._records.values()]
+
+    def rewrite(self, records):
+        """
+        Replace the file with exactly these records, one line each.
+        Only safe when no other process is appending.
+        """
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                for record in records:
+                    f.write(json.dumps(record) + '\n')
+            os.replace(tmp_path, self.path)
+            self._records = {r['id']: r for r in records}
+            self._offset = os.path.getsize(self.path)
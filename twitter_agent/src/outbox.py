@@ -0,0 +1,355 @@
+import hashlib
+import html
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from . import attempt_log
+from . import twitter_client
+from .jsonl_store import SnapshotLog, utc_now
+from .resilience import backoff_delay
+from .twitter_client import tweepy
+
+OUTBOX_PATH = 'data/outbox.jsonl'
+LOCK_PATH = 'data/outbox.lock'
+
+QUEUED = 'queued'
+SENDING = 'sending'
+DELIVERED = 'delivered'
+FAILED = 'failed'
+MAX_ATTEMPTS = 8
+URL_RE = re.compile(r'https?://\S+')
+
+def idempotency_key(text, reply_to_id=None):
+    """
+    Stable key for a post: the same text to the same parent always maps to the same outbox entry.
+    """
+    return hashlib.sha256(f"{reply_to_id or ''}\n{text}".encode('utf-8')).hexdigest()[:20]
+
+class Outbox(SnapshotLog):
+    """
+    Write-ahead log of approved posts waiting to be delivered.
+
+    An entry is persisted before anything is sent, so an approval survives a crash
+    or a network failure. Entries look like:
+        {'id' (idempotency key), 'text', 'reply_to_id', 'kind': 'reply' | 'tweet',
+         'status': 'queued' | 'sending' | 'delivered' | 'failed', 'attempts',
+         'next_attempt_at' (epoch seconds), 'tweet_id', 'error', 'context', 'created_at', 'updated_at'}
+    """
+
+    def __init__(self, path=OUTBOX_PATH):
+        super().__init__(path)
+
+    def enqueue(self, text, reply_to_id=None, kind='reply', context=None):
+        """
+        Persist a post for delivery. Enqueuing the same text for the same parent again
+        returns the existing entry instead of creating a second post.
+
+        Args:
+            text (str): Exact text to post
+            reply_to_id (str): Tweet ID to reply to, if any
+            kind (str): 'reply' or 'tweet'
+            context (dict): Attempt details recorded back into the attempt log on delivery
+
+        Returns:
+            dict: The outbox entry
+        """
+        key = idempotency_key(text, reply_to_id)
+        existing = self.get(key)
+        if existing and existing['status'] != FAILED:
+            return existing
+        now = utc_now()
+        return self.put({
+            'id': key,
+            'kind': kind,
+            'text': text,
+            'reply_to_id': str(reply_to_id) if reply_to_id else None,
+            'status': QUEUED,
+            'attempts': 0,
+            'next_attempt_at': 0,
+            'tweet_id': None,
+            'error': None,
+            'context': context or {},
+            'created_at': now,
+            'updated_at': now,
+        })
+
+    def due(self, now=None):
+        """
+        Entries ready for a delivery attempt, oldest first. Entries left in 'sending'
+        by a crashed process are due too; delivery checks whether they already went out.
+        """
+        now = time.time() if now is None else now
+        entries = [
+            e for e in self.values()
+            if (e['status'] == QUEUED and e['next_attempt_at'] <= now) or e['status'] == SENDING
+        ]
+        return sorted(entries, key=lambda e: e['created_at'])
+
+    def undelivered(self):
+        return [e for e in self.values() if e['status'] in (QUEUED, SENDING)]
+
+_my_user_id = None
+
+def _get_my_user_id():
+    global _my_user_id
+    if _my_user_id is None:
+        _my_user_id = twitter_client.call_api('get_me').data.id
+    return _my_user_id
+
+def _normalize(text):
+    return ' '.join(URL_RE.sub('', html.unescape(text or '')).split())
+
+def find_existing_post(entry):
+    """
+    Look through our tweets since the entry was created for one that matches it.
+    This is what makes retries idempotent: the X API has no idempotency key of its own.
+
+    Returns:
+        str: The tweet ID if the post already went out, else None
+    """
+    created = datetime.fromisoformat(entry['created_at'].replace('Z', '+00:00'))
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    start_time = (created - timedelta(minutes=2)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    response = twitter_client.call_api(
+        'get_users_tweets',
+        id=_get_my_user_id(),
+        start_time=start_time,
+        max_results=100,
+        tweet_fields=['created_at', 'referenced_tweets'],
+    )
+    wanted = _normalize(entry['text'])
+    for tweet in response.data or []:
+        if _normalize(tweet.text) != wanted:
+            continue
+        if entry['reply_to_id']:
+            parents = [str(r.id) for r in (tweet.referenced_tweets or []) if r.type == 'replied_to']
+            if entry['reply_to_id'] not in parents:
+                continue
+        return str(tweet.id)
+    return None
+
+def _is_duplicate_error(exc):
+    return 'duplicate' in str(exc).lower()
+
+def _record_delivery(entry, tweet_id):
+    if entry['kind'] != 'reply':
+        return
+    context = entry.get('context') or {}
+    attempt_log.append({
+        'original_tweet': context.get('original_tweet'),
+        'final_reply': context.get('final_reply'),
+        'status': 'posted',
+        'outbox_id': entry['id'],
+        'tweet_id': tweet_id,
+        'in_reply_to_id': entry['reply_to_id'],
+        'author_id': context.get('author_id'),
+    })
+
+def _record_failure(entry, error):
+    if entry['kind'] != 'reply':
+        return
+    context = entry.get('context') or {}
+    attempt_log.append({
+        'original_tweet': context.get('original_tweet'),
+        'final_reply': context.get('final_reply'),
+        'status': 'post_failed',
+        'outbox_id': entry['id'],
+        'in_reply_to_id': entry['reply_to_id'],
+        'author_id': context.get('author_id'),
+        'error': error,
+    })
+
+def deliver(outbox, entry):
+    """
+    Make one delivery attempt for an entry and record the outcome.
+
+    Returns:
+        dict: The updated entry
+    """
+    if entry['attempts'] > 0 or entry['status'] == SENDING:
+        try:
+            tweet_id = find_existing_post(entry)
+        except Exception as e:
+            print(f"[WARNING] Could not check whether outbox entry {entry['id']} was already posted: {e}")
+            entry = outbox.patch(entry['id'], attempts=entry['attempts'] + 1)
+            return _schedule_retry(outbox, entry, f"reconcile failed: {e}")
+        if tweet_id:
+            _record_delivery(entry, tweet_id)
+            return outbox.patch(entry['id'], status=DELIVERED, tweet_id=tweet_id, error=None)
+
+    entry = outbox.patch(entry['id'], status=SENDING, attempts=entry['attempts'] + 1)
+    kwargs = {'text': entry['text']}
+    if entry['reply_to_id']:
+        kwargs['in_reply_to_tweet_id'] = entry['reply_to_id']
+    try:
+        response = twitter_client.call_api('create_tweet', **kwargs)
+        tweet_id = (response.data or {}).get('id') if hasattr(response, 'data') else None
+        if not tweet_id:
+            raise RuntimeError("response did not include a tweet ID")
+    except (tweepy.BadRequest, tweepy.Unauthorized, tweepy.Forbidden, tweepy.NotFound) as e:
+        if _is_duplicate_error(e):
+            # Twitter refuses exact duplicates, so an earlier attempt may have gone through.
+            return _schedule_retry(outbox, entry, str(e))
+        _record_failure(entry, str(e))
+        return outbox.patch(entry['id'], status=FAILED, error=str(e))
+    except Exception as e:
+        return _schedule_retry(outbox, entry, str(e))
+    tweet_id = str(tweet_id)
+    _record_delivery(entry, tweet_id)
+    return outbox.patch(entry['id'], status=DELIVERED, tweet_id=tweet_id, error=None)
+
+def _schedule_retry(outbox, entry, error):
+    if entry['attempts'] >= MAX_ATTEMPTS:
+        _record_failure(entry, error)
+        return outbox.patch(entry['id'], status=FAILED, error=error)
+    delay = 5 + backoff_delay(entry['attempts'], base=5, cap=600)
+    print(f"[WARNING] Delivery of outbox entry {entry['id']} failed ({error}); retrying in {delay:.0f}s")
+    return outbox.patch(entry['id'], status=QUEUED, error=error, next_attempt_at=time.time() + delay)
+
+class OutboxWorker(threading.Thread):
+    """
+    Background thread that delivers due outbox entries under the shared rate budget.
+
+    Only one worker per machine delivers at a time (an flock on LOCK_PATH), so two
+    scripts running side by side can't both send the same entry.
+    """
+
+    def __init__(self, outbox, poll_seconds=2, lock_path=LOCK_PATH):
+        super().__init__(daemon=True)
+        self.outbox = outbox
+        self.poll_seconds = poll_seconds
+        self.lock_path = lock_path
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._lock_file = None
+        self._lock_guard = threading.Lock()
+
+    def notify(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    def _acquire_lock(self):
+        with self._lock_guard:
+            if self._lock_file is not None:
+                return True
+            if fcntl is None:
+                return True
+            os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+            lock_file = open(self.lock_path, 'w')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._lock_file = lock_file
+            return True
+
+    def can_deliver(self):
+        """
+        True if this worker holds (or can take) the delivery lock; False while another
+        process's worker is the one delivering.
+        """
+        return self._acquire_lock()
+
+    def run(self):
+        while not self._stopping.is_set():
+            if self._acquire_lock():
+                self.outbox.refresh()
+                for entry in self.outbox.due():
+                    if self._stopping.is_set():
+                        break
+                    try:
+                        deliver(self.outbox, entry)
+                    except Exception as e:
+                        print(f"[WARNING] Outbox worker error: {e}")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+        if self._lock_file is not None:
+            self._lock_file.close()
+
+_outbox = None
+_worker = None
+_singleton_lock = threading.Lock()
+
+def get_outbox():
+    global _outbox
+    with _singleton_lock:
+        if _outbox is None:
+            _outbox = Outbox()
+        return _outbox
+
+def start_worker():
+    """
+    Start the process-wide delivery worker if it isn't running yet.
+    """
+    global _worker
+    outbox = get_outbox()
+    with _singleton_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = OutboxWorker(outbox)
+            _worker.start()
+        return _worker
+
+def enqueue(text, reply_to_id=None, kind='reply', context=None):
+    """
+    Persist a post and hand it to the background worker. Returns as soon as the
+    entry is on disk; delivery happens asynchronously.
+
+    Returns:
+        dict: The outbox entry
+    """
+    entry = get_outbox().enqueue(text, reply_to_id=reply_to_id, kind=kind, context=context)
+    start_worker().notify()
+    return entry
+
+def wait_for(entry_id, timeout=30):
+    """
+    Wait until an entry is delivered or failed.
+
+    Returns:
+        dict: The latest entry; its status may still be 'queued' if the timeout expired
+    """
+    outbox = get_outbox()
+    deadline = time.time() + timeout
+    while True:
+        outbox.refresh()
+        entry = outbox.get(entry_id)
+        if entry['status'] in (DELIVERED, FAILED) or time.time() >= deadline:
+            return entry
+        time.sleep(0.25)
+
+def drain(timeout=30):
+    """
+    Give the worker up to `timeout` seconds to deliver everything that is due.
+    Returns at once when another process holds the delivery lock: this process's
+    worker can't deliver, and the other one will.
+
+    Returns:
+        int: Entries still undelivered (they stay on disk for the next run)
+    """
+    outbox = get_outbox()
+    worker = start_worker()
+    if not worker.can_deliver():
+        outbox.refresh()
+        print("[INFO] Another process is delivering the outbox; leaving queued posts to it.")
+        return len(outbox.undelivered())
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        outbox.refresh()
+        if not outbox.due(now=time.time()):
+            break
+        worker.notify()
+        time.sleep(0.25)
+    return len(outbox.undelivered())
@@ -1,3 +1,29 @@
+TOPICS = [
+    "Crypto, DeFi, blockchain technology, appchains",
+    "Market structure, cycles, technical analysis",
+    "Regulation, policy, skepticism about hype or authority",
+    "AI, automation, and software development",
+    "Free speech, censorship, and civil liberties",
+    "Economics, business cycles, macro trends",
+    "Dry or understated humor",
+    "Radio shows, podcasts, live events",
+    "Social media, tech, and internet culture",
+    "Startups, building, and coding",
+    "Commentary on news, politics, and current events",
+    "Fitness (especially sprinting and lifting)",
+    "General achievement, management, discipline, and personal growth",
+    "Music and movies, especially of the 90s era",
+]
+
+def get_topics():
+    """
+    Return the topics and interests listed in the tweet guidance.
+
+    Returns:
+        list: One string per topic line, e.g. "Crypto, DeFi, blockchain technology, appchains"
+    """
+    return list(TOPICS)
+
 def get_tweet_guidance():
     return (
         "Personality & Perspective:\n"
@@ -7,21 +33,8 @@ def get_tweet_guidance():
         "- Tweets should generally be a bit spicy—aim for a 7 out of 10 on the spiciness scale. Take pointed, provocative, or bold positions, but avoid being excessively inflammatory or over the top.\n"
         "\n"
         "Topics & Interests:\n"
-        "- Crypto, DeFi, blockchain technology, appchains\n"
-        "- Market structure, cycles, technical analysis\n"
-        "- Regulation, policy, skepticism about hype or authority\n"
-        "- AI, automation, and software development\n"
-        "- Free speech, censorship, and civil liberties\n"
-        "- Economics, business cycles, macro trends\n"
-        "- Dry or understated humor\n"
-        "- Radio shows, podcasts, live events\n"
-        "- Social media, tech, and internet culture\n"
-        "- Startups, building, and coding\n"
-        "- Commentary on news, politics, and current events\n"
-        "- Fitness (especially sprinting and lifting)\n"
-        "- General achievement, management, discipline, and personal growth\n"
-        "- Music and movies, especially of the 90s era\n"
-        "\n"
+        + "".join(f"- {topic}\n" for topic in TOPICS)
+        + "\n"
         "Style Guide:\n"
         "- Concise, direct, and to the point.\n"
         "- Dry, sometimes wry or understated humor.\n"
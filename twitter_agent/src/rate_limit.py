@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import deque
+
+# Requests allowed per 15-minute window with user-context auth, per the X API v2 docs.
+# Keep these a little under the published numbers so other tools sharing the
+# same credentials don't push us into a 429.
+ENDPOINT_LIMITS = {
+    'search_recent_tweets': 170,
+    'get_users_tweets': 850,
+    'get_home_timeline': 170,
+    'get_tweets': 850,
+    'get_tweet': 850,
+    'get_users': 850,
+    'get_me': 70,
+    'create_tweet': 90,
+}
+WINDOW_SECONDS = 15 * 60
+
+class RateBudget:
+    """
+    Sliding-window request budget shared by every thread that talks to the Twitter API.
+
+    Each endpoint gets its own window. `acquire()` blocks until a request slot is
+    free, so concurrent callers queue up instead of tripping a 429.
+    """
+
+    def __init__(self, limits=None, window_seconds=WINDOW_SECONDS):
+        self.limits = dict(ENDPOINT_LIMITS)
+        if limits:
+            self.limits.update(limits)
+        self.window_seconds = window_seconds
+        self._calls = {}
+        self._blocked_until = {}
+        self._cond = threading.Condition()
+
+    def _prune(self, endpoint, now):
+        calls = self._calls.setdefault(endpoint, deque())
+        while calls and now - calls[0] >= self.window_seconds:
+            calls.popleft()
+        return calls
+
+    def _wait_time(self, endpoint, now):
+        blocked = self._blocked_until.get(endpoint, 0) - now
+        if blocked > 0:
+            return blocked
+        limit = self.limits.get(endpoint)
+        if limit is None:
+            return 0
+        calls = self._prune(endpoint, now)
+        if len(calls) < limit:
+            return 0
+        return calls[0] + self.window_seconds - now
+
+    def acquire(self, endpoint, timeout=None):
+        """
+        Reserve one request against an endpoint's budget, waiting if necessary.
+
+        Args:
+            endpoint (str): Endpoint name, e.g. 'search_recent_tweets'
+            timeout (float): Maximum seconds to wait (default: wait as long as needed)
+
+        Returns:
+            bool: True if a slot was reserved, False if the timeout expired first
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = self._wait_time(endpoint, now)
+                if wait <= 0:
+                    self._calls.setdefault(endpoint, deque()).append(now)
+                    return True
+                if deadline is not None:
+                    if now >= deadline:
+                        return False
+                    wait = min(wait, deadline - now)
+                self._cond.wait(wait)
+
+    def remaining(self, endpoint):
+        """
+        Return how many requests are left in the current window for an endpoint.
+        """
+        with self._cond:
+            limit = self.limits.get(endpoint)
+            if limit is None:
+                return None
+            if self._blocked_until.get(endpoint, 0) > time.monotonic():
+                return 0
+            return max(limit - len(self._prune(endpoint, time.monotonic())), 0)
+
+    def block_until(self, endpoint, reset_epoch):
+        """
+        Stop issuing requests to an endpoint until the server's reset time.
+
+        Args:
+            endpoint (str): Endpoint name
+            reset_epoch (int): Unix timestamp from the x-rate-limit-reset header
+        """
+        wait = max(float(reset_epoch) - time.time(), 1)
+        with self._cond:
+            self._blocked_until[endpoint] = time.monotonic() + wait
+            self._cond.notify_all()
+
+_budget = None
+_budget_lock = threading.Lock()
+
+def get_rate_budget():
+    """
+    Return the process-wide rate budget.
+    """
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = RateBudget()
+        return _budget
+
+def note_rate_limited(endpoint, exc):
+    """
+    Record a 429 from tweepy so other threads back off until the window resets.
+
+    Args:
+        endpoint (str): Endpoint name
+        exc (tweepy.TooManyRequests): The exception raised by tweepy
+    """
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    reset = headers.get('x-rate-limit-reset')
+    if reset:
+        get_rate_budget().block_until(endpoint, int(reset))
+    else:
+        get_rate_budget().block_until(endpoint, time.time() + 60)
@@ -0,0 +1,262 @@
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from . import attempt_log
+from . import config
+from . import corpus
+from .drafts import DraftQueue, APPROVED, REJECTED
+from .finetune_export import split_for
+from .hydration import TweetCache
+from .stories import hashed_ngrams, ngram_columns
+from .timeline_feed import TIMELINE_STATE_PATH
+
+MODEL_PATH = 'data/relevance_model.npz'
+FEATURE_DIM = 2 ** 14
+# Timeline tweets we saw and never replied to are only weak negatives
+UNLABELED_WEIGHT = 0.3
+# Below this many positives the threshold can't be calibrated well enough to trust
+MIN_POSITIVES = 20
+
+def _positive_attempt(status):
+    return status in ('accepted', 'posted')
+
+def load_examples(tweet_cache=None, timeline_path=TIMELINE_STATE_PATH, draft_queue=None):
+    """
+    Collect labeled (text, label, weight) examples from our own history. Reads local files only.
+
+    Positives: parents of our replies in the corpus (when their text is in the tweet
+    cache), accepted or posted attempts, and approved reply drafts.
+    Negatives: tweets the model declined, attempts that were never accepted, reply
+    drafts the reviewer rejected, and (weakly) timeline tweets we didn't reply to.
+    Tweets this filter itself screened out are not used, so it doesn't learn from its own output.
+
+    Returns:
+        list: (text, label, weight) tuples, one per distinct text; a positive wins over a negative
+    """
+    tweet_cache = tweet_cache or TweetCache()
+    labels = {}
+
+    def add(text, label, weight=1.0):
+        text = (text or '').strip()
+        if not text:
+            return
+        previous = labels.get(text)
+        if previous is None or (label, weight) > previous:
+            labels[text] = (label, weight)
+
+    for record in corpus.iter_corpus():
+        if record['type'] != 'reply':
+            continue
+        for ref in record['referenced_tweets']:
+            if ref.get('type') == 'replied_to':
+                add(tweet_cache.text(ref['id']), 1)
+
+    attempts = {}
+    for record in attempt_log.iter_records():
+        original = record.get('original_tweet')
+        if original:
+            attempts[original] = attempts.get(original, False) or _positive_attempt(record.get('status'))
+    for original, accepted in attempts.items():
+        add(original, 1 if accepted else 0)
+
+    draft_queue = draft_queue or DraftQueue(recover=False)
+    replied_ids = set()
+    for draft in draft_queue.values():
+        tweet = draft.get('tweet') or {}
+        if draft['kind'] != 'reply' or not tweet.get('text'):
+            continue
+        if draft['status'] == APPROVED:
+            add(tweet['text'], 1)
+            replied_ids.add(str(tweet.get('id')))
+        elif draft['status'] == REJECTED and not draft.get('prefiltered'):
+            add(tweet['text'], 0)
+
+    try:
+        with open(timeline_path, 'r') as f:
+            window = json.load(f).get('tweets', [])
+    except (FileNotFoundError, json.JSONDecodeError):
+        window = []
+    for tweet in window:
+        if str(tweet['id']) not in replied_ids:
+            add(tweet.get('text'), 0, UNLABELED_WEIGHT)
+
+    return [(text, label, weight) for text, (label, weight) in labels.items()]
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+def train_logistic(X, y, weights, l2=1e-3, epochs=300, learning_rate=2.0):
+    """
+    Weighted L2-regularized logistic regression by full-batch gradient descent.
+    Classes are reweighted to contribute equally.
+
+    Returns:
+        tuple: (coefficients, bias)
+    """
+    sample_weights = weights.astype(np.float64).copy()
+    for label in (0, 1):
+        mask = y == label
+        if mask.any():
+            sample_weights[mask] *= 0.5 / sample_weights[mask].sum()
+    # Only hash buckets that occur in the data can get a weight; train on those columns alone.
+    used = np.flatnonzero(X.any(axis=0))
+    X_used = X[:, used]
+    coef_used = np.zeros(len(used))
+    bias = 0.0
+    for _ in range(epochs):
+        error = (_sigmoid(X_used @ coef_used + bias) - y) * sample_weights
+        coef_used -= learning_rate * (X_used.T @ error + l2 * coef_used)
+        bias -= learning_rate * error.sum()
+    coef = np.zeros(X.shape[1])
+    coef[used] = coef_used
+    return coef, bias
+
+def roc_auc(scores, y):
+    positives = scores[y == 1]
+    negatives = scores[y == 0]
+    if not len(positives) or not len(negatives):
+        return None
+    ranks = np.argsort(np.argsort(np.concatenate([positives, negatives]))) + 1
+    return float((ranks[:len(positives)].sum() - len(positives) * (len(positives) + 1) / 2) /
+                 (len(positives) * len(negatives)))
+
+def threshold_for_recall(scores, y, target_recall):
+    """
+    Highest threshold that still keeps `target_recall` of the positives.
+    """
+    positives = np.sort(scores[y == 1])
+    if not len(positives):
+        return 0.5
+    drop = int(math.floor(len(positives) * (1 - target_recall)))
+    return float(positives[min(drop, len(positives) - 1)])
+
+def operating_point(scores, y, threshold):
+    forwarded = scores >= threshold
+    positives = y == 1
+    return {
+        'threshold': threshold,
+        'recall': float(forwarded[positives].mean()) if positives.any() else None,
+        'precision': float(positives[forwarded].mean()) if forwarded.any() else None,
+        'forwarded': float(forwarded.mean()) if len(scores) else None,
+    }
+
+class RelevanceFilter:
+    """
+    On-box pre-filter that predicts whether we would reply to a tweet, so only likely
+    candidates are sent to the fine-tuned model.
+
+    Features are L2-normalized hashed word unigrams and bigrams (the same hashing as
+    story clustering); the model is a logistic regression. Scoring one tweet is a sum
+    over its n-gram weights, a few microseconds, on CPU, with no network.
+    """
+
+    def __init__(self, coef, bias, threshold, dim=FEATURE_DIM, report=None):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.bias = float(bias)
+        self.threshold = float(threshold)
+        self.dim = dim
+        self.report = report or {}
+        self._weights = self.coef.tolist()
+
+    def score(self, text):
+        """
+        Probability that we'd reply to this text.
+        """
+        counts = {}
+        for col in ngram_columns(text, self.dim):
+            counts[col] = counts.get(col, 0) + 1
+        if not counts:
+            return 1.0 / (1.0 + math.exp(-self.bias))
+        norm = math.sqrt(sum(c * c for c in counts.values()))
+        z = self.bias + sum(self._weights[col] * c for col, c in counts.items()) / norm
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def score_many(self, texts):
+        X = hashed_ngrams(texts, dim=self.dim, min_tokens=0)
+        return _sigmoid(X.astype(np.float64) @ self.coef + self.bias)
+
+    def keep(self, text, threshold=None):
+        return self.score(text) >= (self.threshold if threshold is None else threshold)
+
+    def save(self, path=MODEL_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, coef=self.coef, bias=self.bias, threshold=self.threshold, dim=self.dim,
+                 report=json.dumps(self.report))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        """
+        Load a trained filter, or return None if none has been trained.
+        """
+        if not os.path.exists(path):
+            return None
+        data = np.load(path)
+        return cls(data['coef'], float(data['bias']), float(data['threshold']), int(data['dim']),
+                   json.loads(str(data['report'])))
+
+def train(examples=None, target_recall=None, eval_percent=20, dim=FEATURE_DIM):
+    """
+    Train a RelevanceFilter on a deterministic train split and evaluate it on the rest.
+
+    The threshold is the highest one that keeps `target_recall` of the evaluation
+    positives (of the training positives if the evaluation split has none).
+
+    Returns:
+        RelevanceFilter: With an evaluation report in `.report`
+    """
+    if examples is None:
+        examples = load_examples()
+    if target_recall is None:
+        target_recall = config.RELEVANCE_TARGET_RECALL
+    texts = [text for text, _, _ in examples]
+    y = np.array([label for _, label, _ in examples], dtype=np.float64)
+    weights = np.array([weight for _, _, weight in examples], dtype=np.float64)
+    if (y == 1).sum() < MIN_POSITIVES or not (y == 0).any():
+        raise ValueError(
+            f"need at least {MIN_POSITIVES} positive examples and some negatives, have "
+            f"{int((y == 1).sum())} and {int((y == 0).sum())} (try --hydrate to use the corpus replies)"
+        )
+    X = hashed_ngrams(texts, dim=dim, min_tokens=0).astype(np.float64)
+    is_eval = np.array([split_for(text, eval_percent) == 'eval' for text in texts])
+    train_mask = ~is_eval
+    coef, bias = train_logistic(X[train_mask], y[train_mask], weights[train_mask])
+    scores = _sigmoid(X @ coef + bias)
+
+    eval_scores, eval_y = scores[is_eval], y[is_eval]
+    calibrate_on = is_eval if (eval_y == 1).any() else train_mask
+    threshold = threshold_for_recall(scores[calibrate_on], y[calibrate_on], target_recall)
+    report = {
+        'trained_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'target_recall': target_recall,
+        'train': {'examples': int(train_mask.sum()), 'positives': int(y[train_mask].sum())},
+        'eval': {'examples': int(is_eval.sum()), 'positives': int(eval_y.sum())},
+        'train_auc': roc_auc(scores[train_mask], y[train_mask]),
+        'eval_auc': roc_auc(eval_scores, eval_y),
+        'threshold_calibrated_on': 'eval' if calibrate_on is is_eval else 'train',
+        'operating_point': operating_point(eval_scores, eval_y, threshold),
+        'curve': [
+            operating_point(eval_scores, eval_y, threshold_for_recall(eval_scores, eval_y, r))
+            for r in (0.8, 0.9, 0.95, 0.99)
+        ] if (eval_y == 1).any() else [],
+    }
+    return RelevanceFilter(coef, bias, threshold, dim, report)
+
+_filter = None
+_filter_loaded = False
+
+def get_filter():
+    """
+    The trained filter from MODEL_PATH, loaded once per process, or None if
+    filtering is disabled (RELEVANCE_FILTER=false) or no model has been trained.
+    """
+    global _filter, _filter_loaded
+    if not _filter_loaded:
+        _filter = RelevanceFilter.load() if config.RELEVANCE_FILTER else None
+        _filter_loaded = True
+    return _filter
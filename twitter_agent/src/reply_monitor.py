@@ -0,0 +1,219 @@
+import time
+
+from . import attempt_log
+from . import config
+from . import twitter_client
+from .corpus import parse_created_at
+from .hydration import fetch_tweets
+from .ingest import MAX_QUERY_LENGTH, SEARCH_TWEET_FIELDS, tweet_to_dict
+from .timeline_feed import engagement
+
+MONITORED = 'monitored'
+MONITOR_TWEET_FIELDS = ['author_id', 'public_metrics', 'conversation_id']
+# Recent search only reaches back 7 days
+SEARCH_WINDOW_SECONDS = 7 * 24 * 3600 - 3600
+
+def _timestamp(value):
+    parsed = parse_created_at(value)
+    return parsed.timestamp() if parsed else 0
+
+def tracked_posts(log_path=attempt_log.ATTEMPT_LOG_PATH):
+    """
+    Our posted replies and where their monitoring stands, rebuilt from the attempt log:
+    'posted' records start tracking a reply, 'monitored' records are its checks.
+
+    Returns:
+        dict: tweet_id -> {'tweet_id', 'in_reply_to_id', 'author_id', 'posted_at', 'checks',
+              'checked_at', 'conversation_id', 'response_ids', 'metrics', 'done'}
+    """
+    posts = {}
+    for record in attempt_log.iter_records(log_path):
+        tweet_id = str(record.get('tweet_id') or '')
+        if not tweet_id:
+            continue
+        if record.get('status') == 'posted' and tweet_id not in posts:
+            posts[tweet_id] = {
+                'tweet_id': tweet_id,
+                'in_reply_to_id': record.get('in_reply_to_id'),
+                'author_id': record.get('author_id'),
+                'posted_at': _timestamp(record.get('timestamp')),
+                'checks': 0,
+                'checked_at': None,
+                'conversation_id': None,
+                'response_ids': [],
+                'metrics': {},
+                'done': False,
+            }
+        elif record.get('status') == MONITORED and tweet_id in posts:
+            posts[tweet_id].update(
+                checks=record['check'],
+                checked_at=record.get('checked_at') or _timestamp(record.get('timestamp')),
+                conversation_id=record.get('conversation_id'),
+                response_ids=record.get('response_ids', []),
+                metrics=record.get('metrics', {}),
+                done=record.get('final', False),
+            )
+    return posts
+
+def next_check_at(post, first_check_seconds=None, horizon_seconds=None):
+    """
+    When a post is next due: FIRST_CHECK after posting, then at doubling intervals
+    (15m, 30m, 1h, 2h, ... with the default), with a last check at the horizon.
+    The next check is the first of those slots after the last check actually ran, so
+    a post first seen late (or a monitor that was down) gets one check, not a burst
+    of catch-up checks. Returns None once monitoring is done.
+    """
+    if post['done']:
+        return None
+    first = config.REPLY_MONITOR_FIRST_CHECK_MINUTES * 60 if first_check_seconds is None else first_check_seconds
+    horizon = config.REPLY_MONITOR_HORIZON_HOURS * 3600 if horizon_seconds is None else horizon_seconds
+    slot = first
+    if post['checked_at'] is not None:
+        while slot <= post['checked_at'] - post['posted_at'] and slot < horizon:
+            slot *= 2
+    return post['posted_at'] + min(slot, horizon)
+
+def conversation_queries(conversation_ids):
+    """
+    Pack conversation IDs into as few 'conversation_id:' OR-queries as the query length limit allows.
+    """
+    queries = []
+    clauses = []
+    for conversation_id in conversation_ids:
+        clause = f"conversation_id:{conversation_id}"
+        if clauses and len(f"({' OR '.join(clauses + [clause])})") > MAX_QUERY_LENGTH:
+            queries.append(clauses)
+            clauses = []
+        clauses.append(clause)
+    if clauses:
+        queries.append(clauses)
+    return [f"({' OR '.join(c)})" if len(c) > 1 else c[0] for c in queries]
+
+def search_conversations(conversation_ids, since_id, max_pages=None):
+    """
+    Every tweet in these conversations newer than since_id, from a few batched searches.
+
+    Returns:
+        tuple: (list of tweet dicts, number of search requests made)
+    """
+    max_pages = config.REPLY_MONITOR_MAX_PAGES if max_pages is None else max_pages
+    tweets = []
+    requests = 0
+    for query in conversation_queries(conversation_ids):
+        next_token = None
+        for _ in range(max(1, max_pages)):
+            kwargs = {'query': query, 'max_results': 100, 'tweet_fields': SEARCH_TWEET_FIELDS, 'since_id': since_id}
+            if next_token:
+                kwargs['next_token'] = next_token
+            response = twitter_client.call_api('search_recent_tweets', **kwargs)
+            requests += 1
+            tweets.extend(tweet_to_dict(t) for t in response.data or [])
+            next_token = (response.meta or {}).get('next_token')
+            if not next_token:
+                break
+    return tweets, requests
+
+def attribute_responses(tweets, posts, own_author_ids=()):
+    """
+    Map each tweet that replies to one of `posts` (directly or further down the
+    thread) to that post. Responses found on earlier checks count as thread members.
+
+    Returns:
+        dict: tweet_id -> set of new response IDs
+    """
+    owner = {}
+    for post in posts:
+        owner[post['tweet_id']] = post['tweet_id']
+        for response_id in post['response_ids']:
+            owner[response_id] = post['tweet_id']
+    new = {post['tweet_id']: set() for post in posts}
+    for tweet in sorted(tweets, key=lambda t: int(t['id'])):
+        if tweet['id'] in owner or tweet.get('author_id') in own_author_ids:
+            continue
+        parent_id = next((r['id'] for r in tweet['referenced_tweets'] if r['type'] == 'replied_to'), None)
+        if parent_id in owner:
+            owner[tweet['id']] = owner[parent_id]
+            new[owner[parent_id]].add(tweet['id'])
+    return new
+
+class ReplyMonitor:
+    """
+    Follows up on our posted replies: who responded and how much engagement they got.
+
+    Replies are checked on a decaying schedule (see next_check_at) until
+    REPLY_MONITOR_HORIZON_HOURS after posting. Each run takes every due reply
+    together: their metrics (and conversation IDs) come from one tweet lookup per
+    100 replies, and responses from a few recent searches that OR as many
+    conversation_id: clauses as fit in a query. Results are appended to the attempt
+    log as 'monitored' records, which also hold the schedule state.
+    """
+
+    def __init__(self, log_path=attempt_log.ATTEMPT_LOG_PATH):
+        self.log_path = log_path
+
+    def due(self, now=None):
+        now = time.time() if now is None else now
+        posts = tracked_posts(self.log_path).values()
+        return [p for p in posts if (next_check_at(p) or float('inf')) <= now]
+
+    def next_due_at(self):
+        times = [t for t in (next_check_at(p) for p in tracked_posts(self.log_path).values()) if t is not None]
+        return min(times) if times else None
+
+    def run_once(self, now=None):
+        """
+        Check every due reply once.
+
+        Returns:
+            dict: 'checked' (records written), 'lookups' and 'searches' (API requests made)
+        """
+        now = time.time() if now is None else now
+        due = sorted(self.due(now), key=lambda p: int(p['tweet_id']))
+        if not due:
+            return {'checked': [], 'lookups': 0, 'searches': 0}
+        found, missing = fetch_tweets([p['tweet_id'] for p in due], tweet_fields=MONITOR_TWEET_FIELDS)
+        lookups = (len(due) + 99) // 100
+
+        searchable = [
+            p for p in due
+            if p['tweet_id'] in found and found[p['tweet_id']].get('conversation_id')
+            and now - p['posted_at'] < SEARCH_WINDOW_SECONDS
+        ]
+        new_responses = {}
+        searches = 0
+        if searchable:
+            conversation_ids = list(dict.fromkeys(found[p['tweet_id']]['conversation_id'] for p in searchable))
+            # Every response is newer than the oldest reply being checked, or than its newest known response
+            since_id = min(max([int(p['tweet_id'])] + [int(i) for i in p['response_ids']]) for p in searchable)
+            try:
+                tweets, searches = search_conversations(conversation_ids, str(since_id))
+                own = {found[p['tweet_id']].get('author_id') for p in searchable} - {None}
+                new_responses = attribute_responses(tweets, searchable, own)
+            except Exception as e:
+                print(f"[WARNING] Response search failed, recording metrics only: {e}")
+
+        horizon = config.REPLY_MONITOR_HORIZON_HOURS * 3600
+        checked = []
+        for post in due:
+            fresh = found.get(post['tweet_id'])
+            response_ids = post['response_ids'] + sorted(new_responses.get(post['tweet_id'], ()), key=int)
+            metrics = fresh['metrics'] if fresh else post['metrics']
+            record = {
+                'status': MONITORED,
+                'tweet_id': post['tweet_id'],
+                'in_reply_to_id': post['in_reply_to_id'],
+                'author_id': post['author_id'],
+                'conversation_id': fresh.get('conversation_id') if fresh else post['conversation_id'],
+                'check': post['checks'] + 1,
+                'checked_at': now,
+                'metrics': metrics,
+                'engagement': engagement(metrics),
+                'responses': len(response_ids),
+                'new_responses': len(response_ids) - len(post['response_ids']),
+                'response_ids': response_ids,
+                'final': post['tweet_id'] in missing or now - post['posted_at'] >= horizon,
+            }
+            if post['tweet_id'] in missing:
+                record['deleted'] = True
+            checked.append(attempt_log.append(record, self.log_path))
+        return {'checked': checked, 'lookups': lookups, 'searches': searches}
@@ -0,0 +1,183 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+class DeadlineExceeded(Exception):
+    """Raised when a call does not finish before its deadline."""
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+class CircuitBreaker:
+    """
+    Stops a batch from hammering an endpoint that keeps failing.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls fail
+    fast for `reset_seconds`. The first call after that is let through as a probe:
+    success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=60):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._probing:
+                raise CircuitOpenError("circuit open after repeated upstream failures")
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None
+
+class LatencyTracker:
+    """
+    Keeps the most recent call latencies and reports percentiles.
+    """
+
+    def __init__(self, size=200, min_samples=20):
+        self._samples = deque(maxlen=size)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        """
+        Return the pct-th percentile latency in seconds, or None until there are enough samples.
+        """
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(int(round(pct / 100.0 * (len(ordered) - 1))), len(ordered) - 1)
+        return ordered[index]
+
+def backoff_delay(attempt, base=0.5, cap=8.0):
+    """
+    Full-jitter exponential backoff: a random delay in [0, min(cap, base * 2**attempt)].
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='resilient-call')
+
+def _timed(fn, timeout, tracker, on_result):
+    start = time.monotonic()
+    result = fn(timeout)
+    if tracker is not None:
+        tracker.record(time.monotonic() - start)
+    if on_result is not None:
+        try:
+            on_result(result)
+        except Exception as e:
+            print(f"[WARNING] Could not record call result: {e}")
+    return result
+
+def _attempt(fn, timeout, tracker, hedge_after, on_result=None):
+    """
+    Run one attempt, firing a hedge request if the first passes `hedge_after` seconds.
+    Returns the first successful result; raises if every request failed or timed out.
+    `on_result` sees every request that succeeds, including a hedge that lost the race
+    or one that finished after the attempt gave up on it.
+    """
+    start = time.monotonic()
+    futures = [_executor.submit(_timed, fn, timeout, tracker, on_result)]
+    if hedge_after is not None and hedge_after < timeout:
+        done, _ = wait(futures, timeout=hedge_after)
+        if not done:
+            futures.append(_executor.submit(_timed, fn, timeout - hedge_after, tracker, on_result))
+    error = None
+    remaining = list(futures)
+    while remaining:
+        left = timeout - (time.monotonic() - start)
+        if left <= 0:
+            break
+        done, not_done = wait(remaining, timeout=left, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+        remaining = list(not_done)
+    if error is not None and not remaining:
+        raise error
+    raise DeadlineExceeded(f"no response within {timeout:.1f}s")
+
+def call_with_resilience(fn, deadline, attempt_timeout=None, max_retries=3, retryable=(), breaker=None,
+                         tracker=None, hedge=False, hedge_percentile=95, on_result=None):
+    """
+    Call `fn(timeout)` under an overall deadline, with retries, hedging and a circuit breaker.
+
+    Args:
+        fn (callable): Makes one upstream request; receives the seconds it may take
+        deadline (float): Total seconds allowed across all attempts and backoff
+        attempt_timeout (float): Seconds allowed for a single attempt (default: the whole deadline)
+        max_retries (int): Extra attempts after the first on retryable errors
+        retryable (tuple): Exception types worth retrying (DeadlineExceeded always is)
+        breaker (CircuitBreaker): Optional breaker shared by a batch of calls
+        tracker (LatencyTracker): Optional latency history used for hedging
+        hedge (bool): Fire a second request once the first passes the tracked percentile
+        hedge_percentile (int): Percentile that triggers the hedge
+        on_result (callable): Called with the result of every request that succeeds, not
+                              only the one returned (each is billed, e.g. for token usage)
+
+    Returns:
+        The value returned by `fn`
+    """
+    start = time.monotonic()
+    retryable = tuple(retryable) + (DeadlineExceeded,)
+    attempt = 0
+    while True:
+        if breaker is not None:
+            breaker.before_call()
+        remaining = deadline - (time.monotonic() - start)
+        if remaining <= 0:
+            raise DeadlineExceeded(f"deadline of {deadline:.1f}s exceeded")
+        timeout = min(attempt_timeout, remaining) if attempt_timeout else remaining
+        hedge_after = tracker.percentile(hedge_percentile) if hedge and tracker is not None else None
+        try:
+            result = _attempt(fn, timeout, tracker, hedge_after, on_result)
+        except retryable as e:
+            if breaker is not None:
+                breaker.record_failure()
+            if attempt >= max_retries:
+                raise
+            delay = backoff_delay(attempt)
+            if time.monotonic() - start + delay >= deadline:
+                raise
+            print(f"[WARNING] Retrying after {type(e).__name__} (attempt {attempt + 1}/{max_retries}) in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+            continue
+        except Exception:
+            # Upstream answered, just not with something worth retrying (e.g. a 400).
+            if breaker is not None:
+                breaker.record_success()
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        return result
@@ -0,0 +1,129 @@
+import re
+import zlib
+
+import numpy as np
+
+URL_RE = re.compile(r'https?://\S+')
+MENTION_RE = re.compile(r'@\w+')
+RT_PREFIX_RE = re.compile(r'^rt @\w+:\s*')
+WORD_RE = re.compile(r'\w+')
+HASH_DIM = 4096
+MIN_TOKENS = 4
+SIMILARITY_THRESHOLD = 0.6
+
+def tokens(text):
+    text = RT_PREFIX_RE.sub('', (text or '').lower())
+    return WORD_RE.findall(MENTION_RE.sub('', URL_RE.sub('', text)))
+
+def ngram_columns(text, dim=HASH_DIM):
+    """
+    Hashed column of every word unigram and bigram in a text (repeats included).
+    """
+    words = tokens(text)
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return [zlib.crc32(g.encode('utf-8')) % dim for g in grams]
+
+def hashed_ngrams(texts, dim=HASH_DIM, min_tokens=MIN_TOKENS):
+    """
+    L2-normalized hashed word unigram + bigram counts, one row per text.
+    Rows for texts shorter than `min_tokens` words are left at zero so they never match on text alone.
+    """
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    rows = []
+    cols = []
+    for row, text in enumerate(texts):
+        if len(tokens(text)) < min_tokens:
+            continue
+        text_cols = ngram_columns(text, dim)
+        rows.extend([row] * len(text_cols))
+        cols.extend(text_cols)
+    np.add.at(matrix, (np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)), 1.0)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+def _story_keys(tweet):
+    """
+    IDs that put a tweet in the same story: its own ID and every tweet it retweets or quotes.
+    """
+    keys = {str(tweet['id'])}
+    for ref in tweet.get('referenced_tweets') or []:
+        if ref.get('type') in ('retweeted', 'quoted'):
+            keys.add(str(ref['id']))
+    return keys
+
+def _root_id(tweet):
+    for ref in tweet.get('referenced_tweets') or []:
+        if ref.get('type') == 'retweeted':
+            return str(ref['id'])
+    return str(tweet['id'])
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+
+def cluster_stories(tweets, threshold=SIMILARITY_THRESHOLD):
+    """
+    Collapse timeline tweets about the same story into one candidate each.
+
+    Tweets are in the same story when they share a referenced tweet (a retweet or
+    quote of it, or the tweet itself) or when the cosine similarity of their hashed
+    n-gram vectors is at least `threshold`.
+
+    The representative is the most engaged member that isn't a retweet (so replies
+    go to a real post). Its 'engagement' becomes the story's combined engagement,
+    counting each underlying tweet once, since retweets report the original's metrics.
+
+    Args:
+        tweets (list): Tweet dicts with id, text, engagement and optionally referenced_tweets
+        threshold (float): Cosine similarity at which two texts count as the same story
+
+    Returns:
+        list: Representative tweet dicts, most engaged story first, each with
+              'story_size', 'story_ids' and 'own_engagement' added
+    """
+    tweets = list(tweets)
+    if not tweets:
+        return []
+    groups = _UnionFind(len(tweets))
+    owner = {}
+    for i, tweet in enumerate(tweets):
+        for key in _story_keys(tweet):
+            if key in owner:
+                groups.union(owner[key], i)
+            else:
+                owner[key] = i
+    vectors = hashed_ngrams([t.get('text', '') for t in tweets])
+    similar = np.argwhere(np.triu(vectors @ vectors.T, k=1) >= threshold)
+    for a, b in similar:
+        groups.union(int(a), int(b))
+
+    members = {}
+    for i in range(len(tweets)):
+        members.setdefault(groups.find(i), []).append(tweets[i])
+    stories = []
+    for group in members.values():
+        rep_pool = [t for t in group if t.get('type') != 'retweet'] or group
+        representative = dict(max(rep_pool, key=lambda t: t.get('engagement', 0)))
+        by_root = {}
+        for t in group:
+            root = _root_id(t)
+            by_root[root] = max(by_root.get(root, 0), t.get('engagement', 0))
+        representative['own_engagement'] = representative.get('engagement', 0)
+        representative['engagement'] = sum(by_root.values())
+        representative['story_size'] = len(group)
+        representative['story_ids'] = [str(t['id']) for t in group]
+        stories.append(representative)
+    stories.sort(key=lambda t: t['engagement'], reverse=True)
+    return stories
@@ -0,0 +1,298 @@
+import math
+import os
+import re
+import threading
+
+import numpy as np
+
+from . import config
+from . import corpus
+
+PROFILE_PATH = 'data/style_profile.npz'
+REPLY = 'reply'
+ORIGINAL = 'original'
+KINDS = (REPLY, ORIGINAL)
+
+QUALIFIERS = ('maybe', 'probably', 'sort of', 'kind of', 'a little bit', 'to some degree', 'to some extent',
+              'i think', 'not sure', 'perhaps', 'might', 'seems', 'arguably')
+FEATURES = ('length', 'words', 'mean_word_length', 'sentences', 'qualifiers', 'questions', 'exclamations',
+            'ellipses', 'dashes', 'commas', 'capital_ratio', 'lowercase_start', 'ends_with_period',
+            'urls', 'hashtags', 'emoji')
+# Long tweets are allowed to be long: compare them on everything but size
+SIZE_FEATURES = ('length', 'words', 'sentences')
+# Weight of the opener's surprisal next to the feature distance, for replies
+OPENER_WEIGHT = 0.5
+MAX_OPENERS = 200
+Z_CLIP = 4.0
+MIN_STD = 0.05
+
+_LEADING_MENTIONS = re.compile(r'^(?:\s*@\w+)+\s*')
+_URL = re.compile(r'https?://\S+')
+_WORD = re.compile(r"[^\W_]+(?:'[^\W_]+)?")
+_SENTENCE_END = re.compile(r'[.!?]+(?=\s|$)')
+_QUALIFIER = re.compile(r'\b(?:' + '|'.join(re.escape(q) for q in QUALIFIERS) + r')\b', re.IGNORECASE)
+_ELLIPSIS = re.compile(r'\.\.\.|…')
+_DASH = re.compile(r'\s[-–—]\s|—')
+_HASHTAG = re.compile(r'(?<![\w&#/])#\w+')
+_EMOJI = re.compile(r'[\U0001F000-\U0001FAFF\U00002600-\U000027BF]')
+
+def _body(text):
+    return _LEADING_MENTIONS.sub('', text or '').strip()
+
+def opener(text):
+    """
+    First word after any leading @mentions, lowercased: the reply opener.
+    """
+    match = _WORD.search(_URL.sub('', _body(text)))
+    return match.group(0).lower() if match else ''
+
+def features(text):
+    """
+    Style features of one text (leading @mentions removed), in FEATURES order.
+    """
+    body = _body(text)
+    urls = len(_URL.findall(body))
+    plain = _URL.sub('', body).strip()
+    words = _WORD.findall(plain)
+    letters = sum(1 for c in plain if c.isalpha())
+    capitals = sum(1 for c in plain if c.isupper())
+    return [
+        len(plain),
+        len(words),
+        sum(len(w) for w in words) / len(words) if words else 0.0,
+        len(_SENTENCE_END.findall(plain)) or (1 if plain else 0),
+        len(_QUALIFIER.findall(plain)),
+        plain.count('?'),
+        plain.count('!'),
+        len(_ELLIPSIS.findall(plain)),
+        len(_DASH.findall(plain)),
+        plain.count(','),
+        capitals / letters if letters else 0.0,
+        1.0 if plain[:1].islower() else 0.0,
+        1.0 if plain.endswith('.') and not plain.endswith('...') else 0.0,
+        urls,
+        len(_HASHTAG.findall(plain)),
+        len(_EMOJI.findall(plain)),
+    ]
+
+def _empty_columns():
+    return {
+        'id': np.zeros(0, dtype=np.int64),
+        'kind': np.zeros(0, dtype=np.int8),
+        'features': np.zeros((0, len(FEATURES)), dtype=np.float32),
+        'opener': np.zeros(0, dtype='<U32'),
+    }
+
+def records_to_columns(records):
+    """
+    One row of style features per tweet we wrote; retweets (someone else's words) are skipped.
+    """
+    rows = [r for r in records if r['type'] != 'retweet' and r['text']]
+    columns = _empty_columns()
+    if not rows:
+        return columns
+    columns['id'] = np.asarray([int(r['id']) for r in rows], dtype=np.int64)
+    columns['kind'] = np.asarray([KINDS.index(REPLY if r['type'] == 'reply' else ORIGINAL) for r in rows], dtype=np.int8)
+    columns['features'] = np.asarray([features(r['text']) for r in rows], dtype=np.float32)
+    columns['opener'] = np.asarray([opener(r['text'])[:32] for r in rows], dtype='<U32')
+    return columns
+
+def merge_columns(old, new):
+    """
+    Append new rows; a tweet ID seen again keeps its newest row.
+    """
+    merged = {name: np.concatenate([old[name], new[name]]) for name in old}
+    _, first_in_reversed = np.unique(merged['id'][::-1], return_index=True)
+    keep = np.sort(len(merged['id']) - 1 - first_in_reversed)
+    return {name: values[keep] for name, values in merged.items()}
+
+def _feature_mask(kind):
+    if kind == 'topic_long':
+        return np.asarray([name not in SIZE_FEATURES for name in FEATURES])
+    return np.ones(len(FEATURES), dtype=bool)
+
+def _profile_kind(kind):
+    return REPLY if kind == REPLY else ORIGINAL
+
+class StyleProfile:
+    """
+    Measurable style of the tweet history, and a fast distance from it.
+
+    For replies and for original tweets separately it keeps the mean and standard
+    deviation of each feature (length, qualifiers, punctuation habits, ...), the
+    frequency of reply openers, and the distribution of the corpus's own distances
+    from the profile, so a draft's distance can be read as a percentile: 0.9 means
+    it is further from the profile than 90% of the tweets actually written.
+
+    The per-tweet feature columns are stored with the profile in
+    data/style_profile.npz together with how far each corpus file has been read,
+    so a refresh only parses what was appended since.
+    """
+
+    def __init__(self, columns=None, offsets=None):
+        self.columns = columns if columns is not None else _empty_columns()
+        self.offsets = offsets or {}
+        self._compute()
+
+    def _compute(self):
+        self.stats = {}
+        X = self.columns['features'].astype(np.float64)
+        for index, kind in enumerate(KINDS):
+            rows = self.columns['kind'] == index
+            if not rows.any():
+                continue
+            mean = X[rows].mean(axis=0)
+            std = np.maximum(X[rows].std(axis=0), MIN_STD)
+            openers, counts = np.unique(self.columns['opener'][rows], return_counts=True)
+            order = np.argsort(-counts)[:MAX_OPENERS]
+            stats = {
+                'count': int(rows.sum()),
+                'mean': mean,
+                'std': std,
+                'openers': dict(zip(openers[order].tolist(), counts[order].tolist())),
+            }
+            stats['opener_total'] = stats['count'] + len(stats['openers']) + 1
+            self.stats[kind] = stats
+        # The corpus scored against itself: the reference distributions for percentiles
+        self.quantiles = {}
+        for score_kind in ('reply', 'topic', 'topic_long'):
+            kind = _profile_kind(score_kind)
+            if kind in self.stats:
+                rows = self.columns['kind'] == KINDS.index(kind)
+                distances = self._distances(X[rows], self.columns['opener'][rows], kind, _feature_mask(score_kind))
+                self.quantiles[score_kind] = np.quantile(distances, np.linspace(0, 1, 101))
+        self._fast = {
+            kind: (s['mean'].tolist(), s['std'].tolist()) for kind, s in self.stats.items()
+        }
+
+    def _opener_surprisal(self, word, stats):
+        count = stats['openers'].get(word, 0)
+        return -math.log((count + 1) / stats['opener_total']) / math.log(stats['opener_total'])
+
+    def _distances(self, X, openers, kind, mask):
+        stats = self.stats[kind]
+        Z = np.clip((X - stats['mean']) / stats['std'], -Z_CLIP, Z_CLIP)[:, mask]
+        distances = np.sqrt((Z ** 2).mean(axis=1))
+        if kind == REPLY:
+            distances += OPENER_WEIGHT * np.asarray([self._opener_surprisal(o, stats) for o in openers])
+        return distances
+
+    @property
+    def tweet_count(self):
+        return int(self.columns['id'].size)
+
+    def distance(self, text, kind=REPLY):
+        """
+        Distance of a text from the profile (0 = exactly average), or None without a profile for that kind.
+        `kind` is 'reply', 'topic' or 'topic_long' (topic tweets use the original-tweet profile).
+        """
+        profile_kind = _profile_kind(kind)
+        if profile_kind not in self._fast:
+            return None
+        mean, std = self._fast[profile_kind]
+        skip = SIZE_FEATURES if kind == 'topic_long' else ()
+        total = 0.0
+        used = 0
+        for name, value, m, s in zip(FEATURES, features(text), mean, std):
+            if name in skip:
+                continue
+            z = min(Z_CLIP, abs(value - m) / s)
+            total += z * z
+            used += 1
+        distance = math.sqrt(total / used)
+        if profile_kind == REPLY:
+            distance += OPENER_WEIGHT * self._opener_surprisal(opener(text), self.stats[REPLY])
+        return distance
+
+    def percentile(self, text, kind=REPLY):
+        """
+        Share of our own tweets that are closer to the profile than this text (0-1), or None.
+        """
+        distance = self.distance(text, kind)
+        if distance is None:
+            return None
+        return float(np.searchsorted(self.quantiles[kind if kind in self.quantiles else 'topic'], distance) / 101)
+
+    def rank(self, texts, kind=REPLY, max_percentile=None):
+        """
+        Order candidate texts from closest to furthest from the profile and drop those
+        beyond `max_percentile` (default STYLE_MAX_PERCENTILE), unless that would drop all.
+
+        Returns:
+            list: (text, percentile or None) tuples, best first
+        """
+        max_percentile = config.STYLE_MAX_PERCENTILE if max_percentile is None else max_percentile
+        scored = [(text, self.percentile(text, kind)) for text in texts]
+        if any(p is None for _, p in scored):
+            return scored
+        scored.sort(key=lambda item: item[1])
+        kept = [item for item in scored if item[1] <= max_percentile]
+        return kept or scored[:1]
+
+    def save(self, path=PROFILE_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **corpus.pack_offsets(self.offsets), **self.columns)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=PROFILE_PATH):
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path, allow_pickle=False) as data:
+            columns = {name: data[name] for name in _empty_columns()}
+            offsets = corpus.unpack_offsets(data)
+        return cls(columns, offsets)
+
+def build_profile(paths=None, path=PROFILE_PATH, full=False):
+    """
+    Bring the style profile up to date with the corpus files and save it.
+
+    Only bytes appended since the last build are parsed; a file that shrank or was
+    rewritten is re-read from the start (see corpus.read_appended).
+
+    Args:
+        paths (list): Corpus files (default: corpus.corpus_paths())
+        path (str): Where the profile is stored
+        full (bool): Ignore the stored profile and rebuild from scratch
+
+    Returns:
+        StyleProfile
+    """
+    if paths is None:
+        paths = corpus.corpus_paths()
+    profile = StyleProfile() if full else StyleProfile.load(path)
+    columns, offsets = profile.columns, dict(profile.offsets)
+    changed = full
+    # Oldest files first so that rows from newer files win in merge_columns
+    for corpus_path in reversed(paths):
+        records, offsets[corpus_path] = corpus.read_appended(corpus_path, offsets.get(corpus_path))
+        if records is None:
+            continue
+        if records:
+            columns = merge_columns(columns, records_to_columns(records))
+        changed = True
+    if not changed:
+        return profile
+    profile = StyleProfile(columns, offsets)
+    profile.save(path)
+    return profile
+
+_profile = None
+_profile_sizes = None
+_profile_lock = threading.Lock()
+
+def get_profile():
+    """
+    The process-wide style profile, refreshed incrementally when a corpus file has changed.
+    Returns None when there is no corpus to build it from.
+    """
+    global _profile, _profile_sizes
+    with _profile_lock:
+        paths = corpus.corpus_paths()
+        # A refetch can rewrite a file without changing its size
+        sizes = tuple((p, os.path.getsize(p), os.path.getmtime(p)) for p in paths)
+        if _profile is None or sizes != _profile_sizes:
+            _profile = build_profile(paths)
+            _profile_sizes = sizes
+        return _profile if _profile.tweet_count else None
@@ -0,0 +1,256 @@
+import json
+import os
+import re
+import threading
+import time
+
+from . import config
+
+RULE_CHECK_LOG_PATH = 'data/text_rule_checks.jsonl'
+
+# Character limits by kind of text (see personality.get_tweet_guidance)
+LIMITS = {'reply': 280, 'topic': 280, 'topic_long': 4000}
+
+HASHTAG = 'hashtag'
+EMOJI = 'emoji'
+RETWEET = 'retweet_format'
+QUOTE = 'quote_format'
+PLACEHOLDER_LINK = 'placeholder_link'
+LENGTH = 'length'
+RULES = (HASHTAG, EMOJI, RETWEET, QUOTE, PLACEHOLDER_LINK, LENGTH)
+
+_PATTERNS = {
+    # '#1' is a number, not a hashtag
+    HASHTAG: r'(?<![\w&#/])#(?=\w*[^\W\d])\w+',
+    # Symbols that render as emoji by default, or any symbol forced to with VS16. Plain
+    # dingbats and arrows ('\u2713', '\u2605', '\u27a1') are punctuation, not emoji.
+    EMOJI: (
+        r'[\u2190-\u2BFF]\uFE0F|[\U0001F000-\U0001FAFF\u231A\u231B\u23E9-\u23EC\u23F0\u23F3\u25FD\u25FE'
+        r'\u2614\u2615\u2648-\u2653\u267F\u2693\u26A1\u26AA\u26AB\u26BD\u26BE\u26C4\u26C5\u26CE\u26D4'
+        r'\u26EA\u26F2\u26F3\u26F5\u26FA\u26FD\u2705\u270A\u270B\u2728\u274C\u274E\u2753-\u2755'
+        r'\u2757\u2795-\u2797\u27B0\u27BF\u2B1B\u2B1C\u2B50\u2B55\uFE0F\u200D]'
+    ),
+    RETWEET: r'(?<!\w)(?:RT|QT) @\w+',
+    # A Markdown block quote is '>' then a space; '>50% of TVL' is just a comparison
+    QUOTE: r'(?m:^[ \t]*>(?:[ \t]|$))|^\s*["\u201c][^"\u201c\u201d]+["\u201d]\s*$',
+    PLACEHOLDER_LINK: (
+        r'(?i:https?://(?:www\.)?(?:example\.(?:com|org|net)|(?:your)?link\.(?:com|here)|placeholder)\S*'
+        r'|\[(?:link|url|source|insert[^\]]*)\]|<(?:link|url)>|\((?:link|url)\)|https?://\S*\u2026|https?://\S*\.\.\.)'
+    ),
+}
+_COMPILED = {name: re.compile(pattern) for name, pattern in _PATTERNS.items()}
+# One pass over the text tells whether any pattern rule can fire at all
+_ANY = re.compile('|'.join(f'(?:{pattern})' for pattern in _PATTERNS.values()))
+
+_TRAILING_HASHTAGS = re.compile(r'(?:\s*' + _PATTERNS[HASHTAG] + r')+\s*$')
+_WRAPPING_QUOTES = re.compile(r'^\s*["\u201c]([^"\u201c\u201d]+)["\u201d]\s*$')
+_SENTENCE_END = re.compile(r'[.!?]["\u201d\')\]]*(?=\s|$)')
+_SPACES = re.compile(r'[ \t]{2,}')
+_SPACE_BEFORE_PUNCT = re.compile(r'[ \t]+([.,!?;:])')
+_DANGLING = re.compile(r'[\s:\-\u2013\u2014]+$')
+
+def violations(text, kind='reply'):
+    """
+    Names of the rules this text breaks, in RULES order. An empty list means it passes.
+    """
+    found = []
+    if _ANY.search(text):
+        found = [name for name, pattern in _COMPILED.items() if pattern.search(text)]
+    if len(text) > LIMITS.get(kind, LIMITS['reply']):
+        found.append(LENGTH)
+    return found
+
+def _tidy(text):
+    lines = [_SPACE_BEFORE_PUNCT.sub(r'\1', _SPACES.sub(' ', line)).strip() for line in text.split('\n')]
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+
+def trim_at_sentence(text, limit):
+    """
+    The longest prefix of whole sentences that fits in `limit`, or None if even the first sentence doesn't.
+    """
+    if len(text) <= limit:
+        return text
+    end = None
+    for match in _SENTENCE_END.finditer(text):
+        if match.end() > limit:
+            break
+        end = match.end()
+    return text[:end].strip() if end else None
+
+def trim_at_word(text, limit, ellipsis='...'):
+    """
+    Cut at the last word boundary that leaves room for the ellipsis. Last resort when no sentence fits.
+    """
+    if len(text) <= limit:
+        return text
+    # One character past the room, so a word that ends exactly there is kept
+    head = text[:limit - len(ellipsis) + 1]
+    space = max(head.rfind(c) for c in ' \t\n')
+    cut = head[:space] if space > 0 else text[:limit - len(ellipsis)]
+    return _DANGLING.sub('', cut.rstrip(',;')) + ellipsis
+
+def _repair_one(name, text, kind):
+    if name == HASHTAG:
+        # A block of tags at the end goes; a tag used as a word keeps the word
+        text = _TRAILING_HASHTAGS.sub('', text)
+        return _COMPILED[HASHTAG].sub(lambda m: m.group(0)[1:], text)
+    if name == EMOJI:
+        return _COMPILED[EMOJI].sub('', text)
+    if name == QUOTE:
+        match = _WRAPPING_QUOTES.match(text)
+        # Block quotes are someone else's words: that needs a new draft
+        return match.group(1) if match else None
+    if name == PLACEHOLDER_LINK:
+        return _DANGLING.sub('', _COMPILED[PLACEHOLDER_LINK].sub('', text))
+    if name == LENGTH:
+        return trim_at_sentence(text, LIMITS.get(kind, LIMITS['reply']))
+    # 'RT @' means recycled content, which can't be fixed by editing
+    return None
+
+class RuleResult:
+    """
+    Outcome of checking (and repairing) one text.
+
+    Attributes:
+        text (str): The text after local repairs
+        violations (list): Rules the original text broke
+        repaired (list): Rules fixed locally
+        unrepaired (list): Rules the returned text still breaks
+        regenerations (int): Times the model was asked again
+    """
+
+    def __init__(self, text, violations, repaired, unrepaired, regenerations=0):
+        self.text = text
+        self.violations = violations
+        self.repaired = repaired
+        self.unrepaired = unrepaired
+        self.regenerations = regenerations
+
+    @property
+    def ok(self):
+        return not self.unrepaired
+
+def repair(text, kind='reply'):
+    """
+    Validate a text and fix what can be fixed deterministically: strip hashtags,
+    emoji, placeholder links and wrapping quotes, and trim to the limit at a
+    sentence boundary. Rules that can't be repaired are left in `unrepaired`.
+
+    Returns:
+        RuleResult
+    """
+    found = violations(text, kind)
+    if not found:
+        return RuleResult(text, [], [], [])
+    repaired_text = text
+    # Length last: the other repairs only make the text shorter
+    for name in sorted(found, key=lambda n: n == LENGTH):
+        fixed = _repair_one(name, repaired_text, kind)
+        if fixed is not None:
+            repaired_text = _tidy(fixed)
+    remaining = violations(repaired_text, kind) if repaired_text else list(found)
+    if not repaired_text:
+        repaired_text = text
+    return RuleResult(repaired_text, found, [n for n in found if n not in remaining], remaining)
+
+def feedback_for(rules):
+    """
+    Instructions for the model when a draft breaks rules that couldn't be repaired locally.
+    """
+    notes = {
+        HASHTAG: "no hashtags",
+        EMOJI: "no emoji",
+        RETWEET: "write an original reply, never 'RT @' or 'QT @'",
+        QUOTE: "don't quote other tweets or use quote formatting",
+        PLACEHOLDER_LINK: "no placeholder links",
+        LENGTH: "keep it shorter, ending on a complete sentence",
+    }
+    return "Previous draft broke the formatting rules: " + '; '.join(notes[r] for r in rules) + '.'
+
+_log_lock = threading.Lock()
+
+def record_check(result, kind, path=RULE_CHECK_LOG_PATH):
+    """
+    Append one check to the rule check log, for per-rule violation rates.
+    """
+    record = {
+        'ts': time.time(),
+        'kind': kind,
+        'violations': result.violations,
+        'repaired': result.repaired,
+        'unrepaired': result.unrepaired,
+        'regenerations': result.regenerations,
+    }
+    with _log_lock:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+def enforce(text, kind='reply', regenerate=None, verbose=False):
+    """
+    Repair a generated text locally and go back to the model only for what can't be repaired.
+
+    Args:
+        text (str): Generated text
+        kind (str): 'reply', 'topic' or 'topic_long' (sets the length limit)
+        regenerate (callable): regenerate(feedback) -> new text or None; called at most
+                               TEXT_RULES_MAX_REGENERATIONS times
+        verbose (bool): Print what was repaired
+
+    Returns:
+        RuleResult: For the last text checked. Its violations/repaired lists cover every attempt.
+    """
+    result = repair(text, kind)
+    found = list(result.violations)
+    repaired = list(result.repaired)
+    regenerations = 0
+    while result.unrepaired and regenerate and regenerations < config.TEXT_RULES_MAX_REGENERATIONS:
+        regenerations += 1
+        if verbose:
+            print(f"[INFO] Draft breaks {', '.join(result.unrepaired)}; asking the model again.")
+        new_text = regenerate(feedback_for(result.unrepaired))
+        if not new_text:
+            break
+        result = repair(new_text, kind)
+        found += [n for n in result.violations if n not in found]
+        repaired += [n for n in result.repaired if n not in repaired]
+    result = RuleResult(result.text, found, [n for n in repaired if n not in result.unrepaired],
+                        result.unrepaired, regenerations)
+    if found:
+        if verbose and result.repaired:
+            print(f"[INFO] Repaired locally: {', '.join(result.repaired)}.")
+        if verbose and result.unrepaired:
+            print(f"[WARNING] Draft still breaks: {', '.join(result.unrepaired)}.")
+    try:
+        record_check(result, kind)
+    except OSError as e:
+        print(f"[WARNING] Could not record rule check: {e}")
+    return result
+
+def violation_rates(since=None, path=RULE_CHECK_LOG_PATH):
+    """
+    Per-rule rates from the rule check log.
+
+    Returns:
+        tuple: (number of checks, dict rule -> {'violated', 'repaired', 'regenerated', 'unrepaired', 'rate'}),
+               'regenerated' counting violations that went away when the model was asked again
+    """
+    checks = 0
+    stats = {name: {'violated': 0, 'repaired': 0, 'unrepaired': 0} for name in RULES}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if since is not None and record['ts'] < since:
+                    continue
+                checks += 1
+                for field in ('violations', 'repaired', 'unrepaired'):
+                    for name in record[field]:
+                        stats[name]['violated' if field == 'violations' else field] += 1
+    for rule in stats.values():
+        rule['regenerated'] = rule['violated'] - rule['repaired'] - rule['unrepaired']
+        rule['rate'] = rule['violated'] / checks if checks else 0.0
+    return checks, stats
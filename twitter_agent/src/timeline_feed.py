@@ -0,0 +1,276 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from . import config
+from . import twitter_client
+from .authors import get_author_cache
+from .corpus import parse_created_at
+from .hydration import fetch_tweets
+
+TIMELINE_STATE_PATH = 'data/home_timeline.json'
+TIMELINE_TWEET_FIELDS = ['created_at', 'public_metrics', 'conversation_id', 'author_id', 'referenced_tweets']
+# Authors are resolved through the author cache, not the author_id expansion
+TIMELINE_EXPANSIONS = ['referenced_tweets.id']
+MAX_WINDOW_TWEETS = 800
+
+INSERT = 'insert'
+UPDATE = 'update'
+
+def engagement(metrics):
+    return (
+        metrics.get('like_count', 0) +
+        metrics.get('reply_count', 0) +
+        metrics.get('retweet_count', 0) +
+        metrics.get('quote_count', 0)
+    )
+
+def timeline_to_dicts(response, authors=None):
+    """
+    Turn one home-timeline response into tweet dicts, resolving retweeted/quoted
+    text from its includes and authors from its includes or `authors`
+    (user_id -> profile, as returned by AuthorCache.resolve).
+
+    Returns:
+        list: Tweet dicts with id, text, author_id, author_username, author_name,
+              created_at, engagement, metrics, type, referenced_tweets and quoted_text for quotes
+    """
+    includes = getattr(response, 'includes', None) or {}
+    users = {str(user.id): {'username': user.username, 'name': user.name} for user in includes.get('users', [])}
+    authors = authors or {}
+    referenced_tweets = {ref_tweet.id: ref_tweet.text for ref_tweet in includes.get('tweets', [])}
+    tweets = []
+    for tweet in response.data or []:
+        tweet_type = 'original'
+        full_text = tweet.text
+        quoted_text = None
+        refs = getattr(tweet, 'referenced_tweets', None) or []
+        for ref in refs:
+            if ref.type == 'retweeted':
+                tweet_type = 'retweet'
+                if ref.id in referenced_tweets:
+                    full_text = referenced_tweets[ref.id]
+            elif ref.type == 'quoted':
+                tweet_type = 'quote'
+                quoted_text = referenced_tweets.get(ref.id)
+            elif ref.type == 'replied_to':
+                tweet_type = 'reply'
+        author_id = str(tweet.author_id) if getattr(tweet, 'author_id', None) else None
+        author_info = users.get(author_id) or authors.get(author_id) or {}
+        metrics = getattr(tweet, 'public_metrics', None) or {}
+        tweet_dict = {
+            'id': str(tweet.id),
+            'text': full_text,
+            'author_id': author_id,
+            'author_username': author_info.get('username') or 'unknown',
+            'author_name': author_info.get('name') or 'unknown',
+            'created_at': str(tweet.created_at),
+            'engagement': engagement(metrics),
+            'metrics': metrics,
+            'type': tweet_type,
+            'referenced_tweets': [{'type': ref.type, 'id': str(ref.id)} for ref in refs],
+        }
+        if quoted_text:
+            tweet_dict['quoted_text'] = quoted_text
+        tweets.append(tweet_dict)
+    return tweets
+
+class TimelineFeed:
+    """
+    Incremental change feed over the reverse-chronological home timeline.
+
+    Each poll only asks for tweets newer than the persisted `since_id` cursor (a
+    poll that hits `max_pages` leaves a next_token the next poll resumes from) and
+    adds them to a rolling window (the last `window_hours`, at most MAX_WINDOW_TWEETS).
+    Metrics of tweets still in the window are refreshed in batches of 100 on a
+    slower cadence. Subscribers are called with (INSERT, tweet) for new tweets and
+    (UPDATE, tweet) when a tweet's metrics change, so downstream work (scoring,
+    drafting) only touches what changed.
+
+    The cursor, the window and the time of the last metrics refresh are kept in
+    data/home_timeline.json, so the next run starts warm.
+    """
+
+    def __init__(self, path=TIMELINE_STATE_PATH, window_hours=None, metrics_interval=None, max_pages=None):
+        self.path = path
+        self.window_hours = config.TIMELINE_WINDOW_HOURS if window_hours is None else window_hours
+        self.metrics_interval = config.TIMELINE_METRICS_SECONDS if metrics_interval is None else metrics_interval
+        self.max_pages = config.TIMELINE_MAX_PAGES if max_pages is None else max_pages
+        self._subscribers = []
+        self._lock = threading.RLock()
+        state = self._load()
+        self.since_id = state.get('since_id')
+        # Set while pages between since_id and the last poll's newest tweet are still unfetched
+        self.next_token = state.get('next_token')
+        self.pending_newest_id = state.get('pending_newest_id')
+        self.metrics_refreshed_at = state.get('metrics_refreshed_at', 0)
+        self.tweets = {t['id']: t for t in state.get('tweets', [])}
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'since_id': self.since_id,
+                'next_token': self.next_token,
+                'pending_newest_id': self.pending_newest_id,
+                'metrics_refreshed_at': self.metrics_refreshed_at,
+                'tweets': list(self.tweets.values()),
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def subscribe(self, callback):
+        """
+        Register callback(event, tweet), called for every INSERT and UPDATE.
+        """
+        self._subscribers.append(callback)
+
+    def _publish(self, event, tweet):
+        for callback in self._subscribers:
+            try:
+                callback(event, dict(tweet))
+            except Exception as e:
+                print(f"[WARNING] Timeline subscriber failed on {event} {tweet['id']}: {e}")
+
+    def _fetch_new(self, page_size):
+        """
+        Fetch tweets newer than since_id, newest first, up to max_pages pages, resuming
+        from the previous poll's next_token when it stopped with pages left.
+
+        Returns:
+            tuple: (tweets, newest ID seen, next_token if pages are left)
+        """
+        tweets = []
+        next_token = self.next_token
+        # Resuming: the newest tweet was already seen when the backlog started
+        newest_id = self.pending_newest_id if next_token else None
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=self.window_hours)
+        for _ in range(max(1, self.max_pages)):
+            kwargs = {
+                'max_results': page_size,
+                'tweet_fields': TIMELINE_TWEET_FIELDS,
+                'expansions': TIMELINE_EXPANSIONS,
+            }
+            if self.since_id:
+                kwargs['since_id'] = self.since_id
+            if next_token:
+                kwargs['pagination_token'] = next_token
+            try:
+                response = twitter_client.call_api('get_home_timeline', **kwargs)
+            except Exception:
+                if next_token and next_token == self.next_token:
+                    # A stored token that fails (e.g. expired) would fail every poll: start over from since_id
+                    self.next_token = self.pending_newest_id = None
+                raise
+            meta = response.meta or {}
+            if newest_id is None:
+                newest_id = meta.get('newest_id')
+            author_ids = [getattr(tweet, 'author_id', None) for tweet in response.data or []]
+            page = timeline_to_dicts(response, get_author_cache().resolve(author_ids))
+            tweets.extend(page)
+            next_token = meta.get('next_token')
+            if page and (parse_created_at(page[-1]['created_at']) or cutoff) < cutoff:
+                # Older pages would fall outside the window anyway
+                next_token = None
+            if not next_token:
+                break
+        return tweets, newest_id, next_token
+
+    def _refresh_metrics(self):
+        found, missing = fetch_tweets(list(self.tweets), tweet_fields=['public_metrics'])
+        updated = []
+        for tweet_id, fresh in found.items():
+            tweet = self.tweets.get(tweet_id)
+            if tweet is None or not fresh['metrics'] or fresh['metrics'] == tweet['metrics']:
+                continue
+            tweet['metrics'] = fresh['metrics']
+            tweet['engagement'] = engagement(fresh['metrics'])
+            updated.append(tweet)
+        for tweet_id in missing:
+            self.tweets.pop(tweet_id, None)
+        self.metrics_refreshed_at = time.time()
+        return updated
+
+    def _prune(self):
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=self.window_hours)
+        keep = [
+            t for t in self.tweets.values()
+            if (parse_created_at(t['created_at']) or cutoff) >= cutoff
+        ]
+        keep.sort(key=lambda t: int(t['id']), reverse=True)
+        self.tweets = {t['id']: t for t in keep[:MAX_WINDOW_TWEETS]}
+
+    def poll(self, page_size=100, refresh_metrics=None):
+        """
+        Fetch what is new since the last poll and, when due, refresh metrics for the window.
+
+        Args:
+            page_size (int): Results per timeline page, 1-100
+            refresh_metrics (bool): Force (True) or skip (False) the metrics refresh (default: when due)
+
+        Returns:
+            dict: 'inserted' and 'updated' tweet lists
+        """
+        with self._lock:
+            new_tweets, newest_id, next_token = self._fetch_new(max(1, min(page_size, 100)))
+            if refresh_metrics is None:
+                refresh_metrics = time.time() - self.metrics_refreshed_at >= self.metrics_interval
+            self._prune()
+            # Refresh before inserting: new tweets arrive with current metrics already
+            updated = self._refresh_metrics() if refresh_metrics and self.tweets else []
+            if not self.tweets:
+                # Cold start: everything about to be inserted has current metrics
+                self.metrics_refreshed_at = time.time()
+            inserted = []
+            for tweet in reversed(new_tweets):
+                if tweet['id'] in self.tweets:
+                    continue
+                self.tweets[tweet['id']] = tweet
+                inserted.append(tweet)
+            if next_token:
+                # Keep since_id until the pages in between are fetched, or they'd be skipped for good
+                self.next_token, self.pending_newest_id = next_token, newest_id
+            else:
+                self.since_id = newest_id or self.since_id
+                self.next_token = self.pending_newest_id = None
+            self._prune()
+            self._save()
+        for tweet in inserted:
+            self._publish(INSERT, tweet)
+        for tweet in updated:
+            self._publish(UPDATE, tweet)
+        return {'inserted': inserted, 'updated': updated}
+
+    def __contains__(self, tweet_id):
+        with self._lock:
+            return str(tweet_id) in self.tweets
+
+    def top(self, n=10):
+        """
+        Return the n most engaged tweets in the window.
+        """
+        with self._lock:
+            tweets = sorted(self.tweets.values(), key=lambda t: t['engagement'], reverse=True)
+            return [dict(t) for t in tweets[:n]]
+
+_feed = None
+_feed_lock = threading.Lock()
+
+def get_timeline_feed():
+    """
+    Return the process-wide timeline feed, so every subscriber sees the same polls.
+    """
+    global _feed
+    with _feed_lock:
+        if _feed is None:
+            _feed = TimelineFeed()
+        return _feed
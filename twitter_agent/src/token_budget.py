@@ -0,0 +1,258 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from . import attempt_log
+from . import config
+from .corpus import parse_created_at
+
+USAGE_LOG_PATH = 'data/token_usage.jsonl'
+HOUR = 3600
+DAY = 24 * HOUR
+
+OK = 'ok'
+SOFT = 'soft'
+HARD = 'hard'
+
+# max_tokens is only tuned once a request type has this many observations
+MIN_SAMPLES = 30
+SAMPLE_WINDOW = 500
+HEADROOM = 1.25
+MIN_MAX_TOKENS = 32
+
+class BudgetExceeded(Exception):
+    """Raised instead of calling the model once a hard budget limit is reached."""
+
+def current_script():
+    """
+    Name of the running script, e.g. 'reply_to_tweet' for `python3 -m twitter_agent.scripts.reply_to_tweet`.
+    """
+    return os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0] or 'python'
+
+def call_cost(prompt_tokens, completion_tokens):
+    """
+    USD cost of one call at the configured per-million-token prices.
+    """
+    return (prompt_tokens * config.OPENAI_PROMPT_PRICE_PER_1M +
+            completion_tokens * config.OPENAI_COMPLETION_PRICE_PER_1M) / 1_000_000
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+class TokenGovernor:
+    """
+    Records token usage for every model call and enforces hourly and daily cost budgets.
+
+    Every call is appended to data/token_usage.jsonl with its request type, script
+    and account, so usage can be queried later and several processes share one budget
+    (each process picks up the lines the others append). Budgets are in USD, per
+    account; 0 means unlimited. Past `soft_fraction` of a budget, `level()` turns
+    SOFT and background work should scale down (see `scale`); at the limit it turns
+    HARD and `check()` refuses further calls.
+
+    `max_tokens_for()` sizes the completion limit per request type from the observed
+    completion lengths instead of a fixed number.
+    """
+
+    def __init__(self, path=USAGE_LOG_PATH, hourly_budget=None, daily_budget=None,
+                 soft_fraction=None, account=None):
+        self.path = path
+        self.hourly_budget = config.OPENAI_BUDGET_HOURLY_USD if hourly_budget is None else hourly_budget
+        self.daily_budget = config.OPENAI_BUDGET_DAILY_USD if daily_budget is None else daily_budget
+        self.soft_fraction = config.OPENAI_BUDGET_SOFT_FRACTION if soft_fraction is None else soft_fraction
+        self.account = account or config.TWITTER_USERNAME or 'default'
+        self._lock = threading.Lock()
+        self._offset = 0
+        self._recent = deque()
+        self._lengths = {}
+        self._truncated = {}
+        self._read_new_lines()
+
+    def _read_new_lines(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            f.seek(self._offset)
+            while True:
+                line = f.readline()
+                if not line or not line.endswith('\n'):
+                    break
+                self._offset = f.tell()
+                try:
+                    self._observe(json.loads(line))
+                except (json.JSONDecodeError, KeyError):
+                    continue
+
+    def _observe(self, record):
+        if record['account'] == self.account and record['ts'] >= time.time() - DAY:
+            self._recent.append((record['ts'], record['cost']))
+        lengths = self._lengths.setdefault(record['request_type'], deque(maxlen=SAMPLE_WINDOW))
+        truncated = self._truncated.setdefault(record['request_type'], deque(maxlen=SAMPLE_WINDOW))
+        # With n > 1 the completion tokens cover every choice; the limit applies to each one
+        lengths.append(record['completion_tokens'] // max(1, record.get('choices', 1)))
+        truncated.append(record.get('finish_reason') == 'length')
+
+    def spent(self, seconds):
+        """
+        USD spent by this account in the last `seconds` (up to a day).
+        """
+        with self._lock:
+            self._read_new_lines()
+            now = time.time()
+            while self._recent and self._recent[0][0] < now - DAY:
+                self._recent.popleft()
+            return sum(cost for ts, cost in self._recent if ts >= now - seconds)
+
+    def level(self):
+        """
+        OK, SOFT or HARD: the worst position across the hourly and daily budgets.
+        """
+        worst = 0.0
+        for budget, seconds in ((self.hourly_budget, HOUR), (self.daily_budget, DAY)):
+            if budget > 0:
+                worst = max(worst, self.spent(seconds) / budget)
+        if worst >= 1:
+            return HARD
+        if worst >= self.soft_fraction:
+            return SOFT
+        return OK
+
+    def check(self, request_type):
+        """
+        Raise BudgetExceeded if a hard limit has been reached.
+        """
+        if self.level() == HARD:
+            raise BudgetExceeded(
+                f"model budget exhausted for {self.account} "
+                f"(last hour ${self.spent(HOUR):.4f}, last day ${self.spent(DAY):.4f}); {request_type} call refused"
+            )
+
+    def scale(self, count):
+        """
+        Scale a batch size for background work to the budget: unchanged when OK,
+        halved near the limit, zero once it is reached.
+        """
+        level = self.level()
+        if level == HARD:
+            return 0
+        if level == SOFT:
+            return max(1, count // 2) if count else 0
+        return count
+
+    def max_tokens_for(self, request_type, default):
+        """
+        Completion token limit for a request type: the observed p99 completion length
+        plus headroom, never above `default`. Falls back to `default` until there are
+        enough observations, or when recent completions were cut off at the limit.
+        """
+        with self._lock:
+            self._read_new_lines()
+            lengths = list(self._lengths.get(request_type, ()))
+            truncated = list(self._truncated.get(request_type, ()))
+        if len(lengths) < MIN_SAMPLES or any(truncated[-MIN_SAMPLES:]):
+            return default
+        return max(MIN_MAX_TOKENS, min(default, int(_percentile(lengths, 99) * HEADROOM)))
+
+    def record(self, request_type, model, usage, finish_reason=None, script=None, choices=1):
+        """
+        Append one call's usage to the log.
+
+        Args:
+            request_type (str): e.g. 'reply', 'topic', 'topic_long'
+            model (str): Model name
+            usage: response.usage (prompt_tokens, completion_tokens)
+            finish_reason (str): 'stop', 'length', ...
+            script (str): Calling script (default: the running script)
+            choices (int): Completions generated by the call (the `n` parameter)
+
+        Returns:
+            dict: The stored record
+        """
+        prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+        record = {
+            'ts': time.time(),
+            'account': self.account,
+            'script': script or current_script(),
+            'request_type': request_type,
+            'model': model,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'cost': call_cost(prompt_tokens, completion_tokens),
+            'finish_reason': finish_reason,
+        }
+        if choices > 1:
+            record['choices'] = choices
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+            self._read_new_lines()
+        return record
+
+def _in_period(ts, since, until):
+    return (since is None or ts >= since) and (until is None or ts < until)
+
+def iter_usage(path=USAGE_LOG_PATH, since=None, until=None):
+    """
+    Yield usage records, optionally only those in [since, until) (epoch seconds).
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if _in_period(record['ts'], since, until):
+                yield record
+
+def usage_summary(since=None, until=None, group_by=('account', 'script', 'request_type'), path=USAGE_LOG_PATH):
+    """
+    Aggregate usage by any combination of account, script, request_type and model.
+
+    Returns:
+        dict: group key tuple -> {'calls', 'prompt_tokens', 'completion_tokens', 'cost'}
+    """
+    groups = {}
+    for record in iter_usage(path, since, until):
+        key = tuple(record.get(field) for field in group_by)
+        group = groups.setdefault(key, {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cost': 0.0})
+        group['calls'] += 1
+        group['prompt_tokens'] += record['prompt_tokens']
+        group['completion_tokens'] += record['completion_tokens']
+        group['cost'] += record['cost']
+    return groups
+
+def _timestamp(value):
+    parsed = parse_created_at(value)
+    return parsed.timestamp() if parsed else 0
+
+def cost_per_posted_reply(since=None, until=None, path=USAGE_LOG_PATH, log_path=attempt_log.ATTEMPT_LOG_PATH):
+    """
+    Reply-generation cost divided by the replies actually posted in the same period.
+
+    Returns:
+        tuple: (total reply cost, posted replies, cost per posted reply or None)
+    """
+    cost = sum(r['cost'] for r in iter_usage(path, since, until) if r['request_type'] == 'reply')
+    posted = sum(
+        1 for record in attempt_log.iter_records(log_path)
+        if record.get('status') == 'posted' and _in_period(_timestamp(record.get('timestamp')), since, until)
+    )
+    return cost, posted, (cost / posted if posted else None)
+
+_governor = None
+_governor_lock = threading.Lock()
+
+def get_governor():
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = TokenGovernor()
+        return _governor
@@ -0,0 +1,291 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from urllib.parse import parse_qsl, urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from . import config
+
+LIVE = 'live'
+RECORD = 'record'
+REPLAY = 'replay'
+
+# Time bounds are part of a request's identity (backfill windows differ only by them), but one
+# computed from the clock (e.g. "30 seconds ago") changes every run: a bound this close to the
+# time of the request is keyed as 'now'
+TIME_PARAMS = {'start_time', 'end_time'}
+NOW_TOLERANCE_SECONDS = 15 * 60
+# Body fields the token governor tunes from usage history
+VOLATILE_BODY_FIELDS = {'max_tokens'}
+# Comma-separated list parameters whose order doesn't matter
+LIST_PARAM_SUFFIXES = ('.fields', 'expansions')
+# Response headers worth keeping; bodies are stored decoded
+KEPT_HEADERS = ('content-type', 'x-rate-limit-limit', 'x-rate-limit-remaining', 'x-rate-limit-reset')
+
+class CassetteMiss(Exception):
+    """Raised in replay mode when a request was never recorded."""
+
+def mode():
+    return config.API_TRANSPORT
+
+def replaying():
+    return mode() == REPLAY
+
+def _time_param(value, now):
+    try:
+        bound = datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return value
+    return 'now' if abs(now - bound) <= NOW_TOLERANCE_SECONDS else value
+
+def request_key(method, url, body=None, now=None):
+    """
+    Normalized identity of a request: method, host and path, sorted query parameters
+    (list values sorted, time bounds near `now` replaced by 'now') and the JSON body
+    with sorted keys (without VOLATILE_BODY_FIELDS).
+    Credentials and headers are not part of it.
+
+    Returns:
+        tuple: (key hash, readable description)
+    """
+    now = time.time() if now is None else now
+    parts = urlsplit(url)
+    params = []
+    for name, value in parse_qsl(parts.query, keep_blank_values=True):
+        if name in TIME_PARAMS:
+            value = _time_param(value, now)
+        elif name.endswith(LIST_PARAM_SUFFIXES):
+            value = ','.join(sorted(value.split(',')))
+        params.append((name, value))
+    query = '&'.join(f"{name}={value}" for name, value in sorted(params))
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', 'replace')
+    if body:
+        try:
+            parsed = json.loads(body)
+        except ValueError:
+            parsed = None
+        if isinstance(parsed, dict):
+            parsed = {k: v for k, v in parsed.items() if k not in VOLATILE_BODY_FIELDS}
+        if parsed is not None:
+            body = json.dumps(parsed, sort_keys=True, separators=(',', ':'))
+    description = f"{method.upper()} {parts.netloc.lower()}{parts.path}" + (f"?{query}" if query else '')
+    digest = hashlib.sha256(f"{description}\n{body or ''}".encode('utf-8')).hexdigest()[:20]
+    return digest, description
+
+def latency_model(spec=None):
+    """
+    Parse API_REPLAY_LATENCY into a function of the recorded latency:
+    '0' replays instantly, '0.05' sleeps a fixed 50ms, 'recorded' sleeps as long
+    as the original call took and 'recorded*0.5' half as long.
+    """
+    spec = str(config.API_REPLAY_LATENCY if spec is None else spec).strip().lower()
+    if spec.startswith('recorded'):
+        scale = float(spec.split('*', 1)[1]) if '*' in spec else 1.0
+        return lambda recorded: recorded * scale
+    fixed = float(spec or 0)
+    return lambda recorded: fixed
+
+class Cassette:
+    """
+    Recorded request/response pairs for one service, in a gzip-compressed JSONL file.
+
+    Interactions are stored under their request key. Replaying returns the responses
+    recorded for a key in order, repeating the last one once they run out, so a
+    script that polls the same URL sees the same sequence every run. Recording
+    extends the cassette; with `fresh` the old recording is dropped, at the first
+    write. Each interaction is appended as its own gzip member, so an interrupted
+    recording stays readable.
+    """
+
+    def __init__(self, path, latency=None, fresh=False):
+        self.path = path
+        self.latency = latency or latency_model()
+        self.fresh = fresh
+        self._lock = threading.Lock()
+        self._interactions = {}
+        self._positions = {}
+        self._started = False
+        self.meta = {}
+        if os.path.exists(path):
+            try:
+                with gzip.open(path, 'rt') as f:
+                    for line in f:
+                        record = json.loads(line)
+                        if 'meta' in record:
+                            self.meta.update(record['meta'])
+                        else:
+                            self._interactions.setdefault(record['key'], []).append(record)
+            except (EOFError, OSError, json.JSONDecodeError):
+                # A recording cut off mid-write: keep what was complete
+                pass
+
+    def __len__(self):
+        return sum(len(v) for v in self._interactions.values())
+
+    def play(self, method, url, body=None):
+        """
+        Return the next recorded response for this request, after the modelled latency.
+
+        Raises:
+            CassetteMiss: If the request was never recorded
+        """
+        key, description = request_key(method, url, body)
+        with self._lock:
+            recorded = self._interactions.get(key)
+            if not recorded:
+                print(f"[WARNING] No recorded response for {description} in {self.path}")
+                raise CassetteMiss(f"no recorded response for {description} ({key})")
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            record = recorded[min(position, len(recorded) - 1)]
+        delay = self.latency(record.get('elapsed', 0))
+        if delay > 0:
+            time.sleep(delay)
+        return record['response']
+
+    def record(self, method, url, body, status, headers, content, elapsed):
+        """
+        Store one live interaction.
+
+        Returns:
+            dict: The stored response ({'status', 'headers', 'body'})
+        """
+        key, description = request_key(method, url, body)
+        response = {
+            'status': status,
+            'headers': {k: v for k, v in headers.items() if k.lower() in KEPT_HEADERS},
+            'body': content.decode('utf-8', 'replace'),
+        }
+        record = {'key': key, 'request': description, 'elapsed': round(elapsed, 4), 'response': response}
+        with self._lock:
+            self._write(record)
+            self._interactions.setdefault(key, []).append(record)
+        return response
+
+    def set_meta(self, **values):
+        """
+        Store facts about the recording that replay needs, e.g. the authenticated user ID.
+        Nothing is written when the cassette already holds these values.
+        """
+        with self._lock:
+            if not self.fresh and all(self.meta.get(k) == v for k, v in values.items()):
+                return
+            self._write({'meta': values})
+            self.meta.update(values)
+
+    def _write(self, record):
+        if not self._started:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            if self.fresh:
+                # Starting over: drop whatever was loaded from the old file
+                self._interactions = {}
+                self.meta = {}
+                open(self.path, 'wb').close()
+            self._started = True
+        with gzip.open(self.path, 'at') as f:
+            f.write(json.dumps(record) + '\n')
+
+class CassetteAdapter(HTTPAdapter):
+    """
+    requests transport adapter (for tweepy's session) that records or replays through a Cassette.
+    """
+
+    def __init__(self, cassette, recording):
+        super().__init__()
+        self.cassette = cassette
+        self.recording = recording
+
+    def send(self, request, **kwargs):
+        if self.recording:
+            start = time.perf_counter()
+            live = super().send(request, **kwargs)
+            stored = self.cassette.record(request.method, request.url, request.body, live.status_code,
+                                          live.headers, live.content, time.perf_counter() - start)
+        else:
+            stored = self.cassette.play(request.method, request.url, request.body)
+        response = requests.Response()
+        response.status_code = stored['status']
+        response.headers = CaseInsensitiveDict(stored['headers'])
+        response._content = stored['body'].encode('utf-8')
+        response.encoding = 'utf-8'
+        response.reason = requests.status_codes._codes.get(stored['status'], ('',))[0].upper()
+        response.url = request.url
+        response.request = request
+        return response
+
+class CassetteTransport(httpx.BaseTransport):
+    """
+    httpx transport (for the OpenAI client) that records or replays through a Cassette.
+    """
+
+    def __init__(self, cassette, recording):
+        self.cassette = cassette
+        self.recording = recording
+        self._live = httpx.HTTPTransport() if recording else None
+
+    def handle_request(self, request):
+        body = request.read()
+        if self.recording:
+            start = time.perf_counter()
+            live = self._live.handle_request(request)
+            content = live.read()
+            live.close()
+            stored = self.cassette.record(request.method, str(request.url), body, live.status_code,
+                                          live.headers, content, time.perf_counter() - start)
+        else:
+            stored = self.cassette.play(request.method, str(request.url), body)
+        return httpx.Response(stored['status'], headers=stored['headers'],
+                              content=stored['body'].encode('utf-8'), request=request)
+
+    def close(self):
+        if self._live is not None:
+            self._live.close()
+
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+def get_cassette(service):
+    """
+    The process-wide cassette for 'twitter' or 'openai' under API_CASSETTE.
+    """
+    with _cassettes_lock:
+        if service not in _cassettes:
+            _cassettes[service] = Cassette(os.path.join(config.API_CASSETTE, f"{service}.jsonl.gz"),
+                                           fresh=mode() == RECORD and config.API_CASSETTE_FRESH)
+        return _cassettes[service]
+
+def install_twitter(client):
+    """
+    Route a tweepy.Client's HTTP traffic through the twitter cassette unless API_TRANSPORT is 'live'.
+    """
+    if mode() == LIVE:
+        return client
+    cassette = get_cassette('twitter')
+    # tweepy puts the user ID from the access token into routes such as the home timeline
+    if mode() == RECORD:
+        cassette.set_meta(user_id=str(client.access_token or '').partition('-')[0])
+    elif cassette.meta.get('user_id') and client.access_token == 'replay':
+        client.access_token = f"{cassette.meta['user_id']}-replay"
+    client.session.mount('https://', CassetteAdapter(cassette, recording=mode() == RECORD))
+    return client
+
+def install_openai(openai_module):
+    """
+    Give the OpenAI module client an httpx client that records or replays, unless API_TRANSPORT is 'live'.
+    """
+    if mode() == LIVE:
+        return
+    if replaying() and not openai_module.api_key:
+        # The SDK insists on a key even though nothing is sent
+        openai_module.api_key = 'replay'
+    transport = CassetteTransport(get_cassette('openai'), recording=mode() == RECORD)
+    openai_module.http_client = httpx.Client(transport=transport, timeout=None)
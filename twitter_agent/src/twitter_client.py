@@ -20,20 +20,61 @@ except ImportError as e:
     else:
         raise
 
+import threading
+
 from . import config
+from . import rate_limit
+from . import transport
+
+_client = None
+_client_lock = threading.Lock()
 
 def get_twitter_client():
     """
-    Create and return a Twitter API v2 client.
+    Return the shared Twitter API v2 client, creating it on first use.
+    With API_TRANSPORT=record or replay its traffic goes through a cassette (src/transport.py).
     """
-    client = tweepy.Client(
-        bearer_token=config.TWITTER_BEARER_TOKEN,
-        consumer_key=config.TWITTER_API_KEY,
-        consumer_secret=config.TWITTER_API_SECRET,
-        access_token=config.TWITTER_ACCESS_TOKEN,
-        access_token_secret=config.TWITTER_ACCESS_SECRET
-    )
-    return client
+    global _client
+    with _client_lock:
+        if _client is None:
+            # Replayed requests are never sent, but OAuth signing still needs values
+            placeholder = 'replay' if transport.replaying() else None
+            _client = transport.install_twitter(tweepy.Client(
+                bearer_token=config.TWITTER_BEARER_TOKEN or placeholder,
+                consumer_key=config.TWITTER_API_KEY or placeholder,
+                consumer_secret=config.TWITTER_API_SECRET or placeholder,
+                access_token=config.TWITTER_ACCESS_TOKEN or placeholder,
+                access_token_secret=config.TWITTER_ACCESS_SECRET or placeholder
+            ))
+        return _client
+
+def call_api(endpoint, *args, max_attempts=3, **kwargs):
+    """
+    Call a tweepy.Client method under the shared per-endpoint rate budget.
+
+    If the server still answers 429, every thread backs off until the
+    window resets and the call is retried. Replayed calls don't use the budget.
+
+    Args:
+        endpoint (str): Name of the tweepy.Client method, e.g. 'search_recent_tweets'
+        max_attempts (int): How many times to try before giving up on 429s
+        *args, **kwargs: Passed through to the tweepy method
+
+    Returns:
+        tweepy.Response: The response from the Twitter API
+    """
+    client = get_twitter_client()
+    budget = rate_limit.get_rate_budget()
+    for attempt in range(max_attempts):
+        if not transport.replaying():
+            budget.acquire(endpoint)
+        try:
+            return getattr(client, endpoint)(*args, **kwargs)
+        except tweepy.TooManyRequests as e:
+            print(f"[WARNING] Rate limited on {endpoint} (attempt {attempt + 1}/{max_attempts}).")
+            rate_limit.note_rate_limited(endpoint, e)
+            if attempt == max_attempts - 1:
+                raise
 
 def search_tweets(query=None, max_results=None):
     """
@@ -46,15 +87,14 @@ def search_tweets(query=None, max_results=None):
     Returns:
         list: List of tweet objects
     """
-    client = get_twitter_client()
-    
     if query is None:
         query = config.SEARCH_QUERY
     
     if max_results is None:
         max_results = config.MAX_TWEETS_PER_SEARCH
     
-    tweets = client.search_recent_tweets(
+    tweets = call_api(
+        'search_recent_tweets',
         query=query,
         max_results=max_results,
         tweet_fields=['author_id', 'created_at', 'public_metrics']
@@ -64,7 +104,9 @@ def search_tweets(query=None, max_results=None):
 
 def post_tweet(text, reply_to_id=None):
     """
-    Post a new tweet or reply to an existing tweet.
+    Post a new tweet or reply to an existing tweet, synchronously.
+    Interactive scripts go through outbox.enqueue() instead, which persists the
+    post first and retries delivery in the background.
     
     Args:
         text (str): The tweet text
@@ -73,15 +115,14 @@ def post_tweet(text, reply_to_id=None):
     Returns:
         tweepy.Response: The response from the Twitter API
     """
-    client = get_twitter_client()
-    
     if reply_to_id:
-        response = client.create_tweet(
+        response = call_api(
+            'create_tweet',
             text=text,
             in_reply_to_tweet_id=reply_to_id
         )
     else:
-        response = client.create_tweet(text=text)
+        response = call_api('create_tweet', text=text)
     
     return response
 
@@ -95,9 +136,8 @@ def get_tweet_by_id(tweet_id):
     Returns:
         dict: The tweet data
     """
-    client = get_twitter_client()
-    
-    response = client.get_tweet(
+    response = call_api(
+        'get_tweet',
         tweet_id,
         tweet_fields=['author_id', 'created_at', 'public_metrics', 'text']
     )
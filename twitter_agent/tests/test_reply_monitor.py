@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from twitter_agent.src import attempt_log, reply_monitor
+
+HOUR = 3600
+
+def _fake_lookup(ids, tweet_fields=None):
+    found = {i: {'id': i, 'metrics': {'like_count': 1}, 'conversation_id': None, 'author_id': '1'} for i in ids}
+    return found, []
+
+def test_late_discovered_post_gets_one_check(tmp_path, monkeypatch):
+    log_path = str(tmp_path / 'attempts.jsonl')
+    monkeypatch.setattr(reply_monitor, 'fetch_tweets', _fake_lookup)
+    now = 1_800_000_000
+    posted_at = now - 48 * HOUR
+    attempt_log.append({'status': 'posted', 'tweet_id': '100', 'in_reply_to_id': '1', 'author_id': '2',
+                        'timestamp': datetime.utcfromtimestamp(posted_at).isoformat() + 'Z'}, log_path)
+    monitor = reply_monitor.ReplyMonitor(log_path)
+
+    checks = 0
+    # What monitor_replies --watch does: run whatever is due, a second later run again
+    for second in range(60):
+        checks += len(monitor.run_once(now=now + second)['checked'])
+    assert checks == 1
+    # The next check is the next slot of the schedule, not the one after the previous check count
+    assert monitor.next_due_at() > now + 60
+
+def test_schedule_doubles_from_first_check():
+    post = {'posted_at': 0, 'checks': 0, 'checked_at': None, 'done': False}
+    times = []
+    for _ in range(4):
+        due = reply_monitor.next_check_at(post, first_check_seconds=900, horizon_seconds=72 * HOUR)
+        times.append(due)
+        post.update(checks=post['checks'] + 1, checked_at=due)
+    assert times == [900, 1800, 3600, 7200]
@@ -0,0 +1,21 @@
+import random
+
+from twitter_agent.src import text_rules
+
+def test_trim_at_word_never_exceeds_limit():
+    assert len(text_rules.trim_at_word('a' * 279 + ' bb', 280)) <= 280
+    rng = random.Random(0)
+    for _ in range(2000):
+        words = [''.join('ab,'[rng.randrange(3)] for _ in range(rng.randint(1, 40))) for _ in range(rng.randint(1, 30))]
+        text = ' '.join(words)
+        limit = rng.randint(5, 120)
+        assert len(text_rules.trim_at_word(text, limit)) <= limit
+
+def test_trim_at_word_keeps_a_word_that_ends_at_the_cut():
+    assert text_rules.trim_at_word('hello world, foo', 15) == 'hello world...'
+
+def test_dingbats_and_arrows_are_not_emoji():
+    for text in ('done ✓', 'done ✔', '★ pick', 'next ➡', '⬆ up'):
+        assert text_rules.EMOJI not in text_rules.violations(text)
+    for text in ('ship it \U0001F680', 'ok ✅', 'love ❤️', '⭐'):
+        assert text_rules.EMOJI in text_rules.violations(text)